@@ -2,19 +2,35 @@
 import sys
 import os
 import json
+import re
+import heapq
+import bisect
 import shutil
 from xml.etree import ElementTree as ET
 import logging
 import subprocess
+import threading
+import time
+import functools
+import glob
+import pathlib
+import hashlib
+import zlib
+import mmap
+import multiprocessing
+from collections import OrderedDict, deque
+import numpy as np
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QListWidget, QListWidgetItem,
     QLabel, QDialog, QPushButton, QFileDialog, QMenu, QMessageBox, QTextEdit, QSplitter,
     QAbstractItemView, QMenuBar, QSlider, QMainWindow, QSystemTrayIcon, QStyledItemDelegate, QStyle,
-    QRadioButton, QComboBox, QButtonGroup, QDialogButtonBox, QAction, QCheckBox
+    QRadioButton, QComboBox, QButtonGroup, QDialogButtonBox, QAction, QCheckBox, QCompleter, QInputDialog,
+    QSpinBox, QFormLayout, QActionGroup, QListView
 )
 from PyQt5.QtCore import (
     Qt, QSize, QPoint, QSettings, QStandardPaths, QRect, pyqtSignal as Signal, pyqtSlot as Slot,
-    QItemSelectionModel 
+    QItemSelectionModel, QObject, QRunnable, QThreadPool, QTimer, QStringListModel, QFileSystemWatcher,
+    QAbstractListModel, QModelIndex, QPersistentModelIndex
 )
 from PyQt5.QtGui import (
     QColor, QFont, QGuiApplication, QIcon, QPainter, QTextDocument, QFontMetrics,
@@ -75,14 +91,16 @@ class SQLSyntaxHighlighter(QSyntaxHighlighter):
         # Multi-line comment format (stored separately as it needs special handling)
         self.multi_line_comment_format = QTextCharFormat()
         self.multi_line_comment_format.setForeground(QColor("#6A9955"))
-        self.comment_start_expression = r"/\*"
-        self.comment_end_expression = r"\*/"
+        self.comment_start_expression = re.compile(r"/\*")
+        self.comment_end_expression = re.compile(r"\*/")
+
+        # Compile every rule once instead of on each highlightBlock() call
+        self.highlighting_rules = [(re.compile(pattern, re.IGNORECASE), fmt) for pattern, fmt in self.highlighting_rules]
         
     def highlightBlock(self, text):
         # Apply single-line rules
         for pattern, format in self.highlighting_rules:
-            import re
-            matches = re.finditer(pattern, text, re.IGNORECASE)
+            matches = pattern.finditer(text)
             for match in matches:
                 start = match.start()
                 length = match.end() - match.start()
@@ -93,18 +111,16 @@ class SQLSyntaxHighlighter(QSyntaxHighlighter):
         
         start_index = 0
         if self.previousBlockState() != 1:
-            import re
-            match = re.search(self.comment_start_expression, text)
+            match = self.comment_start_expression.search(text)
             if match:
                 start_index = match.start()
             else:
                 start_index = -1
         
         while start_index >= 0:
-            import re
-            end_match = re.search(self.comment_end_expression, text[start_index:])
+            end_match = self.comment_end_expression.search(text, start_index)
             if end_match:
-                end_index = start_index + end_match.end()
+                end_index = end_match.end()
                 comment_length = end_index - start_index
                 self.setFormat(start_index, comment_length, self.multi_line_comment_format)
                 start_index = text.find("/*", end_index)
@@ -136,9 +152,10 @@ BOOKMARKS_COPY_DIR = os.path.join(APP_DATA_DIR, "bookmarks")
 ICON_DIR = os.path.join(APP_DATA_DIR, "icons")
 HELP_DIR = os.path.join(APP_DATA_DIR, "help")
 INTERNAL_VAULT_DIR = os.path.join(APP_DATA_DIR, "query_vault")  # Directory for storing internal queries
+INDEX_DIR = os.path.join(APP_DATA_DIR, "index")  # Persisted search/duplicate-detection data
 
 # Create directories if they don't exist
-for directory in [APP_DATA_DIR, LOG_DIR, CONFIG_DIR, BOOKMARKS_COPY_DIR, ICON_DIR, HELP_DIR, INTERNAL_VAULT_DIR]:
+for directory in [APP_DATA_DIR, LOG_DIR, CONFIG_DIR, BOOKMARKS_COPY_DIR, ICON_DIR, HELP_DIR, INTERNAL_VAULT_DIR, INDEX_DIR]:
     try:
         os.makedirs(directory, exist_ok=True)
     except OSError as e:
@@ -153,6 +170,8 @@ MAIN_ICON_FILE = os.path.join(ICON_DIR, "app_icon.ico")
 TRAY_ICON_FILE = os.path.join(ICON_DIR, "tray_icon.ico")
 HELP_LOCATIONS_FILE = os.path.join(HELP_DIR, "help_locations.txt")
 INTERNAL_VAULT_FILE = os.path.join(INTERNAL_VAULT_DIR, "query_vault.json")  # File for storing internal queries
+MINHASH_SIGNATURES_FILE = os.path.join(INDEX_DIR, "minhash_signatures.npz")  # MinHash signatures keyed by SQL content hash
+SQL_CATALOG_FILE = os.path.join(INDEX_DIR, "sql_catalog.json")  # Manifest of the .sql files under the SQL root
 
 # Define default DataGrip path (adjust if necessary)
 DEFAULT_DATAGRIP_PATH = r"C:\Users\cfriedberg\AppData\Local\JetBrains\DataGrip 2024.1.4\bin\datagrip64.exe"
@@ -160,6 +179,8 @@ DEFAULT_DATAGRIP_PATH = r"C:\Users\cfriedberg\AppData\Local\JetBrains\DataGrip 2
 # Constants for data source modes
 SOURCE_DATAGRIP = "datagrip"
 SOURCE_INTERNAL = "internal"
+SOURCE_FEDERATED = "federated"  # DataGrip bookmarks and vault queries side by side
+SOURCE_CATALOG = "catalog"  # Every .sql file under the SQL root directory
 
 # --- Logging Setup ---
 def setup_logging():
@@ -186,7 +207,9 @@ def setup_logging():
     logging.info(f"Main Icon Path (Expected): {MAIN_ICON_FILE}")
     logging.info(f"Tray Icon Path (Expected): {TRAY_ICON_FILE}")
 
-setup_logging() # Initialize logging immediately
+# Pool workers re-import this module under spawn (Windows); only the GUI process owns the log file
+if multiprocessing.current_process().name == 'MainProcess':
+    setup_logging() # Initialize logging immediately
 
 # --- Configuration Management ---
 class AppSettings:
@@ -220,6 +243,48 @@ class AppSettings:
             self.settings['font_size'] = "12" # Default font size
         if 'data_source' not in self.settings:
             self.settings['data_source'] = SOURCE_DATAGRIP # Default to DataGrip source for backward compatibility
+        if 'ranked_search' not in self.settings:
+            self.settings['ranked_search'] = False # Plain substring filter by default
+        if 'ranked_top_k' not in self.settings:
+            self.settings['ranked_top_k'] = 100 # Max results shown in ranked search mode
+        if 'search_cache_size' not in self.settings:
+            self.settings['search_cache_size'] = 128 # Number of cached search result lists
+        if 'regex_time_budget_ms' not in self.settings:
+            self.settings['regex_time_budget_ms'] = 50 # Per-document budget for regex searches
+        if 'regex_ignore_case' not in self.settings:
+            self.settings['regex_ignore_case'] = False # Regexes are case-sensitive unless asked otherwise
+        if 'search_debounce_ms' not in self.settings:
+            self.settings['search_debounce_ms'] = 150 # Delay after the last keystroke before searching
+        if 'duplicate_threshold' not in self.settings:
+            self.settings['duplicate_threshold'] = 0.8 # Estimated Jaccard similarity that counts as a near-duplicate
+        if 'search_autocomplete' not in self.settings:
+            self.settings['search_autocomplete'] = True # Completion popup for titles, labels and tables
+        if 'autocomplete_max_items' not in self.settings:
+            self.settings['autocomplete_max_items'] = 8 # Suggestions shown in the completion popup
+        if 'saved_searches' not in self.settings:
+            self.settings['saved_searches'] = [] # Pinned searches: [{'name': ..., 'params': {...}}]
+        if 'sql_cache_budget_mb' not in self.settings:
+            self.settings['sql_cache_budget_mb'] = 64 # Memory budget for cached SQL file contents
+        if 'recall_top_k' not in self.settings:
+            self.settings['recall_top_k'] = 10 # Results shown by Recall Similar Queries
+        if 'bookmark_statement_only' not in self.settings:
+            self.settings['bookmark_statement_only'] = True # Preview/copy/search just the statement at a bookmark's line
+        if 'statement_window_lines' not in self.settings:
+            self.settings['statement_window_lines'] = STATEMENT_WINDOW_LINES # Lines read around a bookmarked line
+        if 'watch_bookmarks_file' not in self.settings:
+            self.settings['watch_bookmarks_file'] = False # Re-read the DataGrip XML when it changes on disk
+        if 'bookmark_sources' not in self.settings:
+            self.settings['bookmark_sources'] = [] # Extra DataGrip XML files merged with the opened one
+        if 'auto_discover_bookmarks' not in self.settings:
+            self.settings['auto_discover_bookmarks'] = False # Also merge workspace XMLs found in JetBrains config dirs
+        if 'split_statements' not in self.settings:
+            self.settings['split_statements'] = False # List multi-statement files/queries one statement per row
+        if 'sql_dialect' not in self.settings:
+            self.settings['sql_dialect'] = 'generic' # Statement splitting rules, see SQL_DIALECTS
+        if 'large_preview_threshold_mb' not in self.settings:
+            self.settings['large_preview_threshold_mb'] = 4 # Files this size or larger are previewed a window at a time
+        if 'large_preview_window_lines' not in self.settings:
+            self.settings['large_preview_window_lines'] = 2000 # Lines loaded per window of a large-file preview
 
     def save_settings(self):
         try:
@@ -431,76 +496,3346 @@ class QueryVault:
         """Get all queries with a specific label."""
         return [query for query in self.queries if 'labels' in query and label in query['labels']]
 
+# --- Search Indexing ---
+def record_key(record):
+    """Return the key used to identify a bookmark/query record inside the search indexes."""
+    rid = record.get('id')
+    return rid if rid is not None else id(record)
+
+def record_title(record):
+    """Return the display title of a bookmark/query record."""
+    return record.get('title') or record.get('name', '') or ''
+
+class LRUCache:
+    """Bounded least-recently-used mapping with hit/miss/eviction counters."""
+    def __init__(self, max_entries=128):
+        self.max_entries = max(1, int(max_entries))
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def items(self):
+        """Return a snapshot list of the (key, value) pairs, least recently used first."""
+        with self.lock:
+            return list(self.entries.items())
+
+    def discard(self, predicate):
+        """Drop the entries whose key satisfies predicate."""
+        with self.lock:
+            for key in [key for key in self.entries if predicate(key)]:
+                del self.entries[key]
+
+    def stats(self):
+        """Return counters for tuning: size, capacity, hits, misses, evictions and hit rate."""
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': (self.hits / lookups) if lookups else 0.0,
+        }
+
+class SearchCancelled(Exception):
+    """Raised inside a search that has been superseded by a newer one."""
+
+class TrigramIndex:
+    """Trigram index over lower-cased text for arbitrary-substring search.
+
+    Every 3-character slice of a document maps to the set of document keys containing it.
+    A substring query intersects the postings of its own trigrams to get a small candidate
+    set, and only those candidates are verified with a plain `in` test.
+    """
+    def __init__(self):
+        self.postings = {}  # trigram -> set of doc keys
+        self.texts = {}     # doc key -> lower-cased text
+
+    @staticmethod
+    def trigrams(text):
+        """Return the set of distinct trigrams in text."""
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def clear(self):
+        self.postings = {}
+        self.texts = {}
+
+    def add(self, key, text):
+        """Index (or re-index) a document under key."""
+        if key in self.texts:
+            self.remove(key)
+        text = (text or '').lower()
+        self.texts[key] = text
+        for gram in self.trigrams(text):
+            self.postings.setdefault(gram, set()).add(key)
+
+    def remove(self, key):
+        """Drop a document from the index."""
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+        for gram in self.trigrams(text):
+            keys = self.postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[gram]
+
+    def candidates(self, term):
+        """Return the keys that contain every trigram of term, or None if term is too short to narrow."""
+        grams = self.trigrams(term)
+        if not grams:
+            return None
+        # Intersect the rarest postings first so the working set shrinks as fast as possible
+        postings = sorted((self.postings.get(gram, ()) for gram in grams), key=len)
+        result = set(postings[0])
+        for keys in postings[1:]:
+            if not result:
+                break
+            result &= keys
+        return result
+
+    VERIFY_CHUNK = 2048  # Candidates verified between cancellation checks
+
+    def snapshot(self, term, within=None):
+        """Return (candidate keys, texts) for verifying term; the only part that reads the postings.
+
+        Call under the owner's lock, then run verify() outside it. texts is the live
+        key -> text dict: verify() only does single-key lookups on it, which stay safe while
+        another thread adds or removes documents (it then sees the old or the new text).
+        """
+        candidates = self.candidates(term.lower())
+        if candidates is None:
+            candidates = list(self.texts) if within is None else list(within)
+        else:
+            candidates = list(candidates if within is None else candidates & set(within))
+        return candidates, self.texts
+
+    @classmethod
+    def verify(cls, term, candidates, texts, is_cancelled=None):
+        """Return the candidate keys whose snapshotted text contains term (case-insensitive)."""
+        term = term.lower()
+        if is_cancelled is None:
+            return {key for key in candidates if term in texts.get(key, '')}
+        matched = set()
+        for start in range(0, len(candidates), cls.VERIFY_CHUNK):
+            if is_cancelled():
+                raise SearchCancelled()
+            matched.update(key for key in candidates[start:start + cls.VERIFY_CHUNK]
+                           if term in texts.get(key, ''))
+        return matched
+
+    def search(self, term, within=None, is_cancelled=None):
+        """Return the set of keys whose text contains term (case-insensitive)."""
+        return self.verify(term, *self.snapshot(term, within), is_cancelled)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9_]+")
+
+def tokenize(text):
+    """Split text into lower-cased word tokens (identifiers, keywords, numbers)."""
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+class BM25Index:
+    """BM25 relevance index over the title and SQL fields of each record.
+
+    Postings are kept as plain dicts so records can be added/removed cheaply, and are
+    compiled lazily into NumPy arrays so a query scores every posting of a term in one
+    vectorized step.
+    """
+    K1 = 1.2
+    B = 0.75
+    FIELD_BOOSTS = {'title': 2.5, 'sql': 1.0}  # Title hits weigh more than SQL body hits
+    COMPACT_RATIO = 0.25  # Compact once this fraction of slots is dead
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.keys = []   # slot -> key (None once removed)
+        self.slots = {}  # key -> slot
+        self.terms = {field: {} for field in self.FIELD_BOOSTS}    # field -> term -> {slot: tf}
+        self.lengths = {field: {} for field in self.FIELD_BOOSTS}  # field -> slot -> token count
+        self.doc_terms = {}  # slot -> field -> distinct terms, for cheap removal
+        self._compiled = None
+
+    def __len__(self):
+        return len(self.slots)
+
+    def add(self, key, fields):
+        """Index a record under key; fields maps field name to its text."""
+        if key in self.slots:
+            self.remove(key)
+        slot = len(self.keys)
+        self.keys.append(key)
+        self.slots[key] = slot
+        self.doc_terms[slot] = {}
+        for field in self.FIELD_BOOSTS:
+            tokens = tokenize(fields.get(field, ''))
+            self.lengths[field][slot] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            postings = self.terms[field]
+            for token, tf in counts.items():
+                postings.setdefault(token, {})[slot] = tf
+            self.doc_terms[slot][field] = tuple(counts)
+        self._compiled = None
+
+    def remove(self, key):
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return
+        self.keys[slot] = None
+        doc_terms = self.doc_terms.pop(slot, {})
+        for field in self.FIELD_BOOSTS:
+            self.lengths[field].pop(slot, None)
+            postings = self.terms[field]
+            for token in doc_terms.get(field, ()):
+                docs = postings.get(token)
+                if docs is not None:
+                    docs.pop(slot, None)
+                    if not docs:
+                        del postings[token]
+        self._compiled = None
+        if len(self.keys) - len(self.slots) > self.COMPACT_RATIO * len(self.keys):
+            self._compact()
+
+    def _compact(self):
+        """Drop dead slots and renumber the rest, so re-added records do not grow the arrays forever."""
+        renumber = {}
+        for slot, key in enumerate(self.keys):
+            if key is not None:
+                renumber[slot] = len(renumber)
+        self.keys = [key for key in self.keys if key is not None]
+        self.slots = {key: slot for slot, key in enumerate(self.keys)}
+        for field in self.FIELD_BOOSTS:
+            self.terms[field] = {token: {renumber[slot]: tf for slot, tf in docs.items()}
+                                 for token, docs in self.terms[field].items()}
+            self.lengths[field] = {renumber[slot]: length for slot, length in self.lengths[field].items()}
+        self.doc_terms = {renumber[slot]: terms for slot, terms in self.doc_terms.items()}
+        self._compiled = None
+
+    def _compile(self):
+        """Freeze postings into arrays: per field, term -> (slots, tfs) plus a length-norm vector."""
+        size = len(self.keys)
+        compiled = {}
+        for field in self.FIELD_BOOSTS:
+            lengths = np.zeros(size, dtype=np.float32)
+            for slot, length in self.lengths[field].items():
+                lengths[slot] = length
+            avgdl = float(lengths.sum()) / max(1, len(self.slots))
+            norm = self.K1 * (1.0 - self.B + self.B * lengths / avgdl) if avgdl else np.full(size, self.K1, dtype=np.float32)
+            postings = {
+                token: (np.fromiter(docs.keys(), dtype=np.int32, count=len(docs)),
+                        np.fromiter(docs.values(), dtype=np.float32, count=len(docs)))
+                for token, docs in self.terms[field].items()
+            }
+            compiled[field] = (postings, norm)
+        self._compiled = compiled
+        return compiled
+
+    def score(self, query, fields=None):
+        """Return a score per slot for query (a string) over the given fields."""
+        compiled = self._compiled or self._compile()
+        scores = np.zeros(len(self.keys), dtype=np.float32)
+        n_docs = len(self.slots)
+        if not n_docs:
+            return scores
+        terms = set(tokenize(query))
+        for field in fields or self.FIELD_BOOSTS:
+            postings, norm = compiled[field]
+            boost = self.FIELD_BOOSTS[field]
+            for term in terms:
+                posting = postings.get(term)
+                if posting is None:
+                    continue
+                slots, tfs = posting
+                idf = np.log1p((n_docs - len(slots) + 0.5) / (len(slots) + 0.5))
+                scores[slots] += boost * idf * tfs * (self.K1 + 1.0) / (tfs + norm[slots])
+        return scores
+
+    def top_k(self, query, k=100, fields=None, within=None):
+        """Return up to k (key, score) pairs with the highest positive scores, best first."""
+        scores = self.score(query, fields)
+        hits = np.flatnonzero(scores > 0)
+        if within is not None:
+            allowed = np.fromiter((self.slots[key] for key in within if key in self.slots), dtype=np.int64)
+            hits = np.intersect1d(hits, allowed, assume_unique=False)
+        best = heapq.nlargest(k, hits.tolist(), key=scores.__getitem__)
+        return [(self.keys[slot], float(scores[slot])) for slot in best]
+
+    def score_keys(self, query, keys, fields=None):
+        """Return the score of each of keys for query (0.0 for unindexed keys), in order."""
+        scores = self.score(query, fields)
+        return [float(scores[self.slots[key]]) if key in self.slots else 0.0 for key in keys]
+
+# --- SQL Reference Extraction ---
+SQL_NOISE_PATTERN = re.compile(r"--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'", re.DOTALL)
+SQL_REF_TOKEN_PATTERN = re.compile(r"[A-Za-z_][\w$]*(?:\s*\.\s*(?:[A-Za-z_][\w$]*|\*))*|[(),;]")
+SQL_TABLE_KEYWORDS = {'FROM', 'JOIN', 'UPDATE', 'INTO'}
+SQL_RESERVED_WORDS = {
+    'SELECT', 'FROM', 'WHERE', 'JOIN', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'FULL', 'CROSS', 'NATURAL',
+    'ON', 'USING', 'AS', 'AND', 'OR', 'NOT', 'IN', 'IS', 'NULL', 'GROUP', 'ORDER', 'BY', 'HAVING',
+    'LIMIT', 'OFFSET', 'UNION', 'ALL', 'EXCEPT', 'INTERSECT', 'INSERT', 'INTO', 'VALUES', 'UPDATE',
+    'SET', 'DELETE', 'CREATE', 'ALTER', 'DROP', 'TABLE', 'VIEW', 'INDEX', 'WITH', 'CASE', 'WHEN',
+    'THEN', 'ELSE', 'END', 'DISTINCT', 'LATERAL', 'WINDOW', 'QUALIFY', 'FETCH', 'RETURNING', 'TOP',
+}
+SEARCH_QUALIFIER_PATTERN = re.compile(r"\b(table|column|join):(\S+)", re.IGNORECASE)
+
+def extract_sql_references(sql):
+    """Return the tables, aliases, joined tables and columns referenced by sql.
+
+    This is a lightweight token scan, not a parser: comments and string literals are dropped,
+    table names are taken after FROM/JOIN/UPDATE/INTO (and comma lists after FROM), and
+    columns are taken from qualified `alias.column` references. Names are lower-cased;
+    schema-qualified tables are recorded both in full and by their last part.
+    """
+    refs = {'tables': set(), 'aliases': {}, 'joins': set(), 'columns': set()}
+    if not sql:
+        return refs
+    cleaned = SQL_NOISE_PATTERN.sub(' ', sql)
+    cleaned = cleaned.replace('"', '').replace('`', '').replace('[', '').replace(']', '')
+    tokens = [re.sub(r"\s+", '', tok) for tok in SQL_REF_TOKEN_PATTERN.findall(cleaned)]
+    table_positions = set()
+
+    def is_name(pos):
+        return pos < len(tokens) and tokens[pos] not in '(),;' and tokens[pos].upper() not in SQL_RESERVED_WORDS
+
+    def take_table(pos, joined):
+        """Record the table (and alias) at pos; return the position after them."""
+        name = tokens[pos].lower()
+        table_positions.add(pos)
+        for table in {name, name.rsplit('.', 1)[-1]}:
+            refs['tables'].add(table)
+            if joined:
+                refs['joins'].add(table)
+        pos += 1
+        if pos < len(tokens) and tokens[pos].upper() == 'AS':
+            pos += 1
+        if is_name(pos) and '.' not in tokens[pos]:
+            refs['aliases'][tokens[pos].lower()] = name
+            table_positions.add(pos)
+            pos += 1
+        return pos
+
+    i = 0
+    while i < len(tokens):
+        word = tokens[i].upper()
+        if word in SQL_TABLE_KEYWORDS and is_name(i + 1):
+            i = take_table(i + 1, word == 'JOIN')
+            # FROM a x, b y, ...
+            while word == 'FROM' and i < len(tokens) and tokens[i] == ',' and is_name(i + 1):
+                i = take_table(i + 1, False)
+            continue
+        i += 1
+
+    for pos, tok in enumerate(tokens):
+        if pos in table_positions or '.' not in tok:
+            continue
+        qualifier, column = tok.lower().rsplit('.', 1)
+        if column == '*':
+            continue
+        table = refs['aliases'].get(qualifier, qualifier)
+        refs['columns'].add(column)
+        refs['columns'].add(f"{table.rsplit('.', 1)[-1]}.{column}")
+    return refs
+
+def parse_search_qualifiers(term):
+    """Split `table:` / `column:` / `join:` qualifiers out of a search term.
+
+    Returns (remaining plain text, [(kind, value), ...]) with kinds and values lower-cased.
+    """
+    qualifiers = [(kind.lower(), value.lower()) for kind, value in SEARCH_QUALIFIER_PATTERN.findall(term or '')]
+    if not qualifiers:
+        return term or '', []
+    plain = ' '.join(SEARCH_QUALIFIER_PATTERN.sub(' ', term).split())
+    return plain, qualifiers
+
+class SQLReferenceIndex:
+    """Maps each table, joined table and column name to the keys of the queries using it."""
+    KINDS = {'table': 'tables', 'join': 'joins', 'column': 'columns'}
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.postings = {field: {} for field in self.KINDS.values()}  # field -> name -> set of keys
+        self.refs = {}  # key -> extracted references
+
+    def add(self, key, sql):
+        if key in self.refs:
+            self.remove(key)
+        refs = extract_sql_references(sql)
+        self.refs[key] = refs
+        for field, postings in self.postings.items():
+            for name in refs[field]:
+                postings.setdefault(name, set()).add(key)
+
+    def remove(self, key):
+        refs = self.refs.pop(key, None)
+        if refs is None:
+            return
+        for field, postings in self.postings.items():
+            for name in refs[field]:
+                keys = postings.get(name)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del postings[name]
+
+    def lookup(self, kind, name):
+        """Return the keys referencing name as the given kind ('table', 'join' or 'column')."""
+        field = self.KINDS.get(kind)
+        if field is None:
+            return set()
+        return set(self.postings[field].get(name.lower(), ()))
+
+    def lookup_all(self, qualifiers):
+        """Return the keys satisfying every (kind, name) qualifier."""
+        result = None
+        for kind, name in sorted(qualifiers, key=lambda q: len(self.lookup(*q))):
+            keys = self.lookup(kind, name)
+            result = keys if result is None else result & keys
+            if not result:
+                return set()
+        return result if result is not None else set()
+
+class CompletionIndex:
+    """Sorted-prefix index of search-box completions (titles, label: and table: qualifiers).
+
+    Each entry maps a lower-cased match text to the completion inserted into the search box.
+    Lookups bisect into the sorted match texts; suggestions are weighted by the summed usage
+    counts of the records that contributed them, kept up to date by add/remove/update_count.
+    Prefixes that cover many entries (typically one or two characters) keep their TOP_K best
+    completions, updated as weights grow, so they are answered without walking the range.
+
+    Has its own lock, so lookups from the search box never wait behind SearchIndex.lock.
+    """
+    CACHE_SIZE = 256  # Cached suggestion lists; a change drops only the prefixes it touches
+    TOP_K = 32        # Completions kept per wide prefix; larger limits walk the range
+    TOP_RANGE = 512   # Entries under a prefix before it gets a kept top list
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}      # (match text, completion) -> set of keys
+            self.key_entries = {}  # key -> list of (match text, completion)
+            self.counts = {}       # key -> usage count
+            self.weights = {}      # (match text, completion) -> summed usage count of its keys
+            self._sorted = []      # sorted (match text, completion)
+            self._dirty = False
+            self._cache = LRUCache(self.CACHE_SIZE)  # (prefix, limit) -> suggestions
+            self._tops = {}        # wide prefix -> {completion: weight} of its TOP_K best completions
+            self._top_len = 0      # Longest prefix in _tops
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def record_entries(record, tables):
+        entries = []
+        title = record_title(record).strip()
+        if title:
+            entries.append((title.lower(), title))
+        labels = record.get('labels')
+        if isinstance(labels, list):
+            for label in labels:
+                completion = f'label:"{label}"' if ' ' in str(label) else f"label:{label}"
+                entries.append((str(label).lower(), completion))
+                entries.append((completion.lower(), completion))
+        for table in tables:
+            completion = f"table:{table}"
+            entries.append((table, completion))
+            entries.append((completion, completion))
+        return entries
+
+    @staticmethod
+    def usage_count(count):
+        try:
+            return int(count or 0)
+        except (ValueError, TypeError):
+            return 0
+
+    @staticmethod
+    def _rank(item):
+        """Sort key of a (completion, weight) pair: most used first, then alphabetical."""
+        return -item[1], item[0].lower()
+
+    def add(self, key, record, tables=()):
+        with self.lock:
+            self.remove(key)
+            entries = list(dict.fromkeys(self.record_entries(record, tables)))
+            count = self.usage_count(record.get('count', 0))
+            self.key_entries[key] = entries
+            self.counts[key] = count
+            for entry in entries:
+                keys = self.entries.get(entry)
+                if keys is None:
+                    self.entries[entry] = keys = set()
+                    self.weights[entry] = 0
+                    if not self._dirty:
+                        # Single additions keep the list sorted; bulk loads sort once on the next lookup
+                        if len(self.entries) - 1 == len(self._sorted) and len(self._sorted) < 10000:
+                            bisect.insort(self._sorted, entry)
+                        else:
+                            self._dirty = True
+                keys.add(key)
+                self.weights[entry] += count
+                self._raise_tops(entry)
+            self._forget(entries)
+
+    def remove(self, key):
+        with self.lock:
+            entries = self.key_entries.pop(key, None)
+            count = self.counts.pop(key, 0)
+            if not entries:
+                return
+            for entry in entries:
+                keys = self.entries.get(entry)
+                if keys is None:
+                    continue
+                keys.discard(key)
+                if keys:
+                    self.weights[entry] -= count
+                else:
+                    del self.entries[entry]
+                    del self.weights[entry]
+                    if not self._dirty:
+                        del self._sorted[bisect.bisect_left(self._sorted, entry)]
+                if count or not keys:
+                    self._drop_tops(entry)
+            self._forget(entries)
+
+    def update_count(self, key, count):
+        """Move key's usage count into the weights of the entries it contributed."""
+        with self.lock:
+            count = self.usage_count(count)
+            delta = count - self.counts.get(key, count)
+            if not delta:
+                return
+            self.counts[key] = count
+            entries = self.key_entries.get(key, ())
+            for entry in entries:
+                self.weights[entry] += delta
+                if delta > 0:
+                    self._raise_tops(entry)
+                else:
+                    self._drop_tops(entry)
+            self._forget(entries)
+
+    def _top_prefixes(self, text):
+        """Yield the prefixes of text that keep a top list."""
+        for length in range(1, min(len(text), self._top_len) + 1):
+            prefix = text[:length]
+            if prefix in self._tops:
+                yield prefix
+
+    def _raise_tops(self, entry):
+        """Fold an entry whose weight grew (or that is new) into the top lists of its prefixes."""
+        if not self._tops:
+            return
+        text, completion = entry
+        weight = self.weights[entry]
+        for prefix in self._top_prefixes(text):
+            top = self._tops[prefix]
+            if completion in top:
+                top[completion] = max(top[completion], weight)
+            elif len(top) < self.TOP_K:
+                top[completion] = weight  # Fewer than TOP_K completions under prefix: all are kept
+            else:
+                worst = max(top.items(), key=self._rank)
+                if self._rank((completion, weight)) < self._rank(worst):
+                    del top[worst[0]]
+                    top[completion] = weight
+
+    def _drop_tops(self, entry):
+        """Discard the top lists an entry whose weight shrank (or that is gone) may have been ranked in."""
+        if not self._tops:
+            return
+        text, completion = entry
+        for prefix in list(self._top_prefixes(text)):
+            if completion in self._tops[prefix]:
+                del self._tops[prefix]  # Rebuilt from the range on its next lookup
+
+    def _forget(self, entries):
+        """Drop the cached suggestions of every prefix of the given entries' match texts."""
+        if entries and len(self._cache):
+            texts = [text for text, _ in entries]
+            self._cache.discard(lambda cached: any(text.startswith(cached[0]) for text in texts))
+
+    def _best(self, prefix, start, end):
+        """Return {completion: weight} over the sorted entries [start, end) under prefix."""
+        best = {}
+        weights = self.weights
+        for entry in self._sorted[start:end]:
+            completion = entry[1]
+            weight = weights[entry]
+            if weight > best.get(completion, -1):
+                best[completion] = weight
+        return best
+
+    def complete(self, prefix, limit=8):
+        """Return up to limit completions for prefix, most used first."""
+        prefix = (prefix or '').lower()
+        if not prefix:
+            return []
+        with self.lock:
+            if self._dirty:
+                self._sorted = sorted(self.entries)
+                self._dirty = False
+            cached = self._cache.get((prefix, limit))
+            if cached is not None:
+                return cached
+            top = self._tops.get(prefix)
+            if top is None or limit >= self.TOP_K:
+                start = bisect.bisect_left(self._sorted, (prefix,))
+                end = bisect.bisect_left(self._sorted, (prefix + '\uffff',), start)
+                best = self._best(prefix, start, end)
+                if end - start >= self.TOP_RANGE and limit < self.TOP_K:
+                    top = dict(heapq.nsmallest(self.TOP_K, best.items(), key=self._rank))
+                    self._tops[prefix] = top
+                    self._top_len = max(self._top_len, len(prefix))
+            else:
+                best = top
+            # Skip a completion that is already fully typed
+            candidates = (item for item in best.items() if item[0].lower() != prefix)
+            suggestions = [c for c, _ in heapq.nsmallest(limit, candidates, key=self._rank)]
+            self._cache.put((prefix, limit), suggestions)
+            return suggestions
+
+def parse_timestamp(value):
+    """Return the epoch seconds of an ISO timestamp string, or NaN if missing/invalid."""
+    if not value:
+        return float('nan')
+    from datetime import datetime
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except (ValueError, TypeError, OverflowError, OSError):
+        return float('nan')
+
+class MetadataColumns:
+    """Record metadata mirrored in NumPy columns for vectorized range filters.
+
+    Columns: created/modified (epoch seconds, NaN when unknown), usage count, SQL body
+    length and a label bitmask (one bit per distinct label, in 64-bit words). Rows are
+    appended and tombstoned like BM25Index slots, compacted the same way, and compiled
+    lazily into arrays.
+
+    Filters (all optional, combined with AND):
+        modified_within_days, created_within_days, modified_after, modified_before,
+        created_after, created_before (epoch seconds), min_count, max_count,
+        min_length, max_length, labels_all, labels_any, labels_none.
+    """
+    DAY = 86400.0
+    COMPACT_RATIO = 0.25  # Compact once this fraction of rows is tombstoned
+    FILTER_KEYS = ('modified_within_days', 'created_within_days', 'modified_after', 'modified_before',
+                   'created_after', 'created_before', 'min_count', 'max_count', 'min_length', 'max_length',
+                   'labels_all', 'labels_any', 'labels_none')
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.keys = []   # slot -> key (None once removed)
+        self.slots = {}  # key -> slot
+        self.label_bits = {}  # lower-cased label -> bit
+        self._rows = []  # slot -> [created, modified, count, length, label mask]
+        self._compiled = None
+
+    def __len__(self):
+        return len(self.slots)
+
+    def add(self, key, record, sql_text):
+        if key in self.slots:
+            self.remove(key)
+        mask = 0
+        labels = record.get('labels')
+        if isinstance(labels, list):
+            for label in labels:
+                bit = self.label_bits.setdefault(str(label).lower(), len(self.label_bits))
+                mask |= 1 << bit
+        created = parse_timestamp(record.get('created_at'))
+        modified = parse_timestamp(record.get('modified_at'))
+        if modified != modified:  # Never modified: use the creation time
+            modified = created
+        try:
+            count = int(record.get('count', 0) or 0)
+        except (ValueError, TypeError):
+            count = 0
+        self.slots[key] = len(self.keys)
+        self.keys.append(key)
+        self._rows.append([created, modified, count, len(sql_text or ''), mask])
+        self._compiled = None
+
+    def remove(self, key):
+        slot = self.slots.pop(key, None)
+        if slot is None:
+            return
+        self.keys[slot] = None
+        self._compiled = None
+        if len(self.keys) - len(self.slots) > self.COMPACT_RATIO * len(self.keys):
+            self._compact()
+
+    def _compact(self):
+        """Drop tombstoned rows and renumber the rest."""
+        self._rows = [row for row, key in zip(self._rows, self.keys) if key is not None]
+        self.keys = [key for key in self.keys if key is not None]
+        self.slots = {key: slot for slot, key in enumerate(self.keys)}
+        self._compiled = None
+
+    def set_count(self, key, count):
+        """Update one record's usage count (cheap; no recompile)."""
+        slot = self.slots.get(key)
+        if slot is None:
+            return
+        self._rows[slot][2] = count
+        if self._compiled is not None:
+            self._compiled['count'][slot] = count
+
+    def _compile(self):
+        if self._compiled is None:
+            rows = self._rows
+            words = max(1, (len(self.label_bits) + 63) // 64)
+            masks = [row[4] for row in rows]
+            self._compiled = {
+                'created': np.array([row[0] for row in rows], dtype=np.float64),
+                'modified': np.array([row[1] for row in rows], dtype=np.float64),
+                'count': np.array([row[2] for row in rows], dtype=np.int64),
+                'length': np.array([row[3] for row in rows], dtype=np.int64),
+                'labels': np.array([[(m >> (64 * w)) & 0xFFFFFFFFFFFFFFFF for w in range(words)] for m in masks],
+                                   dtype=np.uint64).reshape(len(rows), words),
+                'live': np.array([key is not None for key in self.keys], dtype=bool),
+            }
+        return self._compiled
+
+    def _label_column(self, columns, label):
+        bit = self.label_bits.get(str(label).lower())
+        if bit is None:
+            return np.zeros(len(self.keys), dtype=bool)
+        word = columns['labels'][:, bit // 64]
+        return ((word >> np.uint64(bit % 64)) & np.uint64(1)).astype(bool)
+
+    def mask(self, filters, now=None):
+        """Return a boolean row mask (by slot) of live records satisfying filters."""
+        columns = self._compile()
+        mask = columns['live'].copy()
+        if not filters:
+            return mask
+        now = time.time() if now is None else now
+        with np.errstate(invalid='ignore'):  # NaN timestamps simply fail date filters
+            if filters.get('modified_within_days') is not None:
+                mask &= columns['modified'] >= now - float(filters['modified_within_days']) * self.DAY
+            if filters.get('created_within_days') is not None:
+                mask &= columns['created'] >= now - float(filters['created_within_days']) * self.DAY
+            for name, column, compare in (('modified_after', 'modified', np.greater_equal),
+                                          ('modified_before', 'modified', np.less),
+                                          ('created_after', 'created', np.greater_equal),
+                                          ('created_before', 'created', np.less)):
+                if filters.get(name) is not None:
+                    mask &= compare(columns[column], float(filters[name]))
+        for name, column, compare in (('min_count', 'count', np.greater_equal), ('max_count', 'count', np.less_equal),
+                                      ('min_length', 'length', np.greater_equal), ('max_length', 'length', np.less_equal)):
+            if filters.get(name) is not None:
+                mask &= compare(columns[column], int(filters[name]))
+        for label in filters.get('labels_all') or ():
+            mask &= self._label_column(columns, label)
+        if filters.get('labels_any'):
+            any_mask = np.zeros(len(self.keys), dtype=bool)
+            for label in filters['labels_any']:
+                any_mask |= self._label_column(columns, label)
+            mask &= any_mask
+        for label in filters.get('labels_none') or ():
+            mask &= ~self._label_column(columns, label)
+        return mask
+
+    def select(self, filters=None, now=None, **kwargs):
+        """Return the set of keys satisfying filters (a dict and/or keyword filters)."""
+        filters = dict(filters or {}, **kwargs)
+        unknown = set(filters) - set(self.FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown metadata filter(s): {', '.join(sorted(unknown))}")
+        keys = self.keys
+        return {keys[slot] for slot in np.flatnonzero(self.mask(filters, now))}
+
+class SearchIndex:
+    """Title and SQL trigram indexes plus BM25 ranking for the currently loaded bookmarks/queries.
+
+    All reads and writes go through `lock`, so searches can run on a worker thread while
+    the GUI thread rebuilds or updates the index. Searches only hold it to copy out candidate
+    keys and texts; verification and sorting run outside it, so index updates and completion
+    lookups on the GUI thread never wait behind a slow search.
+    """
+    def __init__(self):
+        self.title_index = TrigramIndex()
+        self.sql_index = TrigramIndex()
+        self.bm25 = BM25Index()
+        self.refs = SQLReferenceIndex()
+        self.completions = CompletionIndex()
+        self.metadata = MetadataColumns()
+        self.sources = {}   # key -> SOURCE_DATAGRIP / SOURCE_INTERNAL, only set for federated lists
+        self.fingerprints = {}  # key -> hash of (title, SQL, labels, dates), to find changed records on sync
+        self.source = None  # The bookmark list the index was built from
+        self.records = {}   # key -> record, for turning cached key lists back into records
+        self.documents = {}  # key -> (title, SQL) as written, for regex search
+        self.generation = 0  # Bumped on every change so cached results can be invalidated
+        self._regex_docs = None  # (generation, {key: (title, SQL)}, total chars)
+        self._label_keys = None  # (generation, {label: set of keys})
+        self.lock = threading.RLock()
+
+    def build(self, records, content_getter, sources=None):
+        """Rebuild all indexes from records, using content_getter(record) to fetch SQL text.
+
+        sources optionally maps record keys to the data source they came from.
+        """
+        with self.lock:
+            self.sources = dict(sources or {})
+            self.title_index.clear()
+            self.sql_index.clear()
+            self.bm25.clear()
+            self.refs.clear()
+            self.completions.clear()
+            self.metadata.clear()
+            self.records = {}
+            self.documents = {}
+            self.fingerprints = {}
+            for record in records:
+                if isinstance(record, dict):
+                    self.add_record(record, content_getter(record))
+            self.source = records
+            self.generation += 1
+        logging.info(f"Search index built: {len(self.title_index)} records, {len(self.sql_index.postings)} SQL trigrams")
+
+    def adopt(self, other):
+        """Take over the indexes of another SearchIndex, e.g. one built on a pool thread."""
+        with self.lock:
+            for name in ('title_index', 'sql_index', 'bm25', 'refs', 'completions', 'metadata',
+                         'sources', 'fingerprints', 'source', 'records', 'documents'):
+                setattr(self, name, getattr(other, name))
+            self._regex_docs = None
+            self._label_keys = None
+            self.generation += 1
+        logging.info(f"Search index swapped in: {len(self.title_index)} records")
+
+    SYNC_REBUILD_RATIO = 0.5  # Rebuild from scratch when more than this fraction changed
+
+    @staticmethod
+    def fingerprint(record, sql_text):
+        labels = record.get('labels')
+        # Records that carry a content hash (catalog files) are fingerprinted without their SQL
+        content = record.get('content_hash') or sql_text or ''
+        return hash((record_title(record), content, tuple(labels) if isinstance(labels, list) else (),
+                     record.get('created_at'), record.get('modified_at')))
+
+    def sync(self, records, content_getter, sources=None):
+        """Bring the indexes in line with records, re-indexing only records whose title, SQL or labels changed.
+
+        Returns (changed keys, removed keys), or None if the indexes were rebuilt from scratch.
+        """
+        with self.lock:
+            current = {}
+            for record in records:
+                if isinstance(record, dict):
+                    # Content of hashed records is only read if the hash says it changed
+                    current[record_key(record)] = (record, None if record.get('content_hash') else content_getter(record))
+            removed = set(self.records) - set(current)
+            changed = {key for key, (record, sql_text) in current.items()
+                       if self.fingerprints.get(key) != self.fingerprint(record, sql_text)}
+
+            def sql_of(record):
+                sql_text = current[record_key(record)][1]
+                return content_getter(record) if sql_text is None else sql_text
+
+            if not self.records or len(changed) + len(removed) > self.SYNC_REBUILD_RATIO * max(1, len(current)):
+                self.build(records, sql_of, sources)
+                return None
+            self.sources = dict(sources or {})
+            for key in removed:
+                self.remove_record(key)
+            for key, (record, sql_text) in current.items():
+                if key in changed:
+                    self.add_record(record, sql_of(record))
+                else:
+                    # Same content, but possibly a new dict object after a reload
+                    self.records[key] = record
+                    self.completions.update_count(key, record.get('count', 0))
+                    self.metadata.set_count(key, record.get('count', 0))
+            self.source = records
+            self.generation += 1
+        logging.info(f"Search index synced: {len(changed)} changed, {len(removed)} removed")
+        return changed, removed
+
+    def add_record(self, record, sql_text):
+        key = record_key(record)
+        with self.lock:
+            self.records[key] = record
+            self.documents[key] = (record_title(record), sql_text or '')
+            self.fingerprints[key] = self.fingerprint(record, sql_text)
+            self.title_index.add(key, record_title(record))
+            self.sql_index.add(key, sql_text)
+            self.bm25.add(key, {'title': record_title(record), 'sql': sql_text})
+            self.refs.add(key, sql_text)
+            self.completions.add(key, record, self.refs.refs[key]['tables'])
+            self.metadata.add(key, record, sql_text)
+            self.generation += 1
+
+    def remove_record(self, key):
+        with self.lock:
+            self.records.pop(key, None)
+            self.documents.pop(key, None)
+            self.fingerprints.pop(key, None)
+            self.title_index.remove(key)
+            self.sql_index.remove(key)
+            self.bm25.remove(key)
+            self.refs.remove(key)
+            self.completions.remove(key)
+            self.metadata.remove(key)
+            self.generation += 1
+
+    def match(self, term, search_title=True, search_syntax=True, within=None, is_cancelled=None):
+        """Return the keys whose title and/or SQL contain term.
+
+        Candidates and their texts are copied under the lock; the substring checks run outside it.
+        """
+        with self.lock:
+            titles = self.title_index.snapshot(term, within) if search_title else None
+            sqls = self.sql_index.snapshot(term, within) if search_syntax else None
+        matched = set()
+        if titles is not None:
+            matched |= TrigramIndex.verify(term, *titles, is_cancelled)
+        if sqls is not None:
+            candidates, texts = sqls
+            if matched:
+                candidates = [key for key in candidates if key not in matched]
+            matched |= TrigramIndex.verify(term, candidates, texts, is_cancelled)
+        return matched
+
+    def label_keys(self):
+        """Return {lower-cased label: set of keys}, cached per generation."""
+        with self.lock:
+            if self._label_keys is None or self._label_keys[0] != self.generation:
+                labels = {}
+                for key, record in self.records.items():
+                    record_labels = record.get('labels')
+                    if isinstance(record_labels, list):
+                        for label in record_labels:
+                            labels.setdefault(str(label).lower(), set()).add(key)
+                self._label_keys = (self.generation, labels)
+            return self._label_keys[1]
+
+    def regex_documents(self):
+        """Return ({key: (title, SQL)} of the text as written, total chars), cached per generation.
+
+        The dict is a copy, so it can be handed to worker processes outside the lock.
+        """
+        with self.lock:
+            if self._regex_docs is None or self._regex_docs[0] != self.generation:
+                docs = dict(self.documents)
+                size = sum(len(title) + len(sql) for title, sql in docs.values())
+                self._regex_docs = (self.generation, docs, size)
+            return self._regex_docs[1], self._regex_docs[2]
+
+    def update_count(self, key, count):
+        """Record a usage-count change; bumps the generation since count filters may change."""
+        with self.lock:
+            self.metadata.set_count(key, count)
+            self.completions.update_count(key, count)
+            self.generation += 1
+
+    def complete(self, prefix, limit=8):
+        """Return search-box completions for prefix, most used first."""
+        # CompletionIndex has its own lock; searches holding self.lock must not delay typing
+        return self.completions.complete(prefix, limit)
+
+    def rank(self, term, search_title=True, search_syntax=True, k=100, within=None):
+        """Return up to k (key, score) pairs ranked by BM25 over the selected fields."""
+        fields = [field for field, on in (('title', search_title), ('sql', search_syntax)) if on]
+        if not fields:
+            return []
+        with self.lock:
+            return self.bm25.top_k(term, k, fields, within)
+
+    def relevance(self, term, keys, search_title=True, search_syntax=True):
+        """Return the BM25 score of each of keys for term over the selected fields."""
+        fields = [field for field, on in (('title', search_title), ('sql', search_syntax)) if on]
+        if not fields:
+            return [0.0] * len(keys)
+        with self.lock:
+            return self.bm25.score_keys(term, keys, fields)
+
+# --- Boolean Query Language ---
+BOOLEAN_QUERY_TOKEN_PATTERN = re.compile(r'\s*(?:(\()|(\))|"([^"]*)"|([A-Za-z]+:"[^"]*")|([^\s()]+))')
+BOOLEAN_OPERATOR_PATTERN = re.compile(r'\b(?:AND|OR|NOT)\b')  # Upper-case only
+BOOLEAN_QUALIFIER_PATTERN = re.compile(r'\b(?:label|title|sql|id):\S', re.IGNORECASE)
+BOOLEAN_OPERATORS = {'AND', 'OR', 'NOT'}
+BOOLEAN_QUALIFIERS = {'label', 'title', 'sql', 'id', 'table', 'column', 'join'}
+
+def is_boolean_query(term):
+    """True if term uses the query language: upper-case AND/OR/NOT or a label:/title:/sql:/id: qualifier.
+
+    Parentheses and -word only mean something once one of those is present, so plain
+    searches for SQL fragments such as `count(` or `-- todo` keep substring semantics.
+    """
+    if not term:
+        return False
+    return bool(BOOLEAN_OPERATOR_PATTERN.search(term) or BOOLEAN_QUALIFIER_PATTERN.search(term))
+
+def parse_boolean_query(text):
+    """Parse a boolean search query into a nested tuple AST.
+
+    Grammar: or := and (OR and)*; and := unary ([AND] unary)*; unary := (NOT | -) unary | atom;
+    atom := '(' or ')' | qualifier:value | "phrase" | word. Juxtaposed terms are ANDed.
+    Nodes: ('or', [...]), ('and', [...]), ('not', node), ('term', text, field or None),
+    ('label', name), ('id', value), ('ref', kind, name). Raises ValueError on syntax errors.
+    """
+    tokens = []
+    pos = 0
+    text = text or ''
+    while pos < len(text):
+        match = BOOLEAN_QUERY_TOKEN_PATTERN.match(text, pos)
+        if not match or match.end() == pos:
+            break
+        pos = match.end()
+        lparen, rparen, phrase, quoted_qual, word = match.groups()
+        if lparen:
+            tokens.append(('(', None))
+        elif rparen:
+            tokens.append((')', None))
+        elif phrase is not None:
+            tokens.append(('word', phrase))
+        elif quoted_qual:
+            kind, value = quoted_qual.split(':', 1)
+            tokens.append(('qual', (kind.lower(), value.strip('"'))))
+        elif word:
+            if word in BOOLEAN_OPERATORS:
+                tokens.append((word, None))
+            elif word.startswith('-') and len(word) > 1:
+                tokens.append(('NOT', None))
+                tokens.append(('word', word[1:]))
+            elif ':' in word and word.split(':', 1)[0].lower() in BOOLEAN_QUALIFIERS and word.split(':', 1)[1]:
+                kind, value = word.split(':', 1)
+                tokens.append(('qual', (kind.lower(), value)))
+            else:
+                tokens.append(('word', word))
+
+    position = [0]
+
+    def peek():
+        return tokens[position[0]][0] if position[0] < len(tokens) else None
+
+    def take():
+        token = tokens[position[0]]
+        position[0] += 1
+        return token
+
+    def parse_or():
+        children = [parse_and()]
+        while peek() == 'OR':
+            take()
+            children.append(parse_and())
+        return children[0] if len(children) == 1 else ('or', children)
+
+    def parse_and():
+        children = [parse_unary()]
+        while peek() not in (None, ')', 'OR'):
+            if peek() == 'AND':
+                take()
+            children.append(parse_unary())
+        return children[0] if len(children) == 1 else ('and', children)
+
+    def parse_unary():
+        if peek() == 'NOT':
+            take()
+            return ('not', parse_unary())
+        return parse_atom()
+
+    def parse_atom():
+        kind = peek()
+        if kind is None:
+            raise ValueError("Query ends where a term was expected")
+        if kind == '(':
+            take()
+            node = parse_or()
+            if peek() != ')':
+                raise ValueError("Missing closing parenthesis")
+            take()
+            return node
+        if kind in ('AND', 'OR', ')'):
+            raise ValueError(f"Unexpected '{kind}'")
+        _kind, value = take()
+        if _kind == 'qual':
+            qual, arg = value
+            if qual == 'label':
+                return ('label', arg)
+            if qual == 'id':
+                return ('id', arg)
+            if qual in ('title', 'sql'):
+                return ('term', arg, qual)
+            return ('ref', qual, arg)
+        return ('term', value, None)
+
+    if not tokens:
+        raise ValueError("Empty query")
+    tree = parse_or()
+    if position[0] != len(tokens):
+        raise ValueError(f"Unexpected '{tokens[position[0]][0]}'")
+    return tree
+
+class PlanNode:
+    """One operator of a compiled query plan; records its timing and output size for explain()."""
+    COST = 0  # Lower classes run first inside AND: set lookups < index lookups < verification
+    label = 'node'
+
+    def __init__(self):
+        self.children = []
+        self.estimated = None
+        self.actual = None
+        self.elapsed = 0.0
+
+    def estimate(self, index, universe):
+        return len(universe)
+
+    def run(self, index, within, is_cancelled):
+        raise NotImplementedError
+
+    def execute(self, index, within, is_cancelled=None):
+        if is_cancelled is not None and is_cancelled():
+            raise SearchCancelled()
+        started = time.perf_counter()
+        result = self.run(index, within, is_cancelled)
+        self.elapsed = time.perf_counter() - started
+        self.actual = len(result)
+        return result
+
+    def positive_terms(self):
+        return [term for child in self.children for term in child.positive_terms()]
+
+    def explain_lines(self, depth=0):
+        estimated = '?' if self.estimated is None else self.estimated
+        actual = '-' if self.actual is None else self.actual
+        lines = [f"{'  ' * depth}{self.label}  est={estimated} rows={actual} time={self.elapsed * 1000:.2f}ms"]
+        for child in self.children:
+            lines.extend(child.explain_lines(depth + 1))
+        return lines
+
+class LabelPlanNode(PlanNode):
+    COST = 0
+
+    def __init__(self, name):
+        super().__init__()
+        self.name = name.lower()
+        self.label = f"LabelSet({name})"
+
+    def estimate(self, index, universe):
+        self.estimated = len(index.label_keys().get(self.name, ()))
+        return self.estimated
+
+    def run(self, index, within, is_cancelled):
+        return within & index.label_keys().get(self.name, set())
+
+class IdPlanNode(PlanNode):
+    COST = 0
+
+    def __init__(self, value):
+        super().__init__()
+        self.value = value
+        self.label = f"IdSet({value})"
+
+    def estimate(self, index, universe):
+        self.estimated = 1 if self.value in index.records else 0
+        return self.estimated
+
+    def run(self, index, within, is_cancelled):
+        return {self.value} & within
+
+class RefPlanNode(PlanNode):
+    COST = 1
+
+    def __init__(self, kind, name):
+        super().__init__()
+        self.kind = kind
+        self.name = name
+        self.label = f"RefIndex({kind}:{name})"
+
+    def estimate(self, index, universe):
+        with index.lock:
+            self.estimated = len(index.refs.lookup(self.kind, self.name))
+        return self.estimated
+
+    def run(self, index, within, is_cancelled):
+        with index.lock:
+            return within & index.refs.lookup(self.kind, self.name)
+
+class TermPlanNode(PlanNode):
+    """Substring term: trigram candidates first, then exact verification on those only."""
+    COST = 2
+
+    def __init__(self, text, search_title, search_syntax):
+        super().__init__()
+        self.text = text.lower()
+        self.search_title = search_title
+        self.search_syntax = search_syntax
+        scope = '+'.join(name for name, on in (('title', search_title), ('sql', search_syntax)) if on)
+        self.label = f"Trigram+Verify('{text}' in {scope or 'nothing'})"
+
+    def estimate(self, index, universe):
+        candidates = set()
+        for on, trigram_index in ((self.search_title, index.title_index), (self.search_syntax, index.sql_index)):
+            if on:
+                with index.lock:
+                    found = trigram_index.candidates(self.text)
+                if found is None:  # Too short to narrow; verification scans everything
+                    self.estimated = len(universe)
+                    self.COST = 3
+                    return self.estimated
+                candidates |= found
+        self.estimated = len(candidates)
+        return self.estimated
+
+    def run(self, index, within, is_cancelled):
+        return index.match(self.text, self.search_title, self.search_syntax, within, is_cancelled)
+
+    def positive_terms(self):
+        return [self.text]
+
+class AndPlanNode(PlanNode):
+    """Intersection: children run cheapest/most selective first, each within the running result."""
+    label = 'AND'
+
+    def __init__(self, children):
+        super().__init__()
+        self.children = children
+
+    def estimate(self, index, universe):
+        for child in self.children:
+            child.estimate(index, universe)
+        # NOT needs a base set, so it always goes last; otherwise order by cost class, then size
+        self.children.sort(key=lambda c: (isinstance(c, NotPlanNode), c.COST, c.estimated or 0))
+        self.COST = max(child.COST for child in self.children)
+        positives = [c.estimated for c in self.children if not isinstance(c, NotPlanNode)]
+        self.estimated = min(positives) if positives else len(universe)
+        return self.estimated
+
+    def run(self, index, within, is_cancelled):
+        result = within
+        for child in self.children:
+            result = child.execute(index, result, is_cancelled)
+            if not result:
+                break  # Short-circuit: nothing can survive an empty intersection
+        return result
+
+class OrPlanNode(PlanNode):
+    label = 'OR'
+
+    def __init__(self, children):
+        super().__init__()
+        self.children = children
+
+    def estimate(self, index, universe):
+        self.estimated = min(len(universe), sum(child.estimate(index, universe) for child in self.children))
+        self.children.sort(key=lambda c: (c.COST, c.estimated or 0))
+        self.COST = max(child.COST for child in self.children)
+        return self.estimated
+
+    def run(self, index, within, is_cancelled):
+        result = set()
+        for child in self.children:
+            remaining = within - result
+            if not remaining:
+                break
+            result |= child.execute(index, remaining, is_cancelled)
+        return result
+
+class NotPlanNode(PlanNode):
+    label = 'NOT'
+
+    def __init__(self, child):
+        super().__init__()
+        self.children = [child]
+
+    def estimate(self, index, universe):
+        self.estimated = max(0, len(universe) - self.children[0].estimate(index, universe))
+        self.COST = self.children[0].COST
+        return self.estimated
+
+    def run(self, index, within, is_cancelled):
+        return within - self.children[0].execute(index, within, is_cancelled)
+
+    def positive_terms(self):
+        return []
+
+class QueryPlan:
+    """A boolean query compiled to plan nodes over a SearchIndex."""
+    def __init__(self, text, root):
+        self.text = text
+        self.root = root
+        self.elapsed = 0.0
+
+    @classmethod
+    def compile(cls, text, search_title=True, search_syntax=True):
+        """Parse text and build its plan; raises ValueError on syntax errors."""
+        def build(node):
+            kind = node[0]
+            if kind == 'and':
+                return AndPlanNode([build(child) for child in node[1]])
+            if kind == 'or':
+                return OrPlanNode([build(child) for child in node[1]])
+            if kind == 'not':
+                return NotPlanNode(build(node[1]))
+            if kind == 'label':
+                return LabelPlanNode(node[1])
+            if kind == 'id':
+                return IdPlanNode(node[1])
+            if kind == 'ref':
+                return RefPlanNode(node[1], node[2])
+            _kind, term, field = node
+            if field == 'title':
+                return TermPlanNode(term, True, False)
+            if field == 'sql':
+                return TermPlanNode(term, False, True)
+            return TermPlanNode(term, search_title, search_syntax)
+        return cls(text, build(parse_boolean_query(text)))
+
+    def execute(self, index, universe, is_cancelled=None):
+        """Return the keys in universe (a set) that satisfy the query."""
+        started = time.perf_counter()
+        self.root.estimate(index, universe)
+        result = self.root.execute(index, universe, is_cancelled)
+        self.elapsed = time.perf_counter() - started
+        return result
+
+    def positive_terms(self):
+        return self.root.positive_terms()
+
+    def explain(self):
+        """Return a text rendering of the plan with per-operator estimates, row counts and timings."""
+        lines = [f"Query: {self.text}", f"Total: {self.elapsed * 1000:.2f}ms", ""]
+        lines.extend(self.root.explain_lines())
+        return "\n".join(lines)
+
+# --- Regex Search ---
+REGEX_FLAGS = re.MULTILINE  # Case-sensitive; params['ignore_case'] or an inline (?i) relaxes that
+REGEX_MAX_POSITIONS = 200  # Match positions kept per document for the preview highlighter
+
+@functools.lru_cache(maxsize=64)
+def compile_search_pattern(pattern, flags=REGEX_FLAGS):
+    """Compile a user regex once; raises re.error for invalid patterns."""
+    return re.compile(pattern, flags)
+
+def regex_flags(params):
+    """Return the re flags for a regex search with params."""
+    return REGEX_FLAGS | (re.IGNORECASE if params.get('ignore_case') else 0)
+
+def regex_match_positions(compiled, text, limit=REGEX_MAX_POSITIONS):
+    """Return up to limit (start, end) spans of non-empty matches of compiled in text."""
+    positions = []
+    for match in compiled.finditer(text or ''):
+        if match.end() > match.start():
+            positions.append((match.start(), match.end()))
+            if len(positions) >= limit:
+                break
+    return positions
+
+def scan_regex_documents(pattern, flags, docs, keys, search_title, search_syntax, time_budget=None, slow=None):
+    """Return {key: SQL match positions} for the keys whose title or SQL matches pattern.
+
+    docs maps key -> (title text, SQL text). A key matched only through its title maps to [].
+    With time_budget, documents that took longer than that many seconds are left out of the
+    result and appended to slow instead.
+    """
+    compiled = compile_search_pattern(pattern, flags)
+    found = {}
+    for key in keys:
+        doc = docs.get(key)
+        if doc is None:
+            continue
+        title, sql = doc
+        started = time.perf_counter()
+        positions = regex_match_positions(compiled, sql) if search_syntax else []
+        matched = bool(positions or (search_title and compiled.search(title)))
+        if time_budget is not None and time.perf_counter() - started > time_budget:
+            if slow is not None:
+                slow.append(key)
+            continue
+        if matched:
+            found[key] = positions
+    return found
+
+_regex_worker_docs = {}
+
+def _regex_worker_init(docs):
+    """Pool initializer: keep the corpus in the worker so each task only ships keys."""
+    global _regex_worker_docs
+    _regex_worker_docs = docs
+
+def _regex_worker_scan(pattern, flags, keys, search_title, search_syntax, time_budget):
+    slow = []
+    found = scan_regex_documents(pattern, flags, _regex_worker_docs, keys, search_title, search_syntax,
+                                 time_budget, slow)
+    return found, slow
+
+def _regex_worker_ready():
+    return os.getpid()
+
+class RegexSearcher:
+    """Evaluates a regex over the indexed corpus in worker processes, under a per-document time budget.
+
+    A regex cannot be interrupted once the re engine is running, so every evaluation happens
+    in a pool process that can be killed. The pool is started lazily with the corpus of one
+    index generation, so searches only send chunks of keys; one process serves corpora below
+    `parallel_threshold` characters, larger ones get `processes`. Workers time each document
+    and report those over `time_budget` seconds as timed out. A chunk that overruns its
+    deadline altogether (a document that never finishes) is killed and retried document by
+    document on a fresh pool. After MAX_TIMEOUTS timed-out documents the pattern is
+    abandoned, so a pathological regex cannot hold the search thread indefinitely.
+    """
+    CHUNK_SIZE = 25       # Documents per task; bounds how long a never-ending document can go unnoticed
+    MAX_TIMEOUTS = 3
+    POOL_SLACK = 0.25     # Seconds added to each chunk deadline for scheduling/IPC
+    STARTUP_TIMEOUT = 15.0  # Allowance for freshly spawned workers to import the app
+    WAIT_STEP = 0.05      # Seconds between cancellation checks while waiting on a worker
+
+    def __init__(self, time_budget=0.05, parallel_threshold=1_000_000, processes=None):
+        self.time_budget = time_budget
+        self.parallel_threshold = parallel_threshold  # Corpus size (chars) above which several processes are used
+        self.processes = processes or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.pool = None
+        self.pool_generation = None
+        self._pool_lock = threading.Lock()  # Searches may run on the GUI and the search thread at once
+
+    def _get_pool(self, docs, generation, corpus_size=0):
+        stale = None
+        with self._pool_lock:
+            if self.pool is not None and self.pool_generation != generation:
+                stale, self.pool = self.pool, None
+            if self.pool is None:
+                processes = self.processes if corpus_size >= self.parallel_threshold else 1
+                self.pool = multiprocessing.Pool(processes, initializer=_regex_worker_init, initargs=(docs,))
+                self.pool_generation = generation
+                # Wait for the workers once here, so task deadlines need not allow for start-up
+                try:
+                    self.pool.apply_async(_regex_worker_ready).get(timeout=self.STARTUP_TIMEOUT)
+                except multiprocessing.TimeoutError:
+                    logging.warning(f"Regex search pool did not start within {self.STARTUP_TIMEOUT:.0f}s")
+                logging.info(f"Started regex search pool with {processes} processes for generation {generation}")
+            pool = self.pool
+        if stale is not None:
+            stale.terminate()
+            stale.join()
+        return pool
+
+    def shutdown(self, pool=None):
+        """Terminate the worker pool (it is recreated on the next search).
+
+        With pool given, only terminate it if it is still the current one.
+        """
+        with self._pool_lock:
+            if self.pool is None or (pool is not None and pool is not self.pool):
+                return
+            pool, self.pool = self.pool, None
+            self.pool_generation = None
+        pool.terminate()
+        pool.join()
+
+    def _wait(self, result, timeout, is_cancelled=None):
+        """Return result.get() within timeout seconds, checking is_cancelled while waiting."""
+        end = time.monotonic() + timeout
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise multiprocessing.TimeoutError()
+            try:
+                return result.get(timeout=min(self.WAIT_STEP, remaining))
+            except multiprocessing.TimeoutError:
+                if is_cancelled is not None and is_cancelled():
+                    raise SearchCancelled()
+
+    def search(self, pattern, docs, generation, keys, search_title=True, search_syntax=True,
+               corpus_size=0, is_cancelled=None, flags=REGEX_FLAGS):
+        """Return ({key: SQL match positions}, [timed-out keys]) for pattern over keys."""
+        compile_search_pattern(pattern, flags)  # Surface re.error before any work is dispatched
+        keys = list(keys)
+        found, timed_out = {}, []
+        pending = [keys[i:i + self.CHUNK_SIZE] for i in range(0, len(keys), self.CHUNK_SIZE)]
+        while pending:
+            pool = self._get_pool(docs, generation, corpus_size)
+            submitted = [(chunk, pool.apply_async(_regex_worker_scan,
+                                                  (pattern, flags, chunk, search_title, search_syntax,
+                                                   self.time_budget)))
+                         for chunk in pending]
+            pending = []
+            for pos, (chunk, result) in enumerate(submitted):
+                deadline = self.time_budget * len(chunk) + self.POOL_SLACK
+                try:
+                    chunk_found, slow = self._wait(result, deadline, is_cancelled)
+                    found.update(chunk_found)
+                    if slow:
+                        timed_out.extend(slow)
+                        logging.warning(f"Regex '{pattern}' exceeded its time budget on {len(slow)} documents")
+                        if len(timed_out) >= self.MAX_TIMEOUTS:
+                            rest = [key for c, _r in submitted[pos + 1:] for key in c]
+                            if rest:
+                                timed_out.extend(rest)
+                                logging.warning(f"Regex '{pattern}' abandoned after {len(timed_out) - len(rest)} "
+                                                f"timed-out documents")
+                                self.shutdown(pool)  # Drop the queued chunks
+                            break
+                except SearchCancelled:
+                    if not all(r.ready() for _c, r in submitted[pos:]):
+                        self.shutdown(pool)  # Do not leave a slow pattern running for the next search
+                    raise
+                except multiprocessing.TimeoutError:
+                    # Kill the stuck worker(s) and carry on with the rest on a fresh pool
+                    self.shutdown(pool)
+                    rest = [c for c, _r in submitted[pos + 1:]]
+                    if len(chunk) > 1:
+                        pending = [[key] for key in chunk] + rest
+                    else:
+                        timed_out.extend(chunk)
+                        logging.warning(f"Regex '{pattern}' exceeded its time budget on document {chunk[0]!r}")
+                        pending = rest if len(timed_out) < self.MAX_TIMEOUTS else []
+                        if not pending and rest:
+                            timed_out.extend(key for c in rest for key in c)
+                            logging.warning(f"Regex '{pattern}' abandoned after {len(timed_out)} timed-out documents")
+                    break
+        return found, timed_out
+
+def filter_records_by_label(records, label):
+    """Return the records carrying label (all dict records if label is None)."""
+    if label is None:
+        return [r for r in records if isinstance(r, dict)]
+    return [r for r in records
+            if isinstance(r, dict) and isinstance(r.get('labels'), list) and label in r['labels']]
+
+def sort_records(records):
+    """Sort records by name (alphabetically), the default list order."""
+    return sorted(records, key=lambda bm: bm.get('name', '').lower())
+
+class SearchEngine:
+    """Runs label filtering, substring matching, ranking and sorting over a SearchIndex.
+
+    Takes a plain params dict instead of reading widgets, so it can be called from a worker
+    thread. Params keys: 'term', 'search_title', 'search_syntax', 'label', 'ranked', 'top_k',
+    plus 'source' (restrict a federated index to one data source), 'project' (restrict to
+    bookmarks from one DataGrip project), 'federated' (order free-text matches by BM25
+    score, so results from both sources are interleaved by relevance) and 'meta' (a
+    MetadataColumns filter dict such as {'modified_within_days': 30, 'min_count': 5}).
+
+    Substring results are kept on a refinement stack: a term that extends a previous one
+    only re-checks that term's results, and a term already on the stack (e.g. after
+    backspace) is answered straight from it. Final result key lists are also kept in an
+    LRU cache keyed by (term, scope, label, source, mode, index generation), so flipping between
+    scopes and labels with the same text does not search again.
+    """
+    MAX_REFINE_DEPTH = 32
+
+    def __init__(self, index, cache_size=128, regex_searcher=None):
+        self.index = index
+        self.refine_stack = []  # [(term, scope, (label, source, meta), index generation, records)]
+        self.result_cache = LRUCache(cache_size)
+        self.regex_searcher = regex_searcher or RegexSearcher()
+        self.regex_positions = {}  # key -> SQL match spans from the last regex search
+        self.regex_error = None    # Message from the last invalid pattern, if any
+        self.regex_timed_out = []  # Keys skipped by the last regex search (time budget)
+        self.last_plan = None      # QueryPlan of the last boolean query, for explain()
+        self.query_error = None    # Syntax error of the last boolean query, if any
+
+    def _refinement_base(self, term, scope, facet):
+        """Pop stack entries that cannot narrow term; return the top survivor or None."""
+        stack = self.refine_stack
+        if stack and stack[-1][3] != self.index.generation:
+            stack.clear()  # Index changed since these were computed
+        while stack:
+            top_term, top_scope, top_facet, _gen, _records = stack[-1]
+            # Every match for term also matches top_term if top_term is a substring of term
+            if top_scope == scope and top_facet == facet and top_term in term:
+                return stack[-1]
+            stack.pop()
+        return None
+
+    def _scoped_records(self, params, records=None):
+        """Return the (indexed) records passing the label, source, project and metadata filters of params."""
+        records = filter_records_by_label(self.index.source or [] if records is None else records, params.get('label'))
+        source = params.get('source')
+        if source is not None:
+            sources = self.index.sources
+            records = [bm for bm in records if sources.get(record_key(bm)) == source]
+        project = params.get('project')
+        if project is not None:
+            records = [bm for bm in records if bm.get('project') == project]
+        if params.get('meta'):
+            allowed = self.index.metadata.select(params['meta'])
+            records = [bm for bm in records if record_key(bm) in allowed]
+        return records
+
+    @staticmethod
+    def meta_key(params):
+        """Hashable form of params['meta'] for cache and refinement keys."""
+        meta = params.get('meta') or {}
+        return tuple(sorted((name, tuple(value) if isinstance(value, list) else value) for name, value in meta.items()))
+
+    def _base_records(self, params, qualifiers):
+        """Return the label/source-filtered records, narrowed by any table:/column:/join: qualifiers."""
+        records = self._scoped_records(params)
+        if qualifiers:
+            allowed = self.index.refs.lookup_all(qualifiers)
+            records = [bm for bm in records if record_key(bm) in allowed]
+        return records
+
+    def regex_filter(self, params, is_cancelled=None):
+        """Return the label-filtered records whose title/SQL match params['term'] as a regex.
+
+        The index lock is only held while the candidates and documents are copied out; the
+        regex itself runs in the RegexSearcher's worker processes.
+        """
+        pattern = params.get('term', '')
+        with self.index.lock:
+            filtered = self._scoped_records(params)
+            docs, corpus_size = self.index.regex_documents()
+            generation = self.index.generation
+        self.regex_error = None
+        try:
+            found, timed_out = self.regex_searcher.search(
+                pattern, docs, generation, [record_key(bm) for bm in filtered],
+                params.get('search_title', True), params.get('search_syntax', True), corpus_size, is_cancelled,
+                regex_flags(params))
+        except re.error as e:
+            self.regex_error = str(e)
+            logging.warning(f"Invalid search regex '{pattern}': {e}")
+            return []
+        self.regex_positions = found
+        self.regex_timed_out = timed_out
+        return [bm for bm in filtered if record_key(bm) in found]
+
+    def boolean_filter(self, params, is_cancelled=None):
+        """Return the label-filtered records satisfying params['term'] as a boolean query.
+
+        The plan takes the index lock per operator, so verification runs outside it.
+        """
+        with self.index.lock:
+            filtered = self._scoped_records(params)
+        self.query_error = None
+        try:
+            plan = QueryPlan.compile(params.get('term', ''), params.get('search_title', True),
+                                     params.get('search_syntax', True))
+        except ValueError as e:
+            self.query_error = str(e)
+            logging.warning(f"Invalid search query '{params.get('term', '')}': {e}")
+            return []
+        matched = plan.execute(self.index, {record_key(bm) for bm in filtered}, is_cancelled)
+        self.last_plan = plan
+        logging.debug(f"Boolean query plan:\n{plan.explain()}")
+        return [bm for bm in filtered if record_key(bm) in matched]
+
+    def filter(self, params, is_cancelled=None):
+        """Return the records matching params, in source order.
+
+        The index lock covers only the scoping and refinement lookups; matching takes it
+        again just long enough to copy out the candidate texts.
+        """
+        if params.get('regex') and params.get('term'):
+            return self.regex_filter(params, is_cancelled)
+        if is_boolean_query(params.get('term', '')):
+            return self.boolean_filter(params, is_cancelled)
+        facet = (params.get('label'), params.get('source'), params.get('project'), self.meta_key(params))
+        plain, qualifiers = parse_search_qualifiers(params.get('term', ''))
+        term = plain.lower()
+        scope = (bool(params.get('search_title', True)), bool(params.get('search_syntax', True)))
+        if qualifiers:
+            # Answered from the reference index; not monotonic in the typed text, so no refinement
+            with self.index.lock:
+                filtered = self._base_records(params, qualifiers)
+            if not term:
+                return filtered
+            matched = self.index.match(term, scope[0], scope[1], [record_key(bm) for bm in filtered], is_cancelled)
+            return [bm for bm in filtered if record_key(bm) in matched]
+
+        with self.index.lock:
+            if not term:
+                return self._scoped_records(params)
+            generation = self.index.generation
+            base = self._refinement_base(term, scope, facet)
+            if base is not None and base[0] == term:
+                logging.debug(f"Refinement stack hit for '{term}'")
+                return list(base[4])
+            if base is None:
+                filtered = self._scoped_records(params)
+                within = [record_key(bm) for bm in filtered] if len(filtered) != len(self.index.source or []) else None
+            else:
+                filtered = base[4]  # Only the previous term's results can still match
+                within = [record_key(bm) for bm in filtered]
+        matched = self.index.match(term, scope[0], scope[1], within, is_cancelled)
+        results = [bm for bm in filtered if record_key(bm) in matched]
+
+        # Tagged with the generation it was computed against; a newer index drops it on the next lookup
+        self.refine_stack.append((term, scope, facet, generation, results))
+        del self.refine_stack[:-self.MAX_REFINE_DEPTH]
+        return list(results)
+
+    def matching_keys(self, params, keys):
+        """Return the subset of keys whose records match params.
+
+        Used to keep saved searches current: only the records named by keys are tested.
+        """
+        term = params.get('term', '')
+        search_title, search_syntax = params.get('search_title', True), params.get('search_syntax', True)
+        with self.index.lock:
+            records = self.index.records
+            candidates = self._scoped_records(params, [records[key] for key in keys if key in records])
+            within = {record_key(bm) for bm in candidates}
+            if params.get('regex') and within and term.strip():
+                docs, corpus_size = self.index.regex_documents()
+                generation = self.index.generation
+        if params.get('regex') and within and term.strip():
+            # Evaluated outside the lock, in the searcher's worker processes
+            try:
+                found, _timed_out = self.regex_searcher.search(term, docs, generation, within,
+                                                               search_title, search_syntax, corpus_size,
+                                                               flags=regex_flags(params))
+            except re.error:
+                return set()
+            return set(found)
+        if not within or not term.strip():
+            return within
+        if is_boolean_query(term):
+            try:
+                plan = QueryPlan.compile(term, search_title, search_syntax)
+            except ValueError:
+                return set()
+            return plan.execute(self.index, within)
+        plain, qualifiers = parse_search_qualifiers(term)
+        if qualifiers:
+            with self.index.lock:
+                within &= self.index.refs.lookup_all(qualifiers)
+        if plain.strip() and within:
+            return self.index.match(plain.lower(), search_title, search_syntax, within)
+        return within
+
+    def rank(self, params):
+        """Return the top-k records for params, ordered by BM25 relevance."""
+        records = self.index.source or []
+        if is_boolean_query(params.get('term', '')):
+            # Boolean queries select the candidates; their positive terms drive the ranking
+            filtered = self.boolean_filter(params)
+            plain = ' '.join(self.last_plan.positive_terms()) if self.last_plan and filtered else ''
+        else:
+            plain, qualifiers = parse_search_qualifiers(params.get('term', ''))
+            with self.index.lock:
+                filtered = self._base_records(params, qualifiers)
+        within = [record_key(bm) for bm in filtered] if len(filtered) != len(records) else None
+        ranked = self.index.rank(plain, params.get('search_title', True),
+                                 params.get('search_syntax', True), params.get('top_k', 100), within)
+        by_key = {record_key(bm): bm for bm in filtered}
+        return [by_key[key] for key, _score in ranked if key in by_key]
+
+    @staticmethod
+    def is_ranked(params):
+        """True if params ask for ranking and have free text (not just qualifiers) to rank by."""
+        if params.get('regex'):
+            return False  # Regex mode filters; results keep the normal sort
+        return bool(params.get('ranked') and parse_search_qualifiers(params.get('term', ''))[0].strip())
+
+    @staticmethod
+    def is_merged(params):
+        """True if filtered results of a federated view are to be ordered by relevance."""
+        if params.get('regex') or params.get('ranked') or not params.get('federated'):
+            return False
+        return bool(parse_search_qualifiers(params.get('term', ''))[0].strip())
+
+    def order_by_relevance(self, params, records):
+        """Sort records by BM25 score for the free text of params, best first.
+
+        Matching is left to filter(); records scoring zero stay in, after the scored ones,
+        and ties keep their incoming order.
+        """
+        term = params.get('term', '')
+        search_title, search_syntax = params.get('search_title', True), params.get('search_syntax', True)
+        if is_boolean_query(term):
+            try:
+                plain = ' '.join(QueryPlan.compile(term, search_title, search_syntax).positive_terms())
+            except ValueError:
+                return records
+        else:
+            plain = parse_search_qualifiers(term)[0]
+        scores = self.index.relevance(plain, [record_key(bm) for bm in records], search_title, search_syntax)
+        order = sorted(range(len(records)), key=lambda i: -scores[i])
+        return [records[i] for i in order]
+
+    def cache_key(self, params):
+        """Return the result-cache key for params under the current index generation."""
+        ranked = self.is_ranked(params)
+        term = params.get('term', '')
+        if not params.get('regex'):
+            term = ' '.join(tokenize(term)) if ranked else term.lower()
+        return (term, bool(params.get('regex')), bool(params.get('regex') and params.get('ignore_case')), bool(params.get('search_title', True)), bool(params.get('search_syntax', True)),
+                params.get('label'), params.get('source'), params.get('project'), self.meta_key(params), ranked,
+                params.get('top_k', 100) if ranked else None, self.is_merged(params), self.index.generation)
+
+    def search(self, params, is_cancelled=None):
+        """Return the records to display for params: ranked, or filtered and sorted.
+
+        The index lock is only taken for the cache lookup and inside the steps that copy
+        index state out; matching, verification and sorting run without it.
+        """
+        with self.index.lock:
+            key = self.cache_key(params)
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                records = self.index.records
+                return [records[k] for k in cached if k in records]
+        if params.get('regex') and params.get('term'):
+            results = sort_records(self.regex_filter(params, is_cancelled))
+        elif self.is_ranked(params):
+            results = self.rank(params)
+        else:
+            results = sort_records(self.filter(params, is_cancelled))
+            if self.is_merged(params):
+                # Same matches as the per-source views; only the order blends the two sources
+                results = self.order_by_relevance(params, results)
+        if is_cancelled is not None and is_cancelled():
+            raise SearchCancelled()
+        with self.index.lock:
+            # Results computed while the index changed are returned but not cached
+            if key[-1] == self.index.generation:
+                self.result_cache.put(key, [record_key(bm) for bm in results])
+        return results
+
+    def cache_stats(self):
+        """Return result-cache counters plus the current refinement-stack depth."""
+        stats = self.result_cache.stats()
+        stats['refine_depth'] = len(self.refine_stack)
+        stats['generation'] = self.index.generation
+        return stats
+
+class SavedSearches:
+    """Named searches with materialized result sets, kept current as records change.
+
+    Each entry is {'name': ..., 'params': {...}} (stored in the 'saved_searches' setting).
+    After the index is synced, only the changed records are re-tested against each saved
+    predicate, so counts stay live and opening a saved search needs no search at all.
+    """
+    PARAM_KEYS = ('term', 'search_title', 'search_syntax', 'label', 'regex', 'ignore_case', 'source', 'project', 'meta')
+
+    def __init__(self, entries=None):
+        self.entries = [e for e in (entries or []) if isinstance(e, dict) and e.get('name')]
+        self.results = {}  # name -> set of matching keys
+
+    def names(self):
+        return [entry['name'] for entry in self.entries]
+
+    def get(self, name):
+        for entry in self.entries:
+            if entry['name'] == name:
+                return entry
+        return None
+
+    def add(self, name, params, engine):
+        """Save (or replace) a search and materialize its results."""
+        self.remove(name)
+        entry = {'name': name, 'params': {key: params.get(key) for key in self.PARAM_KEYS}}
+        self.entries.append(entry)
+        self.results[name] = engine.matching_keys(entry['params'], list(engine.index.records))
+        return entry
+
+    def remove(self, name):
+        self.entries = [entry for entry in self.entries if entry['name'] != name]
+        self.results.pop(name, None)
+
+    def materialize(self, engine):
+        """Recompute every saved result set against the whole index."""
+        keys = list(engine.index.records)
+        for entry in self.entries:
+            self.results[entry['name']] = engine.matching_keys(entry['params'], keys)
+
+    def apply_changes(self, engine, changed, removed):
+        """Update the result sets for changed (added/edited) and removed record keys."""
+        if not changed and not removed:
+            return
+        for entry in self.entries:
+            results = self.results.get(entry['name'])
+            if results is None:
+                self.results[entry['name']] = engine.matching_keys(entry['params'], list(engine.index.records))
+                continue
+            results -= removed
+            results -= changed
+            results |= engine.matching_keys(entry['params'], changed)
+
+    def count(self, name):
+        return len(self.results.get(name, ()))
+
+    def records(self, name, index):
+        """Return the saved search's records in the default list order."""
+        records = index.records
+        return sort_records([records[key] for key in self.results.get(name, ()) if key in records])
+
+# --- Background Search ---
+class SearchTaskSignals(QObject):
+    """Signals for SearchTask; QRunnable itself cannot emit."""
+    results_ready = Signal(int, object)  # (generation, list of records)
+
+class SearchTask(QRunnable):
+    """Runs one SearchEngine.search() on a pool thread, tagged with a generation number."""
+    def __init__(self, engine, params, generation, cancel_event):
+        super().__init__()
+        self.engine = engine
+        self.params = params
+        self.generation = generation
+        self.cancel_event = cancel_event
+        self.signals = SearchTaskSignals()
+
+    def run(self):
+        try:
+            results = self.engine.search(self.params, self.cancel_event.is_set)
+        except SearchCancelled:
+            logging.debug(f"Search generation {self.generation} cancelled.")
+            return
+        except Exception as e:
+            logging.error(f"Background search failed for '{self.params.get('term', '')}': {e}", exc_info=True)
+            return
+        self.signals.results_ready.emit(self.generation, results)
+
+class BookmarksReloadSignals(QObject):
+    """Signals for BookmarksReloadTask."""
+    parsed = Signal(int, object)  # (generation, list of bookmark dicts)
+
+class BookmarksReloadTask(QRunnable):
+    """Refreshes the local copy of a watched DataGrip XML file and re-parses it on a pool thread."""
+    def __init__(self, source_path, copy_path, generation):
+        super().__init__()
+        self.source_path = source_path
+        self.copy_path = copy_path
+        self.generation = generation
+        self.signals = BookmarksReloadSignals()
+
+    def run(self):
+        try:
+            path = self.source_path
+            if self.copy_path and os.path.normcase(self.copy_path) != os.path.normcase(self.source_path):
+                copy_if_changed(self.source_path, self.copy_path)
+                path = self.copy_path
+            bookmarks = list(iter_bookmarks_xml(path))
+        except Exception as e:
+            # Often a half-written file; the next change notification will retry
+            logging.warning(f"Could not re-read watched bookmarks file '{self.source_path}': {e}")
+            return
+        self.signals.parsed.emit(self.generation, bookmarks)
+
+class BookmarksLoadSignals(QObject):
+    """Signals for BookmarksLoadTask."""
+    batch = Signal(int, object)  # (generation, list of bookmark dicts parsed so far)
+    loaded = Signal(int, object, str)  # (generation, list of bookmark dicts, error message or '')
+
+class BookmarksLoadTask(QRunnable):
+    """Parses an opened DataGrip XML file on a pool thread, emitting batches as they stream in."""
+    def __init__(self, path, generation):
+        super().__init__()
+        self.path = path
+        self.generation = generation
+        self.signals = BookmarksLoadSignals()
+
+    def run(self):
+        try:
+            bookmarks = parse_bookmarks_xml(self.path, on_batch=lambda batch: self.signals.batch.emit(self.generation, batch))
+        except Exception as e:
+            logging.error(f"Error parsing bookmarks XML file {self.path}: {e}", exc_info=not isinstance(e, ET.ParseError))
+            self.signals.loaded.emit(self.generation, [], bookmarks_xml_error_message(self.path, e))
+            return
+        self.signals.loaded.emit(self.generation, bookmarks, '')
+
+class BookmarkSourcesTask(QRunnable):
+    """Parses the extra bookmark sources on a pool thread; emits [(path, bookmarks, error)]."""
+    def __init__(self, paths, generation):
+        super().__init__()
+        self.paths = paths
+        self.generation = generation
+        self.signals = BookmarksReloadSignals()
+
+    def run(self):
+        try:
+            results = parse_bookmark_sources(self.paths)
+        except Exception as e:
+            logging.error(f"Parsing {len(self.paths)} extra bookmark sources failed: {e}", exc_info=True)
+            return
+        self.signals.parsed.emit(self.generation, results)
+
+# --- Near-Duplicate Detection ---
+SQL_COMMENT_PATTERN = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+MINHASH_PRIME = 4294967311  # Smallest prime above 2**32; keeps a*x + b inside uint64
+MINHASH_MAX_HASH = np.uint64(0xFFFFFFFF)
+
+def sql_shingles(sql, size=3):
+    """Return the set of hashed token k-shingles of sql (comments dropped, case folded)."""
+    tokens = tokenize(SQL_COMMENT_PATTERN.sub(' ', sql or ''))
+    if len(tokens) < size:
+        grams = [' '.join(tokens)] if tokens else []
+    else:
+        grams = [' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+    # crc32 rather than hash(): string hashes are salted per process and signatures are persisted
+    return {zlib.crc32(gram.encode('utf-8')) for gram in grams}
+
+def content_hash(text):
+    """Stable hash of a SQL text, used to key persisted signatures."""
+    return hashlib.sha1((text or '').encode('utf-8', 'replace')).hexdigest()
+
+class MinHasher:
+    """MinHash signatures from a fixed family of (a*x + b) mod p permutations.
+
+    The seed is fixed so signatures computed in earlier sessions stay comparable.
+    """
+    CHUNK_SIZE = 4096  # Shingles hashed per numpy pass, bounds the temporary matrix
+
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, 2 ** 32, size=num_perm, dtype=np.uint64)[:, None]
+        self.b = rng.randint(0, 2 ** 32, size=num_perm, dtype=np.uint64)[:, None]
+
+    def signature(self, shingles):
+        signature = np.full(self.num_perm, MINHASH_MAX_HASH, dtype=np.uint64)
+        values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+        for start in range(0, len(values), self.CHUNK_SIZE):
+            chunk = values[start:start + self.CHUNK_SIZE][None, :]
+            hashed = (self.a * chunk + self.b) % np.uint64(MINHASH_PRIME)
+            np.minimum(signature, hashed.min(axis=1), out=signature)
+        return signature
+
+class SignatureStore:
+    """MinHash signatures keyed by SQL content hash, persisted between sessions.
+
+    Only SQL that has never been seen before is shingled and hashed.
+    """
+    def __init__(self, path=MINHASH_SIGNATURES_FILE, hasher=None):
+        self.path = path
+        self.hasher = hasher or MinHasher()
+        self.signatures = {}
+        self.dirty = False
+        self.computed = 0  # Signatures hashed this session (for stats)
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                hashes, matrix = data['hashes'], data['signatures']
+            if matrix.ndim != 2 or matrix.shape[1] != self.hasher.num_perm:
+                logging.warning(f"Ignoring MinHash signatures in {self.path}: permutation count changed")
+                return
+            self.signatures = {str(h): row for h, row in zip(hashes, matrix.astype(np.uint64))}
+            logging.info(f"Loaded {len(self.signatures)} MinHash signatures from {self.path}")
+        except Exception as e:
+            logging.error(f"Error loading MinHash signatures from {self.path}: {e}", exc_info=True)
+            self.signatures = {}
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            hashes = list(self.signatures)
+            matrix = (np.stack([self.signatures[h] for h in hashes]) if hashes
+                      else np.empty((0, self.hasher.num_perm), dtype=np.uint64))
+            with open(self.path, 'wb') as f:
+                np.savez_compressed(f, hashes=np.array(hashes, dtype='U40'), signatures=matrix)
+            self.dirty = False
+            logging.info(f"Saved {len(hashes)} MinHash signatures to {self.path}")
+        except Exception as e:
+            logging.error(f"Error saving MinHash signatures to {self.path}: {e}", exc_info=True)
+
+    def prune(self, live_hashes):
+        """Drop signatures of SQL texts that are no longer in use."""
+        stale = set(self.signatures) - set(live_hashes)
+        for digest in stale:
+            del self.signatures[digest]
+        if stale:
+            self.dirty = True
+
+    def get(self, sql, digest=None):
+        digest = digest or content_hash(sql)
+        signature = self.signatures.get(digest)
+        if signature is None:
+            signature = self.hasher.signature(sql_shingles(sql))
+            self.signatures[digest] = signature
+            self.computed += 1
+            self.dirty = True
+        return signature
+
+class NearDuplicateIndex:
+    """LSH band index over MinHash signatures for sub-linear near-duplicate lookups.
+
+    A signature is split into `bands` bands; records sharing any band bucket become
+    candidates and are then verified by their estimated Jaccard similarity.
+    """
+    def __init__(self, store, bands=16):
+        if store.hasher.num_perm % bands:
+            raise ValueError(f"{store.hasher.num_perm} permutations cannot be split into {bands} bands")
+        self.store = store
+        self.bands = bands
+        self.rows = store.hasher.num_perm // bands
+        self.signatures = {}  # key -> signature
+        self.digests = {}     # key -> content hash
+        self.buckets = [{} for _ in range(bands)]
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def clear(self):
+        self.signatures = {}
+        self.digests = {}
+        self.buckets = [{} for _ in range(self.bands)]
+
+    def _band_keys(self, signature):
+        rows = self.rows
+        return [signature[band * rows:(band + 1) * rows].tobytes() for band in range(self.bands)]
+
+    def add(self, key, sql):
+        self.remove(key)
+        digest = content_hash(sql)
+        signature = self.store.get(sql, digest)
+        if (signature == MINHASH_MAX_HASH).all():
+            return  # No tokens (empty or comment-only SQL); everything would collide
+        self.signatures[key] = signature
+        self.digests[key] = digest
+        for band, bucket_key in enumerate(self._band_keys(signature)):
+            self.buckets[band].setdefault(bucket_key, set()).add(key)
+
+    def remove(self, key):
+        signature = self.signatures.pop(key, None)
+        self.digests.pop(key, None)
+        if signature is None:
+            return
+        for band, bucket_key in enumerate(self._band_keys(signature)):
+            bucket = self.buckets[band].get(bucket_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band][bucket_key]
+
+    @staticmethod
+    def similarity(first, second):
+        """Estimated Jaccard similarity of two signatures."""
+        return float(np.count_nonzero(first == second)) / len(first)
+
+    def query(self, sql, threshold=0.8, exclude=None):
+        """Return [(key, similarity)] of indexed records at least `threshold` similar to sql, best first."""
+        signature = self.store.get(sql)
+        if (signature == MINHASH_MAX_HASH).all():
+            return []
+        candidates = set()
+        for band, bucket_key in enumerate(self._band_keys(signature)):
+            candidates |= self.buckets[band].get(bucket_key, set())
+        candidates.discard(exclude)
+        matches = [(key, self.similarity(signature, self.signatures[key])) for key in candidates]
+        return sorted([m for m in matches if m[1] >= threshold], key=lambda m: m[1], reverse=True)
+
+    def groups(self, threshold=0.8):
+        """Group indexed records into clusters of near-duplicates.
+
+        Returns a list of (keys, min pairwise similarity seen) with the largest groups first;
+        records without a near-duplicate are left out.
+        """
+        parent = {}
+
+        def find(key):
+            root = parent.setdefault(key, key)
+            while root != parent[root]:
+                root = parent[root]
+            while parent[key] != root:
+                parent[key], key = root, parent[key]
+            return root
+
+        pair_similarity = {}
+        for buckets in self.buckets:
+            for bucket in buckets.values():
+                if len(bucket) < 2:
+                    continue
+                members = sorted(bucket, key=str)
+                for i, first in enumerate(members):
+                    for second in members[i + 1:]:
+                        if (first, second) in pair_similarity:
+                            continue
+                        score = self.similarity(self.signatures[first], self.signatures[second])
+                        pair_similarity[(first, second)] = score
+                        if score >= threshold:
+                            parent[find(first)] = find(second)
+
+        clusters = {}
+        for key in parent:
+            clusters.setdefault(find(key), []).append(key)
+        groups = []
+        for keys in clusters.values():
+            if len(keys) < 2:
+                continue
+            members = set(keys)
+            scores = [score for (first, second), score in pair_similarity.items()
+                      if score >= threshold and first in members and second in members]
+            groups.append((keys, min(scores)))
+        groups.sort(key=lambda group: (-len(group[0]), -group[1]))
+        return groups
+
+# --- Query Recall ---
+class QueryRecall:
+    """TF-IDF recall over SQL tokens and titles, NumPy only.
+
+    The document-term matrix is kept as sparse COO triples (row, term, log tf). New documents
+    are appended to pending buffers and folded into a column-sorted (CSC) layout on the
+    next query, so adding a query never re-tokenizes the others. Removed documents are
+    tombstoned; their document frequencies are taken out in one pass before the next query,
+    and their entries are dropped when the matrix is next compacted.
+    """
+    TITLE_WEIGHT = 2  # Title tokens count as this many SQL occurrences
+    COMPACT_RATIO = 0.25  # Compact once this fraction of rows is tombstoned
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.vocabulary = {}  # token -> term id
+        self.row_keys = []    # row -> key (None once removed)
+        self.key_rows = {}    # key -> row
+        self.doc_freq = np.zeros(0, dtype=np.int32)
+        self._pending = []    # [(row, term ids, log tf)] not yet in the compiled matrix
+        self._rows = np.zeros(0, dtype=np.int32)
+        self._values = np.zeros(0, dtype=np.float32)
+        self._indptr = np.zeros(1, dtype=np.int64)  # Column pointers into _rows/_values
+        self._norms = None  # Row norms under the current IDF, recomputed lazily
+        self._live = None   # Row mask of documents not removed
+        self.removed = 0
+        self._dropped = []  # Tombstoned rows whose terms are still counted in doc_freq
+
+    def __len__(self):
+        return len(self.key_rows)
+
+    def _term_counts(self, title, sql):
+        counts = {}
+        for token in tokenize(sql):
+            counts[token] = counts.get(token, 0) + 1
+        for token in tokenize(title):
+            counts[token] = counts.get(token, 0) + self.TITLE_WEIGHT
+        return counts
+
+    def add(self, key, title, sql):
+        self.remove(key)
+        counts = self._term_counts(title, sql)
+        term_ids = np.empty(len(counts), dtype=np.int32)
+        for i, token in enumerate(counts):
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                term_id = self.vocabulary[token] = len(self.vocabulary)
+            term_ids[i] = term_id
+        if len(self.vocabulary) > len(self.doc_freq):
+            grown = np.zeros(max(len(self.vocabulary), 2 * len(self.doc_freq)), dtype=np.int32)
+            grown[:len(self.doc_freq)] = self.doc_freq
+            self.doc_freq = grown
+        self.doc_freq[term_ids] += 1
+        row = len(self.row_keys)
+        self.row_keys.append(key)
+        self.key_rows[key] = row
+        log_tf = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        self._pending.append((row, term_ids, log_tf.astype(np.float32)))
+        self._norms = None
+
+    def remove(self, key):
+        row = self.key_rows.pop(key, None)
+        if row is None:
+            return
+        self.row_keys[row] = None
+        self.removed += 1
+        self._dropped.append(row)
+        self._norms = None
+        if self.removed > self.COMPACT_RATIO * len(self.row_keys):
+            self._compact()
+
+    def _settle_removals(self):
+        """Take the terms of rows removed since the last call out of the document frequencies."""
+        if not self._dropped:
+            return
+        self._flush()
+        dropped = np.zeros(len(self.row_keys), dtype=bool)
+        dropped[self._dropped] = True
+        self._dropped = []
+        terms = np.repeat(np.arange(len(self._indptr) - 1, dtype=np.int32), np.diff(self._indptr))
+        self.doc_freq -= np.bincount(terms[dropped[self._rows]], minlength=len(self.doc_freq)).astype(np.int32)
+
+    def _flush(self):
+        """Merge pending rows into the column-sorted matrix."""
+        if not self._pending:
+            return
+        n_terms = len(self.vocabulary)
+        old_terms = np.repeat(np.arange(len(self._indptr) - 1, dtype=np.int32), np.diff(self._indptr))
+        rows = np.concatenate([self._rows] + [np.full(len(t), r, dtype=np.int32) for r, t, _ in self._pending])
+        terms = np.concatenate([old_terms] + [t for _, t, _ in self._pending])
+        values = np.concatenate([self._values] + [v for _, _, v in self._pending])
+        self._pending = []
+        order = np.argsort(terms, kind='stable')
+        self._rows, self._values = rows[order], values[order]
+        self._indptr = np.concatenate(([0], np.cumsum(np.bincount(terms, minlength=n_terms)))).astype(np.int64)
+
+    def _compact(self):
+        """Drop tombstoned rows and renumber the rest."""
+        self._settle_removals()
+        self._flush()
+        live = np.array([key is not None for key in self.row_keys], dtype=bool)
+        new_row = np.cumsum(live, dtype=np.int64) - 1
+        terms = np.repeat(np.arange(len(self._indptr) - 1, dtype=np.int32), np.diff(self._indptr))
+        keep = live[self._rows] if len(self._rows) else np.zeros(0, dtype=bool)
+        self._rows = new_row[self._rows[keep]].astype(np.int32)
+        self._values = self._values[keep]
+        terms = terms[keep]
+        self._indptr = np.concatenate(
+            ([0], np.cumsum(np.bincount(terms, minlength=len(self.vocabulary))))).astype(np.int64)
+        self.row_keys = [key for key in self.row_keys if key is not None]
+        self.key_rows = {key: row for row, key in enumerate(self.row_keys)}
+        self.removed = 0
+        self._norms = None
+
+    def _idf(self):
+        n_docs = max(1, len(self.key_rows))
+        df = self.doc_freq[:len(self.vocabulary)].astype(np.float32)
+        return np.log((1.0 + n_docs) / (1.0 + df)) + 1.0
+
+    def _prepare(self):
+        self._settle_removals()
+        self._flush()
+        idf = self._idf()
+        if self._norms is None:
+            terms = np.repeat(np.arange(len(self._indptr) - 1, dtype=np.int32), np.diff(self._indptr))
+            weights = self._values * idf[terms]
+            norms = np.bincount(self._rows, weights=weights * weights, minlength=len(self.row_keys))
+            self._norms = np.sqrt(norms).astype(np.float32)
+            self._norms[self._norms == 0] = 1.0
+            self._live = np.array([key is not None for key in self.row_keys], dtype=bool)
+        return idf
+
+    def top_k_batch(self, texts, k=10, exclude=None):
+        """Return, for each text, up to k (key, cosine similarity) pairs, best first.
+
+        All queries are scored together: each query term's posting column is gathered once
+        and accumulated into a (queries x documents) score matrix with one bincount.
+        """
+        if not texts or not self.key_rows:
+            return [[] for _ in texts]
+        idf = self._prepare()
+        n_docs = len(self.row_keys)
+        query_rows, query_terms, query_weights = [], [], []
+        for qi, text in enumerate(texts):
+            counts = self._term_counts('', text)
+            ids = [(self.vocabulary[t], c) for t, c in counts.items() if t in self.vocabulary]
+            if not ids:
+                continue
+            term_ids = np.array([i for i, _ in ids], dtype=np.int32)
+            weights = (1.0 + np.log(np.array([c for _, c in ids], dtype=np.float32))) * idf[term_ids]
+            weights /= np.linalg.norm(weights) or 1.0
+            query_rows.append(np.full(len(term_ids), qi, dtype=np.int64))
+            query_terms.append(term_ids)
+            query_weights.append(weights)
+        results = [[] for _ in texts]
+        if not query_terms:
+            return results
+        query_rows = np.concatenate(query_rows)
+        query_terms = np.concatenate(query_terms)
+        query_weights = np.concatenate(query_weights)
+        starts, ends = self._indptr[query_terms], self._indptr[query_terms + 1]
+        lengths = ends - starts
+        total = int(lengths.sum())
+        if not total:
+            return results
+        # Flat indices of every posting touched by every (query, term) pair
+        offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths) + np.arange(total)
+        doc_rows = self._rows[offsets].astype(np.int64)
+        contrib = (self._values[offsets] * np.repeat(idf[query_terms] * query_weights, lengths)
+                   / self._norms[doc_rows])
+        cells = np.repeat(query_rows, lengths) * n_docs + doc_rows
+        scores = np.bincount(cells, weights=contrib, minlength=len(texts) * n_docs).reshape(len(texts), n_docs)
+        scores[:, ~self._live] = 0.0
+        if exclude in self.key_rows:
+            scores[:, self.key_rows[exclude]] = 0.0
+        k = min(k, n_docs)
+        for qi in range(len(texts)):
+            row_scores = scores[qi]
+            top = np.argpartition(-row_scores, k - 1)[:k] if k < n_docs else np.arange(n_docs)
+            top = top[np.argsort(-row_scores[top], kind='stable')]
+            results[qi] = [(self.row_keys[r], float(row_scores[r])) for r in top if row_scores[r] > 0]
+        return results
+
+    def top_k(self, text, k=10, exclude=None):
+        return self.top_k_batch([text], k, exclude)[0]
+
+# --- SQL File Cache ---
+class SQLFileCache:
+    """Shared cache of SQL file contents keyed by resolved path.
+
+    Each hit is validated with one os.stat: an entry is reused only while the file's
+    (mtime, size) is unchanged. Entries are evicted least-recently-used once their
+    total size exceeds the byte budget.
+    """
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # path or (path, ...) -> ((mtime_ns, file_size), size, text)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0  # Entries dropped because the file changed
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def read(self, path, encoding='utf-8'):
+        """Return the text of path, from the cache if the file is unchanged. Raises OSError/UnicodeError."""
+        def read_file():
+            with open(path, 'r', encoding=encoding) as f:
+                return f.read()
+        return self.load(path, path, read_file)
+
+    def load(self, key, path, loader):
+        """Return the cached value for key while path is unchanged, else loader()'s result.
+
+        Lets derived text (e.g. one statement of a file) share the budget and the
+        (mtime, size) validation of the file it came from.
+        """
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] == signature:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2]
+                self._drop(key)
+                self.invalidations += 1
+            self.misses += 1
+        text = loader()
+        self.put(key, signature, text)
+        return text
+
+    def put(self, key, signature, text):
+        # Whole files are charged their on-disk size, derived entries their own length
+        size = len(text) if isinstance(key, tuple) else signature[1]
+        if size > self.max_bytes:
+            return  # Larger than the whole budget; serve it uncached
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (signature, size, text)
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and self._entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def _drop(self, path):
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def invalidate(self, path=None):
+        """Forget one path, or everything if path is None."""
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+                self.total_bytes = 0
+            else:
+                for key in [k for k in self._entries if k == path or (isinstance(k, tuple) and k[0] == path)]:
+                    self._drop(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+# --- SQL Statement Extraction ---
+STATEMENT_WINDOW_LINES = 2000  # Default lines read on each side of a bookmarked line
+
+# Per-dialect splitting rules:
+#   go        - a line holding only GO ends a batch (T-SQL)
+#   dollar    - $tag$ ... $tag$ quoting (PostgreSQL function bodies)
+#   blocks    - ';' inside BEGIN/CASE ... END does not end the statement
+#   backticks - `quoted identifiers`; brackets - [quoted identifiers]
+#   backslash - backslash escapes inside string literals (MySQL)
+#   delimiter - DELIMITER lines change the statement terminator (MySQL clients)
+# bare_begin: BEGIN opens a block in any statement (T-SQL, where transactions need BEGIN TRAN);
+# elsewhere only inside a routine/DO body (SQL_BLOCK_HEAD_PATTERN), so BEGIN alone starts a transaction
+SQL_DIALECTS = {
+    'generic': {'go': True, 'dollar': True, 'blocks': True, 'backticks': True, 'brackets': False,
+                'backslash': False, 'delimiter': True, 'bare_begin': False},
+    'postgres': {'go': False, 'dollar': True, 'blocks': True, 'backticks': False, 'brackets': False,
+                 'backslash': False, 'delimiter': False, 'bare_begin': False},
+    'tsql': {'go': True, 'dollar': False, 'blocks': True, 'backticks': False, 'brackets': True,
+             'backslash': False, 'delimiter': False, 'bare_begin': True},
+    'mysql': {'go': False, 'dollar': False, 'blocks': True, 'backticks': True, 'brackets': False,
+              'backslash': True, 'delimiter': True, 'bare_begin': False},
+}
+SQL_GO_PATTERN = re.compile(r"^\s*GO(?:\s+\d+)?\s*(?:--.*)?$", re.IGNORECASE)
+SQL_DELIMITER_PATTERN = re.compile(r"^\s*DELIMITER\s+(\S+)\s*$", re.IGNORECASE)
+SQL_NEXT_WORD_PATTERN = re.compile(r"\s*(\w+|;)?")
+SQL_BLOCK_HEAD_PATTERN = re.compile(
+    r"\s*(?:(?:CREATE|ALTER)\s+(?:OR\s+(?:REPLACE|ALTER)\s+)?(?:DEFINER\s*=\s*\S+\s+)?"
+    r"(?:FUNCTION|PROCEDURE|PROC|TRIGGER|EVENT|PACKAGE)\b|DO\b|DECLARE\b|IF\b|WHILE\b)", re.IGNORECASE)
+NON_BLOCK_BEGIN_WORDS = {'TRANSACTION', 'TRAN', 'WORK', 'DISTRIBUTED', 'DEFERRED', 'IMMEDIATE', 'EXCLUSIVE', ';'}
+UNCOUNTED_END_WORDS = {'IF', 'LOOP', 'WHILE', 'REPEAT', 'FOR'}  # END IF etc. close constructs never counted as open
+PAIRED_END_WORDS = {'CASE', 'TRY', 'CATCH'}  # END CASE / END TRY close a counted block
+
+class SQLStatementSplitter:
+    """Incremental, dialect-aware splitter of SQL text into statements.
+
+    Lines are fed one at a time; quotes, -- and /* */ comments, $tag$ quotes and
+    BEGIN/CASE ... END blocks are tracked across lines so terminators inside them are
+    ignored, and GO / DELIMITER lines are honoured where the dialect allows (see
+    SQL_DIALECTS). Outside T-SQL, BEGIN only opens a block in a routine or DO body;
+    anywhere else it is a transaction statement. Each completed statement is reported as (first_line, last_line, text),
+    where the text keeps any comments that lead into it.
+    """
+    def __init__(self, first_line=1, dialect='generic'):
+        self.options = SQL_DIALECTS.get(dialect, SQL_DIALECTS['generic'])
+        self.line_no = first_line - 1
+        self.state = None  # None, or the text that closes the open quote/comment
+        self.depth = 0  # Open BEGIN/CASE blocks
+        self.delimiter = ';'
+        self._compile()
+        self._reset()
+
+    def _compile(self):
+        tokens = [re.escape(self.delimiter)] if self.delimiter != ';' else []
+        tokens += [r"--", r"/\*", r"['\"]", r";"]
+        if self.options['backticks']:
+            tokens.append(r"`")
+        if self.options['brackets']:
+            tokens.append(r"\[")
+        if self.options['dollar']:
+            tokens.append(r"\$(?:[A-Za-z_]\w*)?\$")
+        if self.options['blocks']:
+            tokens.append(r"\b(?:BEGIN|END|CASE)\b")
+        self._special_re = re.compile('|'.join(tokens), re.IGNORECASE)
+
+    def _reset(self):
+        self.parts = []
+        self.start_line = None  # First non-blank line of the current statement
+        self.has_code = False
+        self.routine = None  # Whether the statement is a routine/DO body, once a BEGIN asks
+
+    def _mark(self, text):
+        if self.start_line is None and text.strip():
+            self.start_line = self.line_no
+
+    def _opens_block(self, before):
+        """Whether a BEGIN (not BEGIN TRANSACTION etc.) preceded by before on its line opens a block."""
+        if self.depth > 0 or self.options['bare_begin']:
+            return True
+        if self.routine is None:
+            head = SQL_COMMENT_PATTERN.sub(' ', ''.join(self.parts) + before)
+            self.routine = bool(SQL_BLOCK_HEAD_PATTERN.match(head))
+        return self.routine
+
+    def _complete(self, last_line):
+        statement = (self.start_line, last_line, ''.join(self.parts).strip()) if self.has_code else None
+        self._reset()
+        return statement
+
+    def _closing(self, line, pos):
+        """Return the index just past the text closing self.state, or -1 if it is not on this line."""
+        while True:
+            end = line.find(self.state, pos)
+            if end < 0:
+                return -1
+            if self.options['backslash'] and self.state in ("'", '"'):
+                escapes = len(line[:end]) - len(line[:end].rstrip('\\'))
+                if escapes % 2:
+                    pos = end + 1
+                    continue
+            return end + len(self.state)
+
+    def feed(self, line):
+        """Consume one line (with or without its newline); return the statements it completed."""
+        self.line_no += 1
+        if self.state is None:
+            if self.options['go'] and SQL_GO_PATTERN.match(line):
+                self.depth = 0
+                statement = self._complete(self.line_no - 1)
+                return [statement] if statement else []
+            if self.options['delimiter'] and not self.has_code:
+                match = SQL_DELIMITER_PATTERN.match(line)
+                if match:
+                    self.delimiter = match.group(1)
+                    self._compile()
+                    return []
+        completed = []
+        pos = segment_start = 0
+        while pos < len(line):
+            if self.state:
+                pos = self._closing(line, pos)
+                if pos < 0:
+                    break
+                self.state = None
+                continue
+            match = self._special_re.search(line, pos)
+            if not match:
+                if line[pos:].strip():
+                    self.has_code = True
+                break
+            if line[pos:match.start()].strip():
+                self.has_code = True
+            token = match.group()
+            word = token.upper()
+            pos = match.end()
+            if token == '--':
+                break
+            if token == '/*':
+                self.state = '*/'
+            elif token in ("'", '"', '`') or token.startswith('$'):
+                self.state = token
+                self.has_code = True
+            elif token == '[':
+                self.state = ']'
+                self.has_code = True
+            elif word in ('BEGIN', 'CASE', 'END'):
+                self.has_code = True
+                following = SQL_NEXT_WORD_PATTERN.match(line, pos)
+                next_word = (following.group(1) or '').upper()
+                if word == 'CASE' or (word == 'BEGIN' and next_word not in NON_BLOCK_BEGIN_WORDS
+                                      and self._opens_block(line[segment_start:match.start()])):
+                    self.depth += 1
+                elif word == 'END':
+                    if next_word in UNCOUNTED_END_WORDS or next_word in PAIRED_END_WORDS:
+                        pos = following.end()
+                    if next_word not in UNCOUNTED_END_WORDS:
+                        self.depth = max(0, self.depth - 1)
+            else:
+                # A terminator: ';' (outside blocks) or the DELIMITER-set one
+                custom = self.delimiter != ';'
+                if token == ';' and (custom or self.depth > 0):
+                    continue
+                piece = line[segment_start:match.start() if custom else pos]
+                self._mark(piece)
+                self.parts.append(piece)
+                if custom:
+                    self.depth = 0
+                statement = self._complete(self.line_no)
+                if statement:
+                    completed.append(statement)
+                segment_start = pos
+        rest = line[segment_start:]
+        if segment_start and not self.has_code and self.state is None:
+            return completed  # Only a trailing comment after a terminator; it belongs to neither statement
+        self._mark(rest)
+        self.parts.append(rest)
+        return completed
+
+    def finish(self):
+        """Return the trailing unterminated statement, if it has any code."""
+        self.depth = 0
+        return self._complete(self.line_no)
+
+_statement_split_cache = LRUCache(512)  # (content hash, dialect) -> split statements
+
+def split_sql_statements(text, dialect='generic'):
+    """Split text into [(first_line, last_line, statement text)], cached by content hash."""
+    key = (content_hash(text), dialect)
+    statements = _statement_split_cache.get(key)
+    if statements is None:
+        splitter = SQLStatementSplitter(dialect=dialect)
+        statements = [statement for line in (text or '').splitlines(keepends=True) for statement in splitter.feed(line)]
+        tail = splitter.finish()
+        if tail:
+            statements.append(tail)
+        statements = tuple(statements)
+        _statement_split_cache.put(key, statements)
+    return statements
+
+def statement_summary(text, width=60):
+    """Return the first line of code in a statement, shortened for display."""
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith('--'):
+            return line if len(line) <= width else line[:width - 3] + "..."
+    return ''
+
+def statement_records(record, sql_text, dialect='generic'):
+    """Return one record per statement of a multi-statement record, or None if it holds at most one.
+
+    Statement ids combine the parent key with a hash of the statement, so usage
+    counts follow a statement when others are added around it.
+    """
+    statements = split_sql_statements(sql_text, dialect)
+    if len(statements) < 2:
+        return None
+    parent_key = record_key(record)
+    parent_title = record_title(record)
+    records, used = [], set()
+    for number, (first_line, last_line, text) in enumerate(statements, 1):
+        sid = f"{parent_key}#{content_hash(text)[:12]}"
+        if sid in used:
+            sid = f"{sid}~{number}"  # Same statement repeated in one source
+        used.add(sid)
+        statement = {
+            'id': sid,
+            'parent_id': parent_key,
+            'title': f"{parent_title} (L{first_line}-{last_line}) {statement_summary(text)}",
+            'sql_content': text,
+            'line_start': first_line,
+            'line_end': last_line,
+            'labels': list(record.get('labels') or []),
+            'count': 0,
+        }
+        for field in ('url', 'project', 'created_at', 'modified_at'):
+            if field in record:
+                statement[field] = record[field]
+        records.append(statement)
+    return records
+
+def expand_statement_records(records, content_getter, dialect, counts):
+    """Replace each multi-statement record with its statements (see statement_records).
+
+    counts maps record ids to usage counts, for the statement rows.
+    """
+    expanded = []
+    for record in records:
+        if not isinstance(record, dict):
+            continue
+        statements = statement_records(record, content_getter(record), dialect)
+        if statements is None:
+            expanded.append(record)
+            continue
+        for statement in statements:
+            statement['count'] = counts.get(statement['id'], 0)
+            expanded.append(statement)
+    return expanded
+
+def extract_statement_at_line(path, line, window=STATEMENT_WINDOW_LINES, encoding='utf-8', dialect='generic'):
+    """Return (first_line, last_line, text) for the statement enclosing 1-based line, or None.
+
+    The file is streamed: at most `window` lines before the target are retained and
+    reading stops as soon as the enclosing statement is complete, or `window` lines
+    past the target. Splitting restarts at the start of the retained window, so a
+    quote or comment opened before it is not seen. When the line falls between
+    statements, the next statement is returned.
+    """
+    before = deque(maxlen=max(0, window))
+    splitter = None
+    with open(path, 'r', encoding=encoding) as f:
+        for number, text in enumerate(f, 1):
+            if number < line:
+                before.append(text)
+                continue
+            if splitter is None:
+                splitter = SQLStatementSplitter(first_line=number - len(before), dialect=dialect)
+                for previous in before:
+                    splitter.feed(previous)  # Statements ending before the target are irrelevant
+                before.clear()
+            for statement in splitter.feed(text):
+                if statement[1] >= line:
+                    return statement
+            if number - line >= window:
+                break  # Window exhausted; return what we have of the statement
+    return splitter.finish() if splitter else None
+
+# --- Large File Preview ---
+class LineIndexedFile:
+    """Read-only memory map of a text file plus the byte offset of every line start.
+
+    Lets the preview decode just a range of lines of a very large file. The offset
+    index is built once in chunks with numpy and can be passed back in (offsets=)
+    to reopen the same, unchanged file without rescanning it.
+    """
+    INDEX_CHUNK_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, path, offsets=None):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.offsets = offsets if offsets is not None else self._build_offsets()
+
+    def _build_offsets(self):
+        starts = [np.zeros(1, dtype=np.int64)]
+        for offset in range(0, self.size, self.INDEX_CHUNK_BYTES):
+            count = min(self.INDEX_CHUNK_BYTES, self.size - offset)
+            chunk = np.frombuffer(self._map, dtype=np.uint8, count=count, offset=offset)
+            starts.append(np.flatnonzero(chunk == 10).astype(np.int64) + (offset + 1))
+            del chunk  # Views must be gone before the map can be closed
+        offsets = np.concatenate(starts)
+        if len(offsets) > 1 and offsets[-1] == self.size:
+            offsets = offsets[:-1]  # Trailing newline does not start another line
+        return offsets
+
+    @property
+    def line_count(self):
+        return len(self.offsets) if self.size else 0
+
+    def read_lines(self, first, last):
+        """Return lines [first, last) (0-based) as text."""
+        if not self._map or first >= last:
+            return ''
+        start = int(self.offsets[first])
+        end = int(self.offsets[last]) if last < self.line_count else self.size
+        return self._map[start:end].decode('utf-8', errors='replace')
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
 # --- Helper Functions ---
-def parse_bookmarks_xml(file_path):
-    bookmarks = []
+XML_LOAD_BATCH_SIZE = 500  # Bookmarks handed to the UI at a time while an XML file is streamed
+RESOLVED_PATH_CACHE_SIZE = 8192  # Bookmark URL resolutions remembered by the window
+
+def bookmark_from_state(state):
+    """Build a bookmark dict from a <BookmarkState> element, or None if it is incomplete."""
+    url, line, desc = '', '', ''
+    # Try finding description via option first
+    desc_opt = state.find('option[@name="description"]')
+    if desc_opt is not None:
+        desc = desc_opt.get('value', '')
+
+    # Try finding url/line via attributes element (newer format?)
+    attrs = state.find('attributes')
+    if attrs is not None:
+        url_el = attrs.find("entry[@key='url']")
+        line_el = attrs.find("entry[@key='line']")
+        url = url_el.get('value') if url_el is not None else ''
+        line = line_el.get('value') if line_el is not None else ''
+    else: # Fallback to option elements (older format?)
+        url_opt = state.find('option[@name="url"]')
+        line_opt = state.find('option[@name="line"]')
+        url = url_opt.get('value','') if url_opt is not None else ''
+        line = line_opt.get('value','') if line_opt is not None else ''
+
+    # Validate essential data
+    if not url or not line or not desc:
+        logging.warning(f"Skipping incomplete bookmark entry: URL='{url}', Line='{line}', Desc='{desc}'")
+        return None
+
+    title = desc # Use description as the primary display title
+    fname = os.path.basename(url.replace("file://", "")) if url else "Unknown File" # Extract filename
+    full_text = f"{desc} (File: {fname}, Line: {line})" # For logging/tooltip maybe
+    bid = f"{url}|{line}" # Create a unique ID based on URL and line
+
+    return {
+        'url': url,
+        'line': line,
+        'description': desc,
+        'title': title,
+        'full_text': full_text,
+        'id': bid,
+        'count': 0 # Initialize count, will be updated later
+    }
+
+def iter_bookmarks_xml(file_path):
+    """Yield bookmark dicts from a DataGrip XML file as it is parsed.
+
+    Uses ET.iterparse and clears every finished element, so memory stays flat
+    however large the workspace file is. States inside the BookmarkManager
+    component are yielded immediately; states elsewhere are only used (at the end)
+    when the file has no BookmarkManager component, as with the old DOM parser.
+    Raises ET.ParseError/OSError.
+    """
+    stack = []
+    manager_depth = None  # Stack depth of the open BookmarkManager component
+    state_depth = None  # Stack depth of the open BookmarkState
+    saw_manager = False
+    outside = []  # States found outside any BookmarkManager component
+    for event, elem in ET.iterparse(file_path, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            if elem.tag == 'component' and elem.get('name') == 'BookmarkManager' and manager_depth is None:
+                manager_depth = len(stack)
+                saw_manager = True
+            elif elem.tag == 'BookmarkState' and state_depth is None:
+                state_depth = len(stack)
+            continue
+
+        depth = len(stack)
+        stack.pop()
+        if depth == state_depth:
+            state_depth = None
+            bookmark = bookmark_from_state(elem)
+            if bookmark is not None:
+                if manager_depth is not None:
+                    yield bookmark
+                elif not saw_manager:
+                    outside.append(bookmark)
+        elif depth == manager_depth:
+            manager_depth = None
+            outside.clear()
+        if state_depth is None and stack:
+            # Finished and not part of a pending state: drop it from the tree
+            elem.clear()
+            stack[-1].remove(elem)
+    if not saw_manager:
+        yield from outside
+
+def parse_bookmarks_xml(file_path, on_batch=None, batch_size=XML_LOAD_BATCH_SIZE):
+    """Parse a DataGrip bookmarks XML file into a list of bookmark dicts.
+
+    If on_batch is given it is called with each batch of records as they are
+    streamed, so callers can show them before the whole file has been read.
+    Parse and read errors (ET.ParseError, OSError) are raised to the caller.
+    """
     if not os.path.exists(file_path):
         logging.warning(f"Bookmarks XML file not found: {file_path}")
         return [] # Return empty list if file doesn't exist
 
+    bookmarks = []
+    batch_start = 0
+    for bookmark in iter_bookmarks_xml(file_path):
+        bookmarks.append(bookmark)
+        if on_batch and len(bookmarks) - batch_start >= batch_size:
+            on_batch(bookmarks[batch_start:])
+            batch_start = len(bookmarks)
+    if on_batch and len(bookmarks) > batch_start:
+        on_batch(bookmarks[batch_start:])
+
+    if not bookmarks:
+        logging.warning(f"No 'BookmarkState' elements found within the XML structure in {file_path}.")
+        return []
+
+    logging.info(f"Successfully parsed {len(bookmarks)} bookmarks from {file_path}")
+    return bookmarks
+
+def bookmarks_xml_error_message(file_path, error):
+    """User-facing text for an error raised by parse_bookmarks_xml."""
+    if isinstance(error, ET.ParseError):
+        return f"Failed to parse the bookmarks XML file:\n{error}\n\nFile: {file_path}"
+    return f"An unexpected error occurred while parsing the XML file:\n{error}"
+
+def file_sha1(path, chunk_size=1024 * 1024):
+    """Return the SHA-1 hex digest of a file, read in chunks."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def copy_if_changed(source, destination):
+    """Copy source to destination unless its size, mtime and hash show it is unchanged.
+
+    Matching size and mtime (copy2 preserves mtime) skip the copy outright; a
+    matching size with a different mtime falls back to comparing hashes. Returns
+    True if the file was copied.
+    """
+    src = os.stat(source)
     try:
-        tree = ET.parse(file_path)
-        root = tree.getroot()
-        # Find the BookmarkManager component, or search from root if not found
-        bm_comp = root.find("./component[@name='BookmarkManager']")
-        search_root = bm_comp if bm_comp is not None else root
-        bm_states = search_root.findall(".//BookmarkState") # Find all BookmarkState elements anywhere under search_root
-
-        if not bm_states:
-            logging.warning(f"No 'BookmarkState' elements found within the XML structure in {file_path}.")
-            return []
+        dst = os.stat(destination)
+    except FileNotFoundError:
+        dst = None
+    if dst is not None and dst.st_size == src.st_size:
+        if dst.st_mtime_ns == src.st_mtime_ns:
+            return False
+        if file_sha1(source) == file_sha1(destination):
+            os.utime(destination, ns=(src.st_atime_ns, src.st_mtime_ns)) # Take the fast path next time
+            return False
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    shutil.copy2(source, destination)
+    return True
+
+BOOKMARK_DIFF_FIELDS = ('url', 'line', 'description', 'title', 'full_text', 'project')
+
+def diff_bookmarks(old, new):
+    """Compare two bookmark lists by id; return (added, removed, changed) sets of ids."""
+    old_by_id = {bm['id']: bm for bm in old if isinstance(bm, dict) and 'id' in bm}
+    new_by_id = {bm['id']: bm for bm in new if isinstance(bm, dict) and 'id' in bm}
+    added = new_by_id.keys() - old_by_id.keys()
+    removed = old_by_id.keys() - new_by_id.keys()
+    changed = {bid for bid in new_by_id.keys() & old_by_id.keys()
+               if any(new_by_id[bid].get(f) != old_by_id[bid].get(f) for f in BOOKMARK_DIFF_FIELDS)}
+    return set(added), set(removed), changed
+
+# --- Multiple Bookmark Sources ---
+def jetbrains_config_dirs():
+    """Return the JetBrains configuration roots that exist on this platform."""
+    home = os.path.expanduser("~")
+    if sys.platform == 'win32':
+        root = os.path.join(os.environ.get('APPDATA') or os.path.join(home, 'AppData', 'Roaming'), 'JetBrains')
+    elif sys.platform == 'darwin':
+        root = os.path.join(home, 'Library', 'Application Support', 'JetBrains')
+    else:
+        root = os.path.join(os.environ.get('XDG_CONFIG_HOME') or os.path.join(home, '.config'), 'JetBrains')
+    return [root] if os.path.isdir(root) else []
+
+def discover_workspace_xmls():
+    """Find DataGrip workspace XMLs that may hold bookmarks.
+
+    Looks at the per-version `DataGrip*/workspace/*.xml` files under the JetBrains
+    config dirs and at `~/DataGripProjects/*/.idea/workspace.xml`.
+    """
+    found = []
+    for root in jetbrains_config_dirs():
+        found.extend(glob.glob(os.path.join(root, 'DataGrip*', 'workspace', '*.xml')))
+    found.extend(glob.glob(os.path.join(os.path.expanduser("~"), 'DataGripProjects', '*', '.idea', 'workspace.xml')))
+    return sorted(found)
+
+def bookmark_source_project(path):
+    """Return the project name a bookmark source belongs to, derived from its path."""
+    parent = os.path.dirname(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    if os.path.basename(parent) == '.idea':
+        return os.path.basename(os.path.dirname(parent)) # <project>/.idea/workspace.xml
+    if os.path.basename(parent) == 'workspace':
+        return f"{os.path.basename(os.path.dirname(parent))}/{stem}" # DataGrip<version>/workspace/<id>.xml
+    return stem
+
+def _parse_bookmark_source(path):
+    """Pool worker: parse one source; returns (path, bookmarks, error message or None)."""
+    try:
+        return path, list(iter_bookmarks_xml(path)), None
+    except Exception as e:
+        return path, [], str(e)
+
+BOOKMARK_SOURCES_IN_PROCESS = 2  # Up to this many sources, a pool costs more to start than it saves
+BOOKMARK_SOURCES_MAX_PROCESSES = 4
+
+def parse_bookmark_sources(paths, processes=None):
+    """Parse several bookmark XML files, in a small pool of worker processes when there are more than a few."""
+    if len(paths) <= BOOKMARK_SOURCES_IN_PROCESS:
+        return [_parse_bookmark_source(path) for path in paths]
+    processes = min(len(paths), processes or BOOKMARK_SOURCES_MAX_PROCESSES, os.cpu_count() or 1)
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(_parse_bookmark_source, paths)
+
+def merge_bookmark_sources(sources):
+    """Merge [(project, bookmarks)] into one list, tagging each record with its project.
+
+    Records are deduplicated by id; the first source listing a bookmark keeps it.
+    """
+    merged = []
+    seen = set()
+    for project, bookmarks in sources:
+        for bm in bookmarks:
+            if not isinstance(bm, dict) or bm.get('id') in seen:
+                continue
+            seen.add(bm.get('id'))
+            bm['project'] = project
+            merged.append(bm)
+    return merged
+
+# --- SQL Root Catalog ---
+def _catalog_read_worker(path):
+    """Pool worker: return (SHA-1 of the file's bytes, decoded text), or (None, error message)."""
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        return None, str(e)
+    return hashlib.sha1(data).hexdigest(), data.decode('utf-8', errors='replace')
+
+class SQLCatalog:
+    """Persisted manifest of every .sql file under the SQL root: path, size, mtime and content hash.
+
+    scan() walks the root with os.scandir and reads only files whose (size, mtime)
+    changed since the last scan, or every file when the caller's index is cold.
+    Reading and hashing run in a small multiprocessing pool once a batch is large enough;
+    the window runs scan() on a copy, on a pool thread (SQLCatalogScanTask), and swaps it in when done.
+    """
+    EXTENSIONS = ('.sql',)
+    SKIP_DIRS = {'node_modules', '__pycache__'}  # Hidden directories (.git, .idea, ...) are skipped too
+    POOL_THRESHOLD = 64  # Files to read before a worker pool is worth starting
+    MAX_PROCESSES = 4  # Reading is mostly I/O; more workers only add start-up cost
+
+    def __init__(self, path=SQL_CATALOG_FILE, load=True):
+        self.path = path
+        self.root = None
+        self.files = {}    # relative path -> [size, mtime_ns, sha1]
+        self.records = {}  # relative path -> record shown in the list
+        self.dirty = False
+        if load:
+            self.load()
+
+    def copy(self):
+        """Return an independent copy for a scan to update while this one stays in use."""
+        clone = SQLCatalog(self.path, load=False)
+        clone.root = self.root
+        clone.files = {rel: list(entry) for rel, entry in self.files.items()}
+        clone.records = {rel: dict(record) for rel, record in self.records.items()}
+        clone.dirty = self.dirty
+        return clone
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.root = data.get('root')
+            self.files = {rel: list(entry) for rel, entry in data.get('files', {}).items()}
+            logging.info(f"Loaded SQL catalog of {len(self.files)} files from {self.path}")
+        except Exception as e:
+            logging.error(f"Error loading SQL catalog from {self.path}: {e}", exc_info=True)
+            self.root, self.files = None, {}
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'w', encoding='utf-8') as f:
+                json.dump({'root': self.root, 'files': self.files}, f)
+            self.dirty = False
+            logging.info(f"Saved SQL catalog of {len(self.files)} files to {self.path}")
+        except Exception as e:
+            logging.error(f"Error saving SQL catalog to {self.path}: {e}", exc_info=True)
 
-        for state in bm_states:
-            url, line, desc = '', '', ''
-            # Try finding description via option first
-            desc_opt = state.find('option[@name="description"]')
-            if desc_opt is not None:
-                desc = desc_opt.get('value', '')
-
-            # Try finding url/line via attributes element (newer format?)
-            attrs = state.find('attributes')
-            if attrs is not None:
-                url_el = attrs.find("entry[@key='url']")
-                line_el = attrs.find("entry[@key='line']")
-                url = url_el.get('value') if url_el is not None else ''
-                line = line_el.get('value') if line_el is not None else ''
-            else: # Fallback to option elements (older format?)
-                url_opt = state.find('option[@name="url"]')
-                line_opt = state.find('option[@name="line"]')
-                url = url_opt.get('value','') if url_opt is not None else ''
-                line = line_opt.get('value','') if line_opt is not None else ''
-
-            # Validate essential data
-            if not url or not line or not desc:
-                logging.warning(f"Skipping incomplete bookmark entry: URL='{url}', Line='{line}', Desc='{desc}'")
+    def walk(self, root):
+        """Yield (relative path, stat result) for each catalogued file under root."""
+        pending = [root]
+        while pending:
+            directory = pending.pop()
+            try:
+                entries = os.scandir(directory)
+            except OSError as e:
+                logging.warning(f"Cannot scan directory '{directory}': {e}")
                 continue
+            with entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith('.') and entry.name not in self.SKIP_DIRS:
+                                pending.append(entry.path)
+                        elif entry.name.lower().endswith(self.EXTENSIONS) and entry.is_file():
+                            yield os.path.relpath(entry.path, root), entry.stat()
+                    except OSError:
+                        continue
+
+    def scan(self, root, read_all=False, processes=None):
+        """Bring the manifest in line with the files under root.
+
+        Returns (added, changed, removed, texts): lists of relative paths, plus the text
+        of every file read by this scan keyed by relative path.
+        """
+        root = os.path.abspath(root)
+        if root != self.root:
+            self.root, self.files, self.records = root, {}, {}
+            self.dirty = True
+        stats = {}
+        to_read = []
+        for rel, stat in self.walk(root):
+            stats[rel] = (stat.st_size, stat.st_mtime_ns)
+            known = self.files.get(rel)
+            if read_all or known is None or tuple(known[:2]) != stats[rel]:
+                to_read.append(rel)
+        removed = [rel for rel in self.files if rel not in stats]
+
+        paths = [os.path.join(root, rel) for rel in to_read]
+        if len(paths) >= self.POOL_THRESHOLD:
+            processes = min(processes or self.MAX_PROCESSES, os.cpu_count() or 1)
+            with multiprocessing.Pool(processes) as pool:
+                results = pool.map(_catalog_read_worker, paths, chunksize=max(1, len(paths) // (processes * 4)))
+        else:
+            results = [_catalog_read_worker(path) for path in paths]
 
-            title = desc # Use description as the primary display title
-            fname = os.path.basename(url.replace("file://", "")) if url else "Unknown File" # Extract filename
-            full_text = f"{desc} (File: {fname}, Line: {line})" # For logging/tooltip maybe
-            bid = f"{url}|{line}" # Create a unique ID based on URL and line
-
-            bookmarks.append({
-                'url': url,
-                'line': line,
-                'description': desc,
-                'title': title,
-                'full_text': full_text,
-                'id': bid,
-                'count': 0 # Initialize count, will be updated later
-            })
-
-        logging.info(f"Successfully parsed {len(bookmarks)} bookmarks from {file_path}")
-        return bookmarks
-
-    except ET.ParseError as e:
-        logging.error(f"XML Parse Error in {file_path}: {e}")
-        QMessageBox.critical(None, "XML Parsing Error", f"Failed to parse the bookmarks XML file:\n{e}\n\nFile: {file_path}")
-        return []
-    except Exception as e:
-        logging.error(f"Unexpected error parsing XML file {file_path}: {e}", exc_info=True)
-        QMessageBox.critical(None, "XML Parsing Error", f"An unexpected error occurred while parsing the XML file:\n{e}")
-        return []
+        added, changed, texts = [], [], {}
+        for rel, (digest, text) in zip(to_read, results):
+            if digest is None:
+                logging.warning(f"Cannot read catalogued file '{rel}': {text}")
+                continue
+            known = self.files.get(rel)
+            if known is None:
+                added.append(rel)
+            elif known[2] != digest:
+                changed.append(rel)
+            if known is None or known != [*stats[rel], digest]:
+                self.files[rel] = [*stats[rel], digest]
+                self.dirty = True
+            texts[rel] = text
+        for rel in removed:
+            del self.files[rel]
+            self.records.pop(rel, None)
+            self.dirty = True
+        for rel in added + changed:
+            self.records[rel] = self._record(rel)
+        for rel in self.files:
+            if rel not in self.records:
+                self.records[rel] = self._record(rel)
+        return added, changed, removed, texts
+
+    def _record(self, rel):
+        from datetime import datetime
+        path = os.path.join(self.root, rel)
+        size, mtime_ns, digest = self.files[rel]
+        url = pathlib.Path(path).as_uri()
+        return {
+            'id': url,
+            'url': url,
+            'path': path,
+            'title': rel.replace(os.sep, '/'),
+            'description': rel,
+            'content_hash': digest,
+            'size': size,
+            'modified_at': datetime.fromtimestamp(mtime_ns / 1e9).isoformat(),
+            'count': 0,
+        }
+
+    def get_records(self):
+        """Return the catalog records ordered by relative path."""
+        return [self.records[rel] for rel in sorted(self.records)]
+
+class SQLCatalogScanSignals(QObject):
+    """Signals for SQLCatalogScanTask."""
+    scanned = Signal(int, object)  # (generation, scan result dict)
+
+class SQLCatalogScanTask(QRunnable):
+    """Scans and saves a copy of the SQL catalog on a pool thread, so large walks and cold reads don't block the window.
+
+    When the whole search index has to be rebuilt (cold index, statement splitting, or
+    most files changed) the new index is built here too, and handed back for the window
+    to swap in. Emits None as the result if the scan failed.
+    """
+    def __init__(self, catalog, root, read_all, generation, split_dialect=None, counts=None, file_cache=None):
+        super().__init__()
+        self.catalog = catalog
+        self.root = root
+        self.read_all = read_all
+        self.generation = generation
+        self.split_dialect = split_dialect  # SQL dialect when statements are listed one per row
+        self.counts = counts or {}  # Snapshot of the usage counts
+        self.file_cache = file_cache or SQLFileCache()
+        self.signals = SQLCatalogScanSignals()
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            added, changed, removed, texts = self.catalog.scan(self.root, read_all=self.read_all)
+            self.catalog.save()
+            records = self.catalog.get_records()
+            for record in records:
+                record['count'] = self.counts.get(record['id'], 0)
+            texts_by_key = {self.catalog.records[rel]['id']: text for rel, text in texts.items()}
+            index = None
+            if (self.read_all or self.split_dialect
+                    or len(added) + len(changed) + len(removed) > SearchIndex.SYNC_REBUILD_RATIO * max(1, len(records))):
+                index = self.build_index(records, texts_by_key)
+        except Exception as e:
+            logging.error(f"SQL catalog scan of '{self.root}' failed: {e}", exc_info=True)
+            self.signals.scanned.emit(self.generation, None)
+            return
+        self.signals.scanned.emit(self.generation, {
+            'catalog': self.catalog, 'records': records, 'texts': texts_by_key, 'index': index,
+            'added': added, 'changed': changed, 'removed': removed, 'elapsed': time.perf_counter() - start,
+        })
+
+    def build_index(self, records, texts_by_key):
+        """Build a fresh SearchIndex over records, reading files the scan did not."""
+        def content(record):
+            if record.get('sql_content'):
+                return record['sql_content'] # A statement row
+            text = texts_by_key.get(record_key(record))
+            if text is None:
+                try:
+                    text = self.file_cache.read(record['path'])
+                except OSError as e:
+                    logging.warning(f"Cannot read catalogued file '{record['path']}': {e}")
+                    text = ''
+            return text
+        rows = records
+        if self.split_dialect:
+            rows = expand_statement_records(records, content, self.split_dialect, self.counts)
+        index = SearchIndex()
+        index.build(rows, content)
+        return index
+
+class SQLFileChangeSignals(QObject):
+    """Signals for SQLFileChangeTask."""
+    applied = Signal(int, object)  # (generation, result dict)
+
+class SQLFileChangeTask(QRunnable):
+    """Re-reads changed SQL files and re-indexes the records built from them, on a pool thread.
+
+    With split_dialect set the statement rows of every indexed record are recomputed and
+    synced; otherwise only the given records are re-added. Either way the index is only
+    touched if it still holds the list it held when the task was created (source), so a
+    rebuild on the GUI thread in the meantime wins; the result's 'applied' says which happened.
+    """
+    def __init__(self, paths, index, source, records, content_getter, generation, split_dialect=None, counts=None, sources=None):
+        super().__init__()
+        self.paths = paths
+        self.index = index
+        self.source = source
+        self.records = records  # Changed records, or every indexed record when splitting
+        self.content_getter = content_getter
+        self.generation = generation
+        self.split_dialect = split_dialect
+        self.counts = counts or {}
+        self.sources = sources  # Federated record sources, extended with new statement rows
+        self.signals = SQLFileChangeSignals()
+
+    def run(self):
+        result = {'paths': self.paths, 'applied': False, 'delta': None, 'sources': self.sources}
+        try:
+            texts = {}
+            def content(record):
+                key = record_key(record)
+                if key not in texts:
+                    texts[key] = self.content_getter(record)
+                return texts[key]
+            if self.split_dialect:
+                rows = expand_statement_records(self.records, content, self.split_dialect, self.counts)
+                if self.sources is not None:
+                    for row in rows:
+                        source = self.sources.get(row.get('parent_id'))
+                        if source:
+                            self.sources[row['id']] = source
+                with self.index.lock:
+                    if self.index.source is self.source:
+                        result['delta'] = self.index.sync(rows, content, self.sources)
+                        result['applied'] = True
+            else:
+                for record in self.records:
+                    content(record)
+                changed = set()
+                with self.index.lock:
+                    if self.index.source is self.source:
+                        for record in self.records:
+                            key = record_key(record)
+                            if self.index.records.get(key) is record:
+                                self.index.add_record(record, texts[key])
+                                changed.add(key)
+                        result['delta'] = (changed, set())
+                        result['applied'] = True
+        except Exception as e:
+            logging.error(f"Re-indexing {len(self.paths)} changed SQL files failed: {e}", exc_info=True)
+        self.signals.applied.emit(self.generation, result)
 
 def generate_help_locations_text():
     """Generates a formatted string detailing important file locations."""
@@ -542,6 +3877,7 @@ system defaults or fallbacks will be attempted.
     return help_text
 
 # --- Custom Item Delegate for Fixed Height List Items ---
+SOURCE_BADGE_ROLE = Qt.ItemDataRole.UserRole + 1  # Item data: source of a record in the federated list
 class BookmarkDelegate(QStyledItemDelegate):
     ITEM_PADDING = 8 # Padding around content within the item rect
     COUNT_BOX_WIDTH = 40 # Fixed width for the usage count box
@@ -555,6 +3891,10 @@ class BookmarkDelegate(QStyledItemDelegate):
         "Final": QColor(0, 128, 0, 80),     # Green with transparency
         # Default color for other labels will be handled dynamically
     }
+    SOURCE_BADGES = {
+        SOURCE_DATAGRIP: ("DG", QColor(33, 150, 243, 90)),    # Blue with transparency
+        SOURCE_INTERNAL: ("Vault", QColor(156, 39, 176, 90)), # Purple with transparency
+    }
     
     def calculate_fixed_height(self, font):
         # Calculate a consistent height based on font metrics
@@ -608,6 +3948,16 @@ class BookmarkDelegate(QStyledItemDelegate):
                         item_rect.top(), 
                         item_rect.width() - self.COUNT_BOX_WIDTH - self.TEXT_SPACING,
                         item_rect.height())
+
+        # Draw the source badge (federated view only) in front of the title
+        badge = self.SOURCE_BADGES.get(index.data(SOURCE_BADGE_ROLE))
+        if badge:
+            badge_text, badge_color = badge
+            badge_width = QFontMetrics(option.font).horizontalAdvance(badge_text) + 2 * self.LABEL_PADDING
+            badge_rect = QRect(text_rect.left(), text_rect.top(), badge_width, text_rect.height())
+            painter.fillRect(badge_rect, badge_color)
+            painter.drawText(badge_rect, Qt.AlignmentFlag.AlignCenter, badge_text)
+            text_rect.setLeft(badge_rect.right() + self.TEXT_SPACING)
                         
         # Draw title text, elide if necessary
         font = option.font
@@ -668,20 +4018,124 @@ class BookmarkDelegate(QStyledItemDelegate):
         # Standard width calculation - let the view determine this
         return QSize(0, fixed_height)
 
-# --- Custom List Widget for Key Press Handling ---
-class CustomListWidget(QListWidget):
+# --- Bookmark List Model ---
+class BookmarkListModel(QAbstractListModel):
+    """Read-only list model over the records currently shown.
+
+    Rows are the result records themselves (no copies) plus an optional parallel list of
+    source badges, so a new result list is one model reset instead of a widget item per
+    row. Rows are handed to the view a page at a time (canFetchMore/fetchMore) as it
+    scrolls, which keeps the layout after a reset cheap for very long lists.
+    BookmarkDelegate paints each row from its UserRole data.
+    """
+    PAGE_SIZE = 1000
+
     def __init__(self, parent=None):
         super().__init__(parent)
+        self._records = []
+        self._badges = None
+        self._loaded = 0  # Rows exposed to the view so far
+        self._rows = None  # record key -> row, built on first lookup
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._loaded
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self._loaded < len(self._records)
+
+    def fetchMore(self, parent=QModelIndex()):
+        self.ensure_loaded(self._loaded + self.PAGE_SIZE - 1)
+
+    def ensure_loaded(self, row):
+        """Expose rows up to and including row (capped at the record count) to the view."""
+        last = min(row, len(self._records) - 1)
+        if last < self._loaded:
+            return
+        self.beginInsertRows(QModelIndex(), self._loaded, last)
+        self._loaded = last + 1
+        self.endInsertRows()
+
+    def record_count(self):
+        return len(self._records)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._records):
+            return None
+        if role == Qt.ItemDataRole.UserRole:
+            return self._records[index.row()]
+        if role == SOURCE_BADGE_ROLE:
+            return self._badges[index.row()] if self._badges else None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return record_title(self._records[index.row()])
+        return None
+
+    def set_records(self, records, badges=None):
+        """Replace all rows; badges, if given, holds one SOURCE_BADGE_ROLE value per record."""
+        self.beginResetModel()
+        self._records = list(records)
+        self._badges = list(badges) if badges is not None else None
+        self._loaded = min(self.PAGE_SIZE, len(self._records))
+        self._rows = None
+        self.endResetModel()
+
+    def append_records(self, records):
+        """Add records at the end; they are fetched into view like any other page."""
+        self._records.extend(records)
+        if self._badges is not None:
+            self._badges.extend([None] * len(records))
+        self._rows = None
+        if self._loaded < self.PAGE_SIZE:
+            self.ensure_loaded(self.PAGE_SIZE - 1)
+
+    def row_of(self, key):
+        """Return the row of the record with key, or -1."""
+        if self._rows is None:
+            self._rows = {}
+            for row, record in enumerate(self._records):
+                self._rows.setdefault(record_key(record), row)
+        return self._rows.get(key, -1)
+
+# --- Custom List View for Key Press Handling ---
+class BookmarkListView(QListView):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setModel(BookmarkListModel(self))
         self.setUniformItemSizes(True) # Optimization for fixed item sizes
-        self.setLayoutMode(QListWidget.LayoutMode.Batched) # Performance hint
-        self.setBatchSize(100) # How many items to process in a batch
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
 
         # Store reference to parent window if possible, for callbacks
         if isinstance(parent, FloatingBookmarksWindow):
             self.parent_window = parent
         else:
             self.parent_window = None
-            logging.warning("CustomListWidget initialized without a valid FloatingBookmarksWindow parent.")
+            logging.warning("BookmarkListView initialized without a valid FloatingBookmarksWindow parent.")
+
+    def count(self):
+        """Number of records listed, including rows not fetched into view yet."""
+        return self.model().record_count()
+
+    def current_index(self):
+        """Return the current row's index, or None if there is no current row."""
+        index = self.currentIndex()
+        return index if index.isValid() else None
+
+    def index_at(self, pos):
+        index = self.indexAt(pos)
+        return index if index.isValid() else None
+
+    def select_row(self, row, hint=QAbstractItemView.ScrollHint.EnsureVisible):
+        self.model().ensure_loaded(row)
+        index = self.model().index(row, 0)
+        self.selectionModel().setCurrentIndex(index, QItemSelectionModel.SelectionFlag.ClearAndSelect)
+        self.scrollTo(index, hint)
+
+    def select_key(self, key):
+        """Make the row holding the record with key current. Returns False if it is not listed."""
+        row = self.model().row_of(key)
+        if row < 0:
+            return False
+        self.select_row(row)
+        return True
 
     def keyPressEvent(self, event: QKeyEvent):
         if not self.parent_window:
@@ -689,7 +4143,7 @@ class CustomListWidget(QListWidget):
             return
 
         key = event.key()
-        current_item = self.currentItem()
+        current_item = self.current_index()
 
         if key == Qt.Key.Key_Space:
             # Spacebar updates preview pane
@@ -706,7 +4160,7 @@ class CustomListWidget(QListWidget):
             else:
                 super().keyPressEvent(event) # Default if no item selected
         else:
-            # Let QListWidget handle other keys (arrows, page up/down, etc.)
+            # Let QListView handle other keys (arrows, page up/down, etc.)
             super().keyPressEvent(event)
 
 # --- Tray Copy Dialog ---
@@ -866,6 +4320,29 @@ class FloatingBookmarksWindow(QMainWindow):
         self.set_sql_root_action = QAction("Set SQL Root Directory...", self)
         self.set_sql_root_action.triggered.connect(self.set_sql_root_directory)
 
+        self.split_statements_action = QAction("Split Queries into Statements", self)
+        self.split_statements_action.setCheckable(True)
+        self.split_statements_action.setChecked(bool(self.settings.get('split_statements', False)))
+        self.split_statements_action.toggled.connect(self.toggle_statement_split)
+
+        self.sql_dialect_group = QActionGroup(self)
+        self.sql_dialect_actions = []
+        current_dialect = self.settings.get('sql_dialect', 'generic')
+        for dialect, label in (('generic', "Generic"), ('postgres', "PostgreSQL"), ('tsql', "SQL Server (T-SQL)"), ('mysql', "MySQL")):
+            action = QAction(label, self)
+            action.setCheckable(True)
+            action.setChecked(dialect == current_dialect)
+            action.triggered.connect(lambda _checked=False, dialect=dialect: self.set_sql_dialect(dialect))
+            self.sql_dialect_group.addAction(action)
+            self.sql_dialect_actions.append(action)
+
+        self.rescan_catalog_action = QAction("Rescan SQL Catalog", self)
+        self.rescan_catalog_action.setShortcut(QKeySequence("F5"))
+        self.rescan_catalog_action.triggered.connect(self.rescan_sql_catalog)
+
+        self.bookmark_sources_action = QAction("Bookmark Sources...", self)
+        self.bookmark_sources_action.triggered.connect(self.show_bookmark_sources_dialog)
+
         self.clear_counts_action = QAction("Clear Usage Counts", self)
         self.clear_counts_action.triggered.connect(self.clear_usage_counts)
 
@@ -873,6 +4350,24 @@ class FloatingBookmarksWindow(QMainWindow):
         self.transparency_action = QAction("Window Opacity...", self)
         self.transparency_action.triggered.connect(self.show_transparency_dialog)
 
+        self.explain_search_action = QAction("Explain Search Plan...", self)
+        self.explain_search_action.triggered.connect(self.show_search_plan)
+
+        self.metadata_filter_action = QAction("Filter by Metadata...", self)
+        self.metadata_filter_action.triggered.connect(self.show_metadata_filter_dialog)
+
+        self.find_duplicates_action = QAction("Find Duplicate Queries...", self)
+        self.find_duplicates_action.triggered.connect(self.show_duplicate_queries)
+
+        self.recall_queries_action = QAction("Recall Similar Queries...", self)
+        self.recall_queries_action.setShortcut(QKeySequence("Ctrl+Shift+R"))
+        self.recall_queries_action.triggered.connect(self.show_query_recall)
+
+        self.watch_bookmarks_file_action = QAction("Watch Bookmarks File for Changes", self)
+        self.watch_bookmarks_file_action.setCheckable(True)
+        self.watch_bookmarks_file_action.setChecked(bool(self.settings.get('watch_bookmarks_file', False)))
+        self.watch_bookmarks_file_action.toggled.connect(self.toggle_bookmarks_file_watch)
+
         # Preview edit toggle
         self.toggle_edit_action = QAction("Editable Preview", self)
         self.toggle_edit_action.setCheckable(True)
@@ -883,6 +4378,9 @@ class FloatingBookmarksWindow(QMainWindow):
         self.help_locations_action = QAction("File Locations...", self)
         self.help_locations_action.triggered.connect(self.show_help_locations)
 
+        self.search_stats_action = QAction("Search Statistics...", self)
+        self.search_stats_action.triggered.connect(self.show_search_stats)
+
         self.about_action = QAction("About", self)
         self.about_action.triggered.connect(self.show_about_dialog)
 
@@ -893,6 +4391,7 @@ class FloatingBookmarksWindow(QMainWindow):
         # ----- File Menu -----
         self.file_menu.addAction(self.open_file_action)
         self.file_menu.addAction(self.set_sql_root_action)
+        self.file_menu.addAction(self.bookmark_sources_action)
         self.file_menu.addSeparator()
         self.file_menu.addAction(self.clear_counts_action)
         self.file_menu.addSeparator()
@@ -903,9 +4402,21 @@ class FloatingBookmarksWindow(QMainWindow):
         self.view_menu.addAction(self.transparency_action)
         self.view_menu.addAction(self.toggle_edit_action)
         self.view_menu.addSeparator()
+        self.view_menu.addAction(self.explain_search_action)
+        self.view_menu.addAction(self.metadata_filter_action)
+        self.view_menu.addAction(self.find_duplicates_action)
+        self.view_menu.addAction(self.recall_queries_action)
+        self.view_menu.addAction(self.rescan_catalog_action)
+        self.view_menu.addAction(self.split_statements_action)
+        dialect_menu = self.view_menu.addMenu("SQL Dialect")
+        for action in self.sql_dialect_actions:
+            dialect_menu.addAction(action)
+        self.view_menu.addSeparator()
+        self.view_menu.addAction(self.watch_bookmarks_file_action)
 
         # ----- Help Menu -----
         self.help_menu.addAction(self.help_locations_action)
+        self.help_menu.addAction(self.search_stats_action)
         self.help_menu.addSeparator()
         self.help_menu.addAction(self.about_action)
 
@@ -937,8 +4448,87 @@ class FloatingBookmarksWindow(QMainWindow):
         self.bookmarks = []
         # Cache for sorted bookmarks after filtering
         self.sorted_bookmarks_cache = []
+        # Trigram index over titles and SQL used by the search box
+        self.search_index = SearchIndex()
+        self.indexed_bookmarks = None  # The self.bookmarks list the index was last synced from
+        try:
+            regex_budget = max(1, int(self.settings.get('regex_time_budget_ms', 50))) / 1000.0
+        except (ValueError, TypeError):
+            regex_budget = 0.05
+        self.search_engine = SearchEngine(self.search_index, self.settings.get('search_cache_size', 128),
+                                          RegexSearcher(time_budget=regex_budget))
+        # Background search state: results from older generations are dropped
+        self._search_generation = 0
+        self._search_cancel_event = None
+        self._search_task = None
+        self._search_keeps_position = False  # The running search is a background refresh (apply_list_changes)
+        self._pending_select_key = None  # Record to select once the running search is shown
+        self.search_pool = QThreadPool(self)
+        self.search_pool.setMaxThreadCount(1) # One search at a time; cancelled ones exit quickly
+        self.search_debounce_timer = QTimer(self)
+        self.search_debounce_timer.setSingleShot(True)
+        self.search_debounce_timer.setInterval(int(self.settings.get('search_debounce_ms', 150)))
+        self.search_debounce_timer.timeout.connect(self.start_background_search)
+        # Contents of DataGrip SQL files, revalidated by (mtime, size) on each read
+        try:
+            sql_cache_budget = max(1, int(self.settings.get('sql_cache_budget_mb', 64))) * 1024 * 1024
+        except (ValueError, TypeError):
+            sql_cache_budget = 64 * 1024 * 1024
+        self.sql_file_cache = SQLFileCache(sql_cache_budget)
+        # Windowed preview of very large files: the open LineIndexedFile and the loaded line range
+        self.large_preview = None
+        self.line_offset_cache = LRUCache(8)  # (path, mtime_ns, size) -> line offsets
+        # (url, sql_root, home) -> resolved path; cleared by root changes and the directory watcher
+        self.resolved_paths = LRUCache(RESOLVED_PATH_CACHE_SIZE)
+        self.path_watcher = QFileSystemWatcher(self)
+        self.path_watcher.directoryChanged.connect(self.on_sql_directory_changed)
+        # Watch on the SQL files the DataGrip bookmarks resolve to; edits are batched and re-read per file
+        self.sql_file_watcher = QFileSystemWatcher(self)
+        self.sql_file_watcher.fileChanged.connect(self.on_sql_file_changed)
+        self.pending_sql_changes = set()
+        self._sql_change_generation = 0
+        self.sql_change_timer = QTimer(self)
+        self.sql_change_timer.setSingleShot(True)
+        self.sql_change_timer.setInterval(300) # Collect a save (and save-all) into one refresh
+        self.sql_change_timer.timeout.connect(self.apply_sql_file_changes)
+        # Opt-in watch on the original DataGrip XML; changes are re-parsed off the UI thread and diffed in
+        self.bookmarks_file_watcher = QFileSystemWatcher(self)
+        self.bookmarks_file_watcher.fileChanged.connect(self.on_bookmarks_file_changed)
+        self.bookmarks_reload_timer = QTimer(self)
+        self.bookmarks_reload_timer.setSingleShot(True)
+        self.bookmarks_reload_timer.setInterval(500) # DataGrip writes the file in several steps
+        self.bookmarks_reload_timer.timeout.connect(self.start_bookmarks_reload)
+        self._bookmarks_reload_generation = 0
+        # Bumped by load_bookmarks; batches and results of older parses are dropped
+        self._bookmarks_load_generation = 0
+        self.reload_pool = QThreadPool(self)
+        self.reload_pool.setMaxThreadCount(1)
+        # Active metadata range filter (MetadataColumns filter dict), set from View > Filter by Metadata
+        self.metadata_filter = {}
+        # Pinned searches; their result sets are updated as the index syncs
+        self.saved_searches = SavedSearches(self.settings.get('saved_searches', []))
+        # MinHash/LSH index over the vault for near-duplicate checks on import/add
+        self.signature_store = SignatureStore()
+        # Manifest of the .sql files under the SQL root, for the catalog data source; scanned on reload_pool
+        self.sql_catalog = SQLCatalog()
+        self._catalog_scan_generation = 0
+        self._catalog_scan_running = False  # One scan at a time; a rescan asked for meanwhile waits for it
+        self._catalog_rescan_pending = False
+        self.vault_duplicates = NearDuplicateIndex(self.signature_store)
+        # TF-IDF matrix over the vault for "recall similar queries"
+        self.query_recall = QueryRecall()
+        self.rebuild_vault_indexes()
         # File source tracking
         self.loaded_file_path = None
+        # Last parsed DataGrip bookmarks, kept for the federated view
+        self.datagrip_records = []
+        # [(project, bookmarks)] parsed from the extra sources (bookmark_sources + discovered)
+        self.extra_source_records = []
+        self._extra_sources_generation = 0
+        # Bookmarks of the opened XML file alone, before the extra sources are merged in
+        self.primary_bookmarks = []
+        # Record key -> source of each record in the federated list (empty otherwise)
+        self.record_sources = {}
         # Current data source (DataGrip XML or Internal Vault)
         self.current_data_source = self.settings.get('data_source', SOURCE_DATAGRIP)
         
@@ -980,14 +4570,16 @@ class FloatingBookmarksWindow(QMainWindow):
         
         # Load initial data based on source
         if self.current_data_source == SOURCE_DATAGRIP:
-            last_file = self.settings.get('loaded_copy_path')
-            if last_file and os.path.isfile(last_file):
-                self.load_bookmarks(last_file)
-            else:
-                self.update_bookmark_list()  # Show empty state
+            self.load_datagrip_sources()
+        elif self.current_data_source == SOURCE_FEDERATED:
+            self.load_federated_sources()
+        elif self.current_data_source == SOURCE_CATALOG:
+            self.load_sql_catalog()
         else:
             self.load_queries_from_vault()
         
+        self.update_bookmarks_file_watch()
+
         # Show the window, init complete
         self.show()
         logging.info(f"{APP_NAME} window initialized and shown.")
@@ -995,11 +4587,20 @@ class FloatingBookmarksWindow(QMainWindow):
     def connect_signals(self):
         """Connect all signals to their slots."""
         # Search and filter signals
-        self.search_box.textChanged.connect(self.filter_bookmarks)
-        self.search_title_radio.toggled.connect(self.filter_bookmarks)
-        self.search_syntax_radio.toggled.connect(self.filter_bookmarks)
-        self.search_both_radio.toggled.connect(self.filter_bookmarks)
-        self.label_filter_combo.currentIndexChanged.connect(self.filter_bookmarks)
+        # Search runs on a worker thread behind a short debounce (see schedule_search)
+        self.search_box.textChanged.connect(self.schedule_search)
+        self.search_box.textEdited.connect(self.update_search_completions)
+        self.search_completer.activated[str].connect(self.apply_search_completion)
+        self.search_title_radio.toggled.connect(self.schedule_search)
+        self.search_syntax_radio.toggled.connect(self.schedule_search)
+        self.search_both_radio.toggled.connect(self.schedule_search)
+        self.search_ranked_checkbox.toggled.connect(self.on_ranked_search_toggled)
+        self.search_regex_checkbox.toggled.connect(self.on_regex_search_toggled)
+        self.search_ignore_case_checkbox.toggled.connect(self.on_regex_ignore_case_toggled)
+        self.label_filter_combo.currentIndexChanged.connect(self.schedule_search)
+        self.source_view_combo.currentIndexChanged.connect(self.schedule_search)
+        self.project_filter_combo.currentIndexChanged.connect(self.schedule_search)
+        self.save_search_button.clicked.connect(self.save_current_search)
         
         # Font size signal
         self.font_size_combo.currentTextChanged.connect(self.update_font_size)
@@ -1012,7 +4613,7 @@ class FloatingBookmarksWindow(QMainWindow):
         self.custom_close_button.clicked.connect(self.close_app)
         
         # List signals
-        self.bookmark_list.itemDoubleClicked.connect(self.handle_item_action)
+        self.bookmark_list.doubleClicked.connect(self.handle_item_action)
         
         logging.info("Signals connected successfully.")
 
@@ -1072,14 +4673,37 @@ class FloatingBookmarksWindow(QMainWindow):
         self.source_combo = QComboBox()
         self.source_combo.addItem("DataGrip Export (XML)", SOURCE_DATAGRIP)
         self.source_combo.addItem("Internal Query Vault", SOURCE_INTERNAL)
+        self.source_combo.addItem("DataGrip + Vault (Federated)", SOURCE_FEDERATED)
+        self.source_combo.addItem("SQL Root Catalog", SOURCE_CATALOG)
         
         # Set current index based on settings
         current_source = self.settings.get('data_source', SOURCE_DATAGRIP)
-        index = 0 if current_source == SOURCE_DATAGRIP else 1
-        self.source_combo.setCurrentIndex(index)
+        index = self.source_combo.findData(current_source)
+        self.source_combo.setCurrentIndex(index if index >= 0 else 0)
+
+        # Federated view filter: re-filters the combined index, no reload
+        self.source_view_label = QLabel("Show:")
+        self.source_view_combo = QComboBox()
+        self.source_view_combo.addItem("All Sources", None)
+        self.source_view_combo.addItem("DataGrip Only", SOURCE_DATAGRIP)
+        self.source_view_combo.addItem("Vault Only", SOURCE_INTERNAL)
+        federated = current_source == SOURCE_FEDERATED
+        self.source_view_label.setVisible(federated)
+        self.source_view_combo.setVisible(federated)
+
+        # Project filter, shown once bookmarks from more than one DataGrip project are loaded
+        self.project_filter_label = QLabel("Project:")
+        self.project_filter_combo = QComboBox()
+        self.project_filter_combo.addItem("All Projects", None)
+        self.project_filter_label.setVisible(False)
+        self.project_filter_combo.setVisible(False)
         
         source_layout.addWidget(source_label)
         source_layout.addWidget(self.source_combo)
+        source_layout.addWidget(self.source_view_label)
+        source_layout.addWidget(self.source_view_combo)
+        source_layout.addWidget(self.project_filter_label)
+        source_layout.addWidget(self.project_filter_combo)
         source_layout.addStretch(1)  # Push widgets to the left
         
         main_layout.addLayout(source_layout)
@@ -1090,8 +4714,14 @@ class FloatingBookmarksWindow(QMainWindow):
 
         # --- Search Box ---
         self.search_box = QLineEdit()
-        self.search_box.setPlaceholderText("Search Queries...")
+        self.search_box.setPlaceholderText("Search Queries... (table:, column:, join: supported)")
         top_layout.addWidget(self.search_box, 2) # Give search box more stretch factor
+        # Completion popup; suggestions come from search_index.complete() on each edit
+        self.search_completer = QCompleter(self)
+        self.search_completer.setModel(QStringListModel(self.search_completer))
+        self.search_completer.setWidget(self.search_box)
+        self.search_completer.setCompletionMode(QCompleter.CompletionMode.UnfilteredPopupCompletion)
+        self._completion_targets = {}  # suggestion -> resulting search box text
 
         # --- Search Options ---
         s_opt_layout = QHBoxLayout()
@@ -1104,6 +4734,19 @@ class FloatingBookmarksWindow(QMainWindow):
             self.search_group.addButton(btn)
             s_opt_layout.addWidget(btn)
         self.search_both_radio.setChecked(True) # Default to searching both
+        self.search_ranked_checkbox = QCheckBox("Ranked")
+        self.search_ranked_checkbox.setToolTip("Order results by BM25 relevance (any word may match)")
+        self.search_ranked_checkbox.setChecked(bool(self.settings.get('ranked_search', False)))
+        s_opt_layout.addWidget(self.search_ranked_checkbox)
+        self.search_regex_checkbox = QCheckBox("Regex")
+        self.search_regex_checkbox.setToolTip("Treat the search text as a regular expression")
+        self.search_regex_checkbox.setChecked(bool(self.settings.get('regex_search', False)))
+        s_opt_layout.addWidget(self.search_regex_checkbox)
+        self.search_ignore_case_checkbox = QCheckBox("Aa")
+        self.search_ignore_case_checkbox.setToolTip("Case-insensitive regex (same as starting the pattern with (?i))")
+        self.search_ignore_case_checkbox.setChecked(bool(self.settings.get('regex_ignore_case', False)))
+        self.search_ignore_case_checkbox.setEnabled(self.search_regex_checkbox.isChecked())
+        s_opt_layout.addWidget(self.search_ignore_case_checkbox)
         top_layout.addLayout(s_opt_layout)
         
         # --- Label Filter ---
@@ -1147,6 +4790,18 @@ class FloatingBookmarksWindow(QMainWindow):
 
         main_layout.addLayout(top_layout)
 
+        # --- Saved Searches (pinned, with live counts) ---
+        self.saved_search_layout = QHBoxLayout()
+        self.saved_search_layout.setSpacing(6)
+        self.saved_search_layout.addWidget(QLabel("Saved:"))
+        self.saved_search_buttons = QHBoxLayout()
+        self.saved_search_layout.addLayout(self.saved_search_buttons)
+        self.saved_search_layout.addStretch(1)
+        self.save_search_button = QPushButton("Save Search...")
+        self.save_search_button.setToolTip("Pin the current search text, scope and label filter")
+        self.saved_search_layout.addWidget(self.save_search_button)
+        main_layout.addLayout(self.saved_search_layout)
+
         # --- Splitter, List, Preview ---
         self.splitter = QSplitter(Qt.Orientation.Horizontal)
         main_layout.addWidget(self.splitter, 1) # Allow splitter to take remaining vertical space
@@ -1155,7 +4810,8 @@ class FloatingBookmarksWindow(QMainWindow):
         list_cont = QWidget()
         list_lay = QVBoxLayout(list_cont)
         list_lay.setContentsMargins(0, 0, 0, 0) # No margins for the list container
-        self.bookmark_list = CustomListWidget(self) # Use our custom list widget
+        self.bookmark_list = BookmarkListView(self) # Model-backed list, see BookmarkListModel
+        self.bookmark_model = self.bookmark_list.model()
         self.bookmark_list.setItemDelegate(BookmarkDelegate(self.bookmark_list)) # Apply custom delegate
         list_lay.addWidget(self.bookmark_list)
         # Label shown when list is empty
@@ -1207,6 +4863,7 @@ class FloatingBookmarksWindow(QMainWindow):
 
         # Add main editor
         preview_layout.addWidget(self.preview_pane, 1)  # Stretch factor 1
+        self.preview_pane.verticalScrollBar().valueChanged.connect(self.on_preview_scrolled)
 
         # Footer layout with Editable toggle & Add button
         preview_footer_layout = QHBoxLayout()
@@ -1221,6 +4878,9 @@ class FloatingBookmarksWindow(QMainWindow):
 
         preview_footer_layout.addWidget(self.edit_toggle_checkbox)
         preview_footer_layout.addWidget(self.add_button)
+        self.preview_status_label = QLabel()
+        self.preview_status_label.hide()
+        preview_footer_layout.addWidget(self.preview_status_label)
         preview_footer_layout.addStretch()
 
         preview_layout.addLayout(preview_footer_layout)
@@ -1284,15 +4944,6 @@ class FloatingBookmarksWindow(QMainWindow):
             font = QFont("Segoe UI", font_size) # Use Segoe UI or fallback like Arial
             logging.info(f"Attempting to set font size to {font_size}pt")
 
-            # --- Preserve Selection ---
-            selected_item_id = None
-            current_item = self.bookmark_list.currentItem()
-            if current_item:
-                data = current_item.data(Qt.ItemDataRole.UserRole)
-                if isinstance(data, dict):
-                    selected_item_id = data.get('id')
-            # --- End Preserve Selection ---
-
             # Apply font to relevant widgets
             self.bookmark_list.setFont(font)
             
@@ -1315,31 +4966,15 @@ class FloatingBookmarksWindow(QMainWindow):
             # Re-apply delegate to ensure sizeHint uses new font (might not be strictly necessary)
             # self.bookmark_list.setItemDelegate(BookmarkDelegate(self.bookmark_list))
 
-            # Force layout update for the list widget items
+            # Force layout update for the list rows; the current row is kept by the model
             self.bookmark_list.updateGeometries()
-            # Trigger a repaint might help sometimes, but updateGeometries should handle it
-            # self.bookmark_list.viewport().update()
-
-            # --- Restore Selection ---
-            if selected_item_id:
-                restored = False
-                for i in range(self.bookmark_list.count()):
-                    item = self.bookmark_list.item(i)
-                    data = item.data(Qt.ItemDataRole.UserRole)
-                    if isinstance(data, dict) and data.get('id') == selected_item_id:
-                        self.bookmark_list.setCurrentItem(item, QItemSelectionModel.SelectionFlag.SelectCurrent)
-                        self.bookmark_list.scrollToItem(item, QAbstractItemView.ScrollHint.EnsureVisible)
-                        restored = True
-                        break
-                if restored:
-                    logging.debug(f"Restored selection to item ID {selected_item_id}")
-                else:
-                    logging.warning(f"Could not restore selection for item ID {selected_item_id} after font change.")
-            # --- End Restore Selection ---
+            current_item = self.bookmark_list.current_index()
+            if current_item:
+                self.bookmark_list.scrollTo(current_item, QAbstractItemView.ScrollHint.EnsureVisible)
 
             # Update preview explicitly if an item is selected
-            if self.bookmark_list.currentItem():
-                self.update_preview_pane(self.bookmark_list.currentItem())
+            if current_item:
+                self.update_preview_pane(current_item)
             else:
                 # Clear preview if nothing is selected after font change
                 self.preview_pane.clear()
@@ -1494,6 +5129,7 @@ class FloatingBookmarksWindow(QMainWindow):
                      if isinstance(bm_cache, dict) and bm_cache.get('id') == bookmark_id:
                           bm_cache['count'] = new_count
                           break
+                self.note_usage_change(bookmark_id, new_count)
 
                 # Refresh the main list view if the count was updated
                 # (Sort order might change)
@@ -1589,11 +5225,11 @@ class FloatingBookmarksWindow(QMainWindow):
         if file_path and os.path.exists(file_path):
             # User selected a valid file
             try:
-                # Ensure the target directory for the copy exists
-                os.makedirs(os.path.dirname(LAST_BOOKMARKS_COPY), exist_ok=True)
-                # Copy the selected file to our app data dir for stable access
-                shutil.copy2(file_path, LAST_BOOKMARKS_COPY)
-                logging.info(f"Copied selected bookmarks file '{file_path}' to local storage '{LAST_BOOKMARKS_COPY}'")
+                # Copy the selected file to our app data dir for stable access, unless the copy is current
+                if copy_if_changed(file_path, LAST_BOOKMARKS_COPY):
+                    logging.info(f"Copied selected bookmarks file '{file_path}' to local storage '{LAST_BOOKMARKS_COPY}'")
+                else:
+                    logging.info(f"Local copy '{LAST_BOOKMARKS_COPY}' is up to date with '{file_path}'; copy skipped")
 
                 # Save the path of the *original* file the user selected
                 self.settings.set('last_file_path', file_path)
@@ -1603,6 +5239,7 @@ class FloatingBookmarksWindow(QMainWindow):
 
                 # Load bookmarks from the *copied* file
                 self.load_bookmarks(LAST_BOOKMARKS_COPY)
+                self.update_bookmarks_file_watch()
 
             except Exception as e:
                 logging.error(f"Error copying or loading selected bookmarks file '{file_path}': {e}", exc_info=True)
@@ -1620,9 +5257,14 @@ class FloatingBookmarksWindow(QMainWindow):
         logging.debug(f"Bookmark count updated to: {count}")
 
     def load_bookmarks(self, file_path):
-        """Load bookmarks from the specified XML file path."""
+        """Load bookmarks from the specified XML file path.
+
+        The file is parsed on reload_pool; records are shown as they stream in and
+        on_bookmarks_loaded finishes the load.
+        """
         logging.info(f"Attempting to load bookmarks from: {file_path}")
         self.loaded_file_path = file_path # Store the path we're loading from
+        self._bookmarks_load_generation += 1
 
         if not os.path.exists(file_path):
             logging.warning(f"Bookmarks file to load does not exist: {file_path}")
@@ -1630,106 +5272,132 @@ class FloatingBookmarksWindow(QMainWindow):
             # Use APP_NAME as title if file doesn't exist
             self.setWindowTitle(f"{APP_NAME} - No File Loaded")
             QMessageBox.warning(self, "File Not Found", f"The bookmarks file could not be found at:\n{file_path}\n\nPlease use 'File > Open' to select a valid file.")
-        else:
-            # Parse the XML file
-            loaded_bookmarks = parse_bookmarks_xml(file_path)
+            # Update the list widget and count display after clearing
+            self.update_bookmark_list()
+            self.update_bookmark_count()
+            return
 
-            # Update counts for each loaded bookmark from usage data
-            for bm in loaded_bookmarks:
-                 if isinstance(bm, dict) and 'id' in bm:
-                      bm['count'] = self.usage_counts.get_count(bm['id'])
+        # Parse the XML file in the background, showing records as they stream in
+        self._loading_batches = 0
+        self.setWindowTitle(f"{APP_NAME} - Loading...")
+        task = BookmarksLoadTask(file_path, self._bookmarks_load_generation)
+        task.signals.batch.connect(self.show_loading_batch)
+        task.signals.loaded.connect(self.on_bookmarks_loaded)
+        self.reload_pool.start(task)
 
-            self.bookmarks = loaded_bookmarks # Store the loaded and count-updated bookmarks
-            # Display the original file name in the title bar for user context
-            original_file = self.settings.get('last_file_path', file_path) # Prefer original path for title
-            self.setWindowTitle(f"{APP_NAME} - {os.path.basename(original_file)}")
-            logging.info(f"Finished loading {len(self.bookmarks)} bookmarks.")
+        # Save settings (specifically the loaded_copy_path might have changed)
+        # Moved saving to close/quit to avoid frequent writes
+        # self.settings.save_settings()
 
-        # Update the list widget and count display after loading/clearing
+    @Slot(int, object, str)
+    def on_bookmarks_loaded(self, generation, loaded_bookmarks, error):
+        """Finish load_bookmarks once the background parse is done."""
+        if generation != self._bookmarks_load_generation:
+            return # A newer load is on its way
+        if error:
+            QMessageBox.critical(self, "XML Parsing Error", error)
+        loaded_bookmarks = self.with_bookmark_sources(loaded_bookmarks, reload_extra=True)
+        self.resolve_bookmark_paths(loaded_bookmarks)
+
+        # Update counts for each loaded bookmark from usage data
+        for bm in loaded_bookmarks:
+             if isinstance(bm, dict) and 'id' in bm:
+                  bm['count'] = self.usage_counts.get_count(bm['id'])
+
+        self.datagrip_records = loaded_bookmarks
+        self.update_project_filter_dropdown()
+        if self.current_data_source == SOURCE_FEDERATED:
+            # Merge with the vault instead of replacing it
+            self.load_federated_sources(reload_datagrip=False)
+            return
+        self.bookmarks = loaded_bookmarks # Store the loaded and count-updated bookmarks
+        self.rebuild_search_index()
+        # Display the original file name in the title bar for user context
+        original_file = self.settings.get('last_file_path', self.loaded_file_path) # Prefer original path for title
+        self.setWindowTitle(f"{APP_NAME} - {os.path.basename(original_file)}")
+        logging.info(f"Finished loading {len(self.bookmarks)} bookmarks.")
+
+        # Update the list widget and count display after loading
         self.update_bookmark_list()
         self.update_bookmark_count()
 
-        # Save settings (specifically the loaded_copy_path might have changed)
-        # Moved saving to close/quit to avoid frequent writes
-        # self.settings.save_settings()
+    @Slot(int, object)
+    def show_loading_batch(self, generation, batch):
+        """Append a batch of freshly parsed bookmarks to the list while an XML file loads.
 
-    def update_bookmark_list(self):
-        """Update list widget: filters, sorts, displays items, and caches the sorted list."""
+        Only used for plain DataGrip listings with no search active; the final sorted
+        list replaces these rows once loading finishes.
+        """
+        if generation != self._bookmarks_load_generation:
+            return
+        self._loading_batches += 1
+        if self.current_data_source != SOURCE_DATAGRIP or self.search_box.text():
+            return
+        if self._loading_batches == 1:
+            self._cancel_background_search() # Its results would replace the streamed rows
+            self.bookmark_model.set_records([])
+            self.no_bookmarks_label.hide()
+            self.bookmark_list.show()
+        self.bookmark_model.append_records(batch)
+        self.setWindowTitle(f"{APP_NAME} - Loading... {self.bookmark_list.count()} bookmarks")
+
+    def update_bookmark_list(self, select_key=None):
+        """Re-run the current search on the search pool; the results replace the list when they arrive.
+
+        Any search still running is superseded. With select_key, that record is selected
+        once the new results are shown.
+        """
         logging.debug("Updating query list...")
+        self._pending_select_key = select_key
+        self.start_background_search()
 
+    def display_search_results(self, results, search_term):
+        """Show results in the list, preserving selection, and cache the list."""
         # --- Preserve Selection ---
-        selected_item_id = None
-        current_item = self.bookmark_list.currentItem()
-        if current_item:
-            data = current_item.data(Qt.ItemDataRole.UserRole)
-            if isinstance(data, dict):
-                selected_item_id = data.get('id')
+        selected_item_id = self.current_record_key()
         # --- End Preserve Selection ---
 
-        # Disable updates for performance during clear/populate
-        self.bookmark_list.setUpdatesEnabled(False)
-        self.bookmark_list.clear() # Remove all existing items
+        self.sorted_bookmarks_cache = results # Update the cache
+        logging.debug(f"Filtered/Sorted/Cached: {len(self.sorted_bookmarks_cache)}")
 
-        search_term = self.search_box.text()
-        # 1. Filter the raw bookmarks based on search
-        filtered_bookmarks = self.apply_filter(search_term)
-        # 2. Sort the filtered bookmarks
-        self.sorted_bookmarks_cache = self.apply_sort(filtered_bookmarks) # Update the cache
-        logging.debug(f"Filtered: {len(filtered_bookmarks)}, Sorted/Cached: {len(self.sorted_bookmarks_cache)}")
-
-        restored_idx = -1 # Index of the previously selected item in the new sorted list
+        # One model reset over the result records; the delegate paints rows as they scroll into view
+        self.set_list_records(self.sorted_bookmarks_cache)
 
         if self.sorted_bookmarks_cache:
             # Hide the "No bookmarks" label and show the list
             self.no_bookmarks_label.hide()
             self.bookmark_list.show()
-
-            # Populate the list widget with sorted items
-            for index, bm in enumerate(self.sorted_bookmarks_cache):
-                if not isinstance(bm, dict):
-                    logging.warning(f"Skipping non-dict item during list update: {bm}")
-                    continue
-                item = QListWidgetItem()
-                item.setData(Qt.ItemDataRole.UserRole, bm) # Store data in the item
-                # Delegate takes care of display based on data
-                self.bookmark_list.addItem(item)
-                # Check if this is the item that was previously selected
-                if selected_item_id and bm.get('id') == selected_item_id:
-                    restored_idx = index
         else:
             # Show the "No bookmarks" label and hide the list
             self.bookmark_list.hide()
-            if search_term:
+            search_error = self._search_error(search_term)
+            if search_error:
+                self.no_bookmarks_label.setText(search_error)
+            elif search_term:
                 self.no_bookmarks_label.setText("No queries match your search.")
             elif not self.bookmarks:
-                if self.current_data_source == SOURCE_DATAGRIP:
+                if self.current_data_source == SOURCE_FEDERATED:
+                    self.no_bookmarks_label.setText("No bookmarks or vault queries loaded.")
+                elif self.current_data_source == SOURCE_DATAGRIP:
                     self.no_bookmarks_label.setText("No queries loaded. Use File > Open to load XML.")
+                elif self.current_data_source == SOURCE_CATALOG:
+                    self.no_bookmarks_label.setText("No .sql files found. Use File > Set SQL Root Directory.")
                 else:
                     self.no_bookmarks_label.setText("No queries in vault. Add new queries to get started.")
             else:
-                if self.current_data_source == SOURCE_DATAGRIP:
+                if self.current_data_source == SOURCE_FEDERATED:
+                    self.no_bookmarks_label.setText("No queries in the selected source.")
+                elif self.current_data_source == SOURCE_DATAGRIP:
                     self.no_bookmarks_label.setText("No queries available (check XML file?).")
+                elif self.current_data_source == SOURCE_CATALOG:
+                    self.no_bookmarks_label.setText("No catalogued files in the selected filter.")
                 else:
                     self.no_bookmarks_label.setText("No queries available (vault may be corrupted).")
             self.no_bookmarks_label.show()
 
-        # Re-enable updates now that the list is populated
-        self.bookmark_list.setUpdatesEnabled(True)
-
         # --- Restore Selection ---
-        restored_item = None
-        if restored_idx != -1:
-            try:
-                restored_item = self.bookmark_list.item(restored_idx)
-                if restored_item:
-                    self.bookmark_list.setCurrentItem(restored_item, QItemSelectionModel.SelectionFlag.SelectCurrent)
-                    # Scroll smoothly to ensure it's visible
-                    self.bookmark_list.scrollToItem(restored_item, QAbstractItemView.ScrollHint.EnsureVisible)
-                    logging.debug(f"Restored selection to index {restored_idx} (ID: {selected_item_id})")
-                else:
-                    logging.warning(f"Found index {restored_idx} for selection restore, but item was null.")
-            except Exception as e:
-                logging.error(f"Error restoring selection to index {restored_idx}: {e}", exc_info=True)
+        if selected_item_id is not None and self.bookmark_list.select_key(selected_item_id):
+            logging.debug(f"Restored selection to ID {selected_item_id}")
         # --- End Restore Selection ---
 
         # Update highlighting in the preview pane based on the current search term
@@ -1743,54 +5411,383 @@ class FloatingBookmarksWindow(QMainWindow):
                 self.setWindowTitle(f"{APP_NAME} - DataGrip Mode - {os.path.basename(original_file)}")
             else:
                 self.setWindowTitle(f"{APP_NAME} - DataGrip Mode (No File Loaded)")
+        elif self.current_data_source == SOURCE_FEDERATED:
+            self.setWindowTitle(f"{APP_NAME} - Federated ({len(self.datagrip_records)} bookmarks + "
+                                f"{len(self.bookmarks) - len(self.datagrip_records)} vault queries)")
+        elif self.current_data_source == SOURCE_CATALOG:
+            self.setWindowTitle(f"{APP_NAME} - SQL Catalog ({len(self.bookmarks)} files)")
         else:
             self.setWindowTitle(f"{APP_NAME} - Internal Query Vault")
         
-        logging.debug("Query list update complete.")
+        logging.debug("Query list update complete.")
+
+    def set_list_records(self, records):
+        """Load records into the list model, with source badges in the federated view."""
+        rows = [bm for bm in records if isinstance(bm, dict)]
+        if len(rows) != len(records):
+            logging.warning(f"Skipping {len(records) - len(rows)} non-dict records during list update")
+        badges = None
+        if self.record_sources and self.current_data_source == SOURCE_FEDERATED:
+            badges = [self.record_sources.get(record_key(bm)) for bm in rows]
+        self.bookmark_model.set_records(rows, badges)
+
+    def current_record_key(self):
+        """Return the key of the record in the current list row, or None."""
+        index = self.bookmark_list.current_index()
+        data = index.data(Qt.ItemDataRole.UserRole) if index else None
+        return record_key(data) if isinstance(data, dict) else None
+
+    def filter_bookmarks(self):
+        """Filter bookmarks based on search term and update the list."""
+        logging.debug("Filtering bookmarks...")
+        self.update_bookmark_list()
+
+    def current_search_params(self):
+        """Capture the search box, scope radios, label filter and ranking mode as a params dict."""
+        try:
+            top_k = max(1, int(self.settings.get('ranked_top_k', 100)))
+        except (ValueError, TypeError):
+            top_k = 100
+        label = self.label_filter_combo.currentData() if hasattr(self, 'label_filter_combo') else None
+        return {
+            'term': self.search_box.text(),
+            'search_title': self.search_title_radio.isChecked() or self.search_both_radio.isChecked(),
+            'search_syntax': self.search_syntax_radio.isChecked() or self.search_both_radio.isChecked(),
+            'label': label,
+            'ranked': self.search_ranked_checkbox.isChecked(),
+            'regex': self.search_regex_checkbox.isChecked(),
+            'ignore_case': self.search_ignore_case_checkbox.isChecked(),
+            'top_k': top_k,
+            'federated': self.current_data_source == SOURCE_FEDERATED,
+            'source': self.source_view_combo.currentData() if self.current_data_source == SOURCE_FEDERATED else None,
+            'project': self.project_filter_combo.currentData(),
+            'meta': dict(self.metadata_filter),
+        }
+
+    @Slot(str)
+    def update_search_completions(self, text):
+        """Offer title/label/table completions for the text before the cursor."""
+        popup = self.search_completer.popup()
+        if not self.settings.get('search_autocomplete', True) or self.search_regex_checkbox.isChecked():
+            popup.hide()
+            return
+        try:
+            limit = max(1, int(self.settings.get('autocomplete_max_items', 8)))
+        except (ValueError, TypeError):
+            limit = 8
+        self._ensure_search_index()
+        cursor = self.search_box.cursorPosition()
+        before, after = text[:cursor].lstrip(), text[cursor:]
+        targets = {}
+        # Whole input as a title prefix, then the last word alone (for qualifiers and boolean queries)
+        for completion in self.search_index.complete(before, limit):
+            targets[completion] = completion + after
+        head, separator, last = before.rpartition(' ')
+        if separator and last:
+            for completion in self.search_index.complete(last, limit):
+                targets.setdefault(completion, f"{head} {completion}{after}")
+        suggestions = list(targets)[:limit]
+        self._completion_targets = targets
+        self.search_completer.model().setStringList(suggestions)
+        if suggestions:
+            self.search_completer.complete()
+        else:
+            popup.hide()
+
+    @Slot(str)
+    def apply_search_completion(self, completion):
+        target = self._completion_targets.get(completion)
+        if target is None:
+            return
+        self.search_box.setText(target)
+        self.search_box.setCursorPosition(len(target))
+
+    @Slot()
+    def schedule_search(self, *_args):
+        """Cancel any in-flight search and (re)start the debounce timer for a new one."""
+        self._cancel_background_search()
+        self.search_debounce_timer.start()
+
+    @Slot()
+    def start_background_search(self, keep_position=False):
+        """Run the current search on the search pool; results come back via on_search_results().
+
+        With keep_position the results are merged in by show_list_changes() instead of
+        display_search_results(), keeping the current row and scroll position.
+        """
+        self.search_debounce_timer.stop()
+        self._ensure_search_index()
+        self._cancel_background_search()
+        self._search_keeps_position = keep_position
+        cancel_event = threading.Event()
+        self._search_cancel_event = cancel_event
+        task = SearchTask(self.search_engine, self.current_search_params(), self._search_generation, cancel_event)
+        task.signals.results_ready.connect(self.on_search_results)
+        self._search_task = task # Keep the signals object alive until delivery
+        self.search_pool.start(task)
+        logging.debug(f"Started background search generation {self._search_generation}")
+
+    def _cancel_background_search(self):
+        """Invalidate the current search generation and signal the running task to stop."""
+        self._search_generation += 1
+        if self._search_cancel_event is not None:
+            self._search_cancel_event.set()
+            self._search_cancel_event = None
+
+    @Slot(int, object)
+    def on_search_results(self, generation, results):
+        """Display background search results unless a newer search has started since."""
+        if generation != self._search_generation:
+            logging.debug(f"Dropping stale search results (generation {generation}, current {self._search_generation})")
+            return
+        self._search_cancel_event = None
+        if self._search_keeps_position:
+            self.show_list_changes(results)
+        else:
+            self.display_search_results(results, self.search_box.text())
+        if self._pending_select_key is not None:
+            self.select_pending_record()
+
+    @Slot(bool)
+    def on_ranked_search_toggled(self, checked):
+        """Switch between substring filtering and BM25-ranked search."""
+        self.settings.set('ranked_search', bool(checked))
+        logging.info(f"Ranked search {'enabled' if checked else 'disabled'}.")
+        self.schedule_search()
+
+    def _search_error(self, search_term):
+        """Return a message if search_term is an invalid regex (regex mode) or boolean query, else None."""
+        if not search_term:
+            return None
+        if self.search_regex_checkbox.isChecked():
+            try:
+                compile_search_pattern(search_term, regex_flags(self.current_search_params()))
+            except re.error as e:
+                return f"Invalid regular expression: {e}"
+        elif is_boolean_query(search_term):
+            try:
+                parse_boolean_query(search_term)
+            except ValueError as e:
+                return f"Invalid query: {e}"
+        return None
+
+    @Slot(bool)
+    def on_regex_search_toggled(self, checked):
+        """Switch between plain-text and regular-expression search."""
+        self.settings.set('regex_search', bool(checked))
+        self.search_ignore_case_checkbox.setEnabled(bool(checked))
+        logging.info(f"Regex search {'enabled' if checked else 'disabled'}.")
+        self.schedule_search()
+
+    @Slot(bool)
+    def on_regex_ignore_case_toggled(self, checked):
+        """Switch regex search between case-sensitive and case-insensitive matching."""
+        self.settings.set('regex_ignore_case', bool(checked))
+        self.schedule_search()
+        
+    def rebuild_search_index(self, content_getter=None):
+        """Rebuild the trigram search index from the current bookmarks/queries."""
+        content_getter = content_getter or self.get_sql_content
+        records = self.bookmarks
+        self.indexed_bookmarks = self.bookmarks
+        if self.settings.get('split_statements', False):
+            records = self.expand_statements(records, content_getter)
+        sources = self.record_sources if self.current_data_source == SOURCE_FEDERATED else None
+        self.search_index_changed(self.search_index.sync(records, content_getter, sources))
+
+    def adopt_search_index(self, index):
+        """Swap in a search index built off the GUI thread from the current bookmarks."""
+        self.indexed_bookmarks = self.bookmarks
+        self.search_index.adopt(index)
+        self.search_index_changed(None)
+
+    def search_index_changed(self, delta):
+        """Update caches and saved searches after a sync (delta) or a full rebuild (None)."""
+        # Entries from the previous generation can never hit again; free them
+        self.search_engine.result_cache.clear()
+        if delta is None:
+            self.saved_searches.materialize(self.search_engine)
+        else:
+            self.saved_searches.apply_changes(self.search_engine, *delta)
+        self.update_saved_search_buttons()
+        self.update_sql_file_watch()
+
+    def expand_statements(self, records, content_getter):
+        """Replace each multi-statement record with its statements (see expand_statement_records)."""
+        expanded = expand_statement_records(records, content_getter, self.settings.get('sql_dialect', 'generic'),
+                                            self.usage_counts.counts)
+        if self.current_data_source == SOURCE_FEDERATED:
+            for statement in expanded:
+                source = self.record_sources.get(statement.get('parent_id'))
+                if source:
+                    self.record_sources[statement['id']] = source
+        return expanded
 
-    def filter_bookmarks(self):
-        """Filter bookmarks based on search term and update the list."""
-        logging.debug("Filtering bookmarks...")
+    @Slot(bool)
+    def toggle_statement_split(self, checked):
+        """List multi-statement sources one statement per row, or whole again."""
+        self.settings.set('split_statements', checked)
+        self.rebuild_search_index()
         self.update_bookmark_list()
-        
-    def apply_filter(self, search_term):
-        """Filter bookmarks based on search criteria and return filtered list."""
-        logging.debug(f"Applying filter with search term: '{search_term}'")
-        if not self.bookmarks:
-            return []
-            
-        # First apply label filter
-        filtered = self.apply_label_filter(self.bookmarks)
-        
-        # If no search term, just return the label-filtered list
-        if not search_term:
-            return filtered
-            
-        # Apply search criteria
-        search_term = search_term.lower()
-        results = []
-        
-        for bm in filtered:
-            title = bm.get('name', '').lower()
-            
-            # Determine search scope based on radio button selection
-            search_title = self.search_title_radio.isChecked() or self.search_both_radio.isChecked()
-            search_syntax = self.search_syntax_radio.isChecked() or self.search_both_radio.isChecked()
-            
-            # Match title if searching titles
-            if search_title and search_term in title:
-                results.append(bm)
-                continue
-                
-            # Match SQL content if searching syntax
-            if search_syntax:
-                # Get SQL content
-                sql_content = self.get_sql_content(bm)
-                if sql_content and search_term in sql_content.lower():
-                    results.append(bm)
-                    
-        logging.debug(f"Search filter results: {len(results)}/{len(filtered)} queries matching '{search_term}'")
-        return results
+
+    def set_sql_dialect(self, dialect):
+        """Switch the statement splitting rules and re-split the list if needed."""
+        if dialect == self.settings.get('sql_dialect', 'generic'):
+            return
+        self.settings.set('sql_dialect', dialect)
+        if self.settings.get('split_statements', False):
+            self.rebuild_search_index()
+            self.update_bookmark_list()
+
+    def note_usage_change(self, key, count):
+        """Propagate a usage-count change to the count column and to count-filtered saved searches."""
+        self.search_index.update_count(key, count)
+        if any(entry['params'].get('meta') for entry in self.saved_searches.entries):
+            self.saved_searches.apply_changes(self.search_engine, {key}, set())
+            self.update_saved_search_buttons()
+
+    def filter_by_metadata(self, filters=None, **kwargs):
+        """Return the loaded records matching MetadataColumns filters, in list order.
+
+        e.g. filter_by_metadata(modified_within_days=30, min_count=5)
+        """
+        self._ensure_search_index()
+        with self.search_index.lock:
+            keys = self.search_index.metadata.select(filters, **kwargs)
+            records = self.search_index.records
+            return sort_records([records[key] for key in keys if key in records])
+
+    @Slot()
+    def show_metadata_filter_dialog(self):
+        """Edit the metadata range filter applied on top of the search (dates, usage, SQL length)."""
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"{APP_NAME} - Filter by Metadata")
+        layout = QVBoxLayout(dialog)
+        form = QFormLayout()
+        fields = [
+            ('modified_within_days', "Modified within (days):", 1, 36500, 30),
+            ('created_within_days', "Created within (days):", 1, 36500, 30),
+            ('min_count', "Used at least (times):", 0, 1_000_000, 5),
+            ('max_count', "Used at most (times):", 0, 1_000_000, 0),
+            ('min_length', "SQL length at least (chars):", 0, 100_000_000, 1000),
+            ('max_length', "SQL length at most (chars):", 0, 100_000_000, 1000),
+        ]
+        editors = {}
+        for name, caption, minimum, maximum, default in fields:
+            row = QHBoxLayout()
+            enabled = QCheckBox()
+            spin = QSpinBox()
+            spin.setRange(minimum, maximum)
+            current = self.metadata_filter.get(name)
+            enabled.setChecked(current is not None)
+            spin.setValue(int(current) if current is not None else default)
+            spin.setEnabled(current is not None)
+            enabled.toggled.connect(spin.setEnabled)
+            row.addWidget(enabled)
+            row.addWidget(spin, 1)
+            form.addRow(caption, row)
+            editors[name] = (enabled, spin)
+        layout.addLayout(form)
+        layout.addWidget(QLabel("Dates are only known for vault queries; bookmarks without them are excluded by date filters."))
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel |
+                                      QDialogButtonBox.StandardButton.Reset)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        button_box.button(QDialogButtonBox.StandardButton.Reset).clicked.connect(
+            lambda: [enabled.setChecked(False) for enabled, _spin in editors.values()])
+        layout.addWidget(button_box)
+        if not dialog.exec():
+            return
+        self.metadata_filter = {name: spin.value() for name, (enabled, spin) in editors.items() if enabled.isChecked()}
+        self.metadata_filter_action.setText(
+            "Filter by Metadata... (active)" if self.metadata_filter else "Filter by Metadata...")
+        logging.info(f"Metadata filter set: {self.metadata_filter}")
+        self.schedule_search()
+
+    def update_saved_search_buttons(self):
+        """Recreate the pinned saved-search buttons with their current result counts."""
+        if not hasattr(self, 'saved_search_buttons'):
+            return
+        while self.saved_search_buttons.count():
+            widget = self.saved_search_buttons.takeAt(0).widget()
+            if widget is not None:
+                widget.deleteLater()
+        for name in self.saved_searches.names():
+            button = QPushButton(f"{name} ({self.saved_searches.count(name)})")
+            button.setToolTip(f"Search: {self.saved_searches.get(name)['params'].get('term') or '(all)'}\n"
+                              "Right-click to remove")
+            button.clicked.connect(lambda _checked=False, n=name: self.open_saved_search(n))
+            button.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+            button.customContextMenuRequested.connect(lambda _pos, n=name: self.remove_saved_search(n))
+            self.saved_search_buttons.addWidget(button)
+
+    @Slot()
+    def save_current_search(self):
+        """Pin the current search params under a name."""
+        params = self.current_search_params()
+        default_name = params['term'].strip()[:30] or (params['label'] or "All")
+        name, ok = QInputDialog.getText(self, "Save Search", "Name for this search:", text=default_name)
+        name = name.strip()
+        if not ok or not name:
+            return
+        self._ensure_search_index()
+        self.saved_searches.add(name, params, self.search_engine)
+        self.settings.set('saved_searches', self.saved_searches.entries)
+        self.update_saved_search_buttons()
+        logging.info(f"Saved search '{name}': {self.saved_searches.count(name)} results")
+
+    def remove_saved_search(self, name):
+        reply = QMessageBox.question(self, "Remove Saved Search", f"Remove the saved search '{name}'?",
+                                     QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                                     QMessageBox.StandardButton.No)
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+        self.saved_searches.remove(name)
+        self.settings.set('saved_searches', self.saved_searches.entries)
+        self.update_saved_search_buttons()
+        logging.info(f"Removed saved search '{name}'")
+
+    def open_saved_search(self, name):
+        """Restore a saved search's widgets and show its materialized results without searching."""
+        entry = self.saved_searches.get(name)
+        if entry is None:
+            return
+        params = entry['params']
+        self._ensure_search_index()
+        widgets = [self.search_box, self.search_title_radio, self.search_syntax_radio, self.search_both_radio,
+                   self.search_regex_checkbox, self.search_ignore_case_checkbox, self.label_filter_combo,
+                   self.source_view_combo, self.project_filter_combo]
+        for widget in widgets:
+            widget.blockSignals(True)
+        try:
+            self.search_box.setText(params.get('term') or '')
+            search_title, search_syntax = params.get('search_title', True), params.get('search_syntax', True)
+            if search_title and not search_syntax:
+                self.search_title_radio.setChecked(True)
+            elif search_syntax and not search_title:
+                self.search_syntax_radio.setChecked(True)
+            else:
+                self.search_both_radio.setChecked(True)
+            self.search_regex_checkbox.setChecked(bool(params.get('regex')))
+            self.search_ignore_case_checkbox.setChecked(bool(params.get('ignore_case')))
+            self.search_ignore_case_checkbox.setEnabled(bool(params.get('regex')))
+            label_index = self.label_filter_combo.findData(params.get('label')) if params.get('label') else 0
+            self.label_filter_combo.setCurrentIndex(max(0, label_index))
+            source_index = self.source_view_combo.findData(params.get('source')) if params.get('source') else 0
+            self.source_view_combo.setCurrentIndex(max(0, source_index))
+            project_index = self.project_filter_combo.findData(params.get('project')) if params.get('project') else 0
+            self.project_filter_combo.setCurrentIndex(max(0, project_index))
+        finally:
+            for widget in widgets:
+                widget.blockSignals(False)
+        self._cancel_background_search()
+        self.display_search_results(self.saved_searches.records(name, self.search_index), params.get('term') or '')
+        logging.info(f"Opened saved search '{name}' ({self.saved_searches.count(name)} results)")
+
+    def _ensure_search_index(self):
+        """Rebuild the search index if self.bookmarks was replaced since the last build."""
+        if self.indexed_bookmarks is not self.bookmarks:
+            self.rebuild_search_index()
     
     def apply_sort(self, bookmarks):
         """Sort the filtered bookmarks by name (alphabetically)."""
@@ -1798,12 +5795,13 @@ class FloatingBookmarksWindow(QMainWindow):
             return []
             
         # Simple alphabetical sort by name
-        return sorted(bookmarks, key=lambda bm: bm.get('name', '').lower())
+        return sort_records(bookmarks)
 
     # --- Preview Pane and Highlighting ---
-    def update_preview_pane(self, item: QListWidgetItem):
+    def update_preview_pane(self, item: QModelIndex):
         """Update the preview pane with the SQL content of the selected bookmark/query."""
         if not item:
+            self.close_large_preview()
             self.preview_pane.clear()
             self.preview_pane.setText("-- Select a query to preview its SQL content...")
             return
@@ -1812,13 +5810,20 @@ class FloatingBookmarksWindow(QMainWindow):
         if not isinstance(data, dict):
             self.preview_pane.setText("-- Error: Invalid query data.")
             return
+
+        # Very large files are shown a window at a time instead of all at once
+        large_path = self.large_preview_path(data)
+        if large_path and self.show_large_preview(large_path, data):
+            self.highlight_search_results()
+            return
+        self.close_large_preview()
             
         # Get SQL content using our helper that handles both DataGrip and internal storage
         sql_content = self.get_sql_content(data)
         
         if not sql_content:
             # No content available
-            if self.current_data_source == SOURCE_INTERNAL:
+            if self.record_source(data) == SOURCE_INTERNAL:
                 self.preview_pane.setText("-- This query has no content.")
             else:
                 # For DataGrip mode, show more helpful error
@@ -1837,6 +5842,102 @@ class FloatingBookmarksWindow(QMainWindow):
         # Apply search term highlighting if there's a current search
         self.highlight_search_results()
 
+    # --- Large File Preview ---
+    def large_preview_path(self, data):
+        """Return the file to preview in windows if data would show a whole file over the size threshold."""
+        if data.get('sql_content'):
+            return None
+        if self.bookmark_line(data) and self.settings.get('bookmark_statement_only', True):
+            return None  # Only the bookmarked statement is shown
+        path = self.record_file_path(data)
+        if not path:
+            return None
+        try:
+            threshold = float(self.settings.get('large_preview_threshold_mb', 4)) * 1024 * 1024
+            return path if os.path.getsize(path) >= threshold else None
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def large_preview_window(self):
+        try:
+            return max(100, int(self.settings.get('large_preview_window_lines', 2000)))
+        except (ValueError, TypeError):
+            return 2000
+
+    def show_large_preview(self, path, data):
+        """Memory-map path and show a window of lines around the record's line. Returns False on failure."""
+        try:
+            stat = os.stat(path)
+            key = (path, stat.st_mtime_ns, stat.st_size)
+            indexed = LineIndexedFile(path, self.line_offset_cache.get(key))
+            self.line_offset_cache.put(key, indexed.offsets)
+        except (OSError, ValueError) as e:
+            logging.error(f"Cannot open large file preview for '{path}': {e}", exc_info=True)
+            return False
+        self.close_large_preview()
+
+        window = self.large_preview_window()
+        line = self.bookmark_line(data) or data.get('line_start') or 1
+        center = min(max(0, line - 1), max(0, indexed.line_count - 1))
+        first = max(0, min(center - window // 2, indexed.line_count - window))
+        last = min(indexed.line_count, first + window)
+        self.large_preview = {'file': indexed, 'first': first, 'last': last}
+
+        self.preview_pane.setText(indexed.read_lines(first, last))
+        self.preview_pane.setMarginType(0, QsciScintilla.MarginType.TextMargin)
+        self._number_large_preview()
+        self.preview_pane.setCursorPosition(center - first, 0)
+        self.preview_pane.setFirstVisibleLine(max(0, center - first - 3))
+        logging.info(f"Large file preview of '{path}' ({indexed.size / 1024 / 1024:.1f} MB, "
+                     f"{indexed.line_count} lines): lines {first + 1}-{last}")
+        return True
+
+    def close_large_preview(self):
+        """Release the memory map of a large-file preview and restore normal line numbers."""
+        if self.large_preview is None:
+            return
+        self.large_preview['file'].close()
+        self.large_preview = None
+        self.preview_pane.clearMarginText()
+        self.preview_pane.setMarginType(0, QsciScintilla.MarginType.NumberMargin)
+        self.preview_pane.setMarginWidth(0, '00000')
+        self.preview_status_label.hide()
+
+    def _number_large_preview(self):
+        """Label each loaded row with its line number in the file."""
+        preview = self.large_preview
+        first, last = preview['first'], preview['last']
+        self.preview_pane.clearMarginText()
+        self.preview_pane.setMarginWidth(0, '0' * (len(str(last)) + 1))
+        for row in range(last - first):
+            self.preview_pane.setMarginText(row, str(first + row + 1), QsciScintilla.STYLE_LINENUMBER)
+        self.preview_status_label.setText(f"Lines {first + 1:,}-{last:,} of {preview['file'].line_count:,}")
+        self.preview_status_label.show()
+
+    @Slot(int)
+    def on_preview_scrolled(self, value):
+        """Load the next or previous window of a large-file preview when scrolled near an edge."""
+        preview = self.large_preview
+        if preview is None:
+            return
+        scrollbar = self.preview_pane.verticalScrollBar()
+        step = self.large_preview_window() // 2
+        indexed = preview['file']
+        if value >= scrollbar.maximum() - scrollbar.pageStep() and preview['last'] < indexed.line_count:
+            last = min(indexed.line_count, preview['last'] + step)
+            self.preview_pane.append(indexed.read_lines(preview['last'], last))  # Window always ends on a newline
+            preview['last'] = last
+        elif value <= scrollbar.pageStep() // 2 and preview['first'] > 0:
+            first = max(0, preview['first'] - step)
+            visible = self.preview_pane.firstVisibleLine()
+            self.preview_pane.insertAt(indexed.read_lines(first, preview['first']), 0, 0)
+            self.preview_pane.setFirstVisibleLine(visible + preview['first'] - first)
+            preview['first'] = first
+        else:
+            return
+        self._number_large_preview()
+        self.highlight_search_results()
+
     def highlight_sql_syntax(self):
         """SQL syntax highlighting is now handled by QScintilla's lexer."""
         # This method is kept as a placeholder to avoid breaking any existing calls
@@ -1846,7 +5947,9 @@ class FloatingBookmarksWindow(QMainWindow):
     def highlight_search_results(self):
         """Highlight search terms in the preview pane using QScintilla search."""
         # Get the current search text
-        search_text = self.search_box.text()
+        # table:/column:/join: qualifiers select queries; only the free text is highlighted
+        regex_mode = self.search_regex_checkbox.isChecked()
+        search_text = self.search_box.text() if regex_mode else parse_search_qualifiers(self.search_box.text())[0]
         if not search_text:
             # Clear any existing indicators if search is empty
             self.preview_pane.clearIndicatorRange(0, 0, self.preview_pane.lines(), 0, 0)
@@ -1865,6 +5968,13 @@ class FloatingBookmarksWindow(QMainWindow):
         text = self.preview_pane.text()
         if not text:
             return
+
+        if regex_mode:
+            for start, end in self._regex_preview_positions(search_text, text):
+                line, index = self._position_to_line_index(text, start)
+                end_line, end_index = self._position_to_line_index(text, end)
+                self.preview_pane.fillIndicatorRange(line, index, end_line, end_index, SEARCH_INDICATOR)
+            return
             
         # Find all occurrences and highlight them
         pos = 0
@@ -1883,6 +5993,23 @@ class FloatingBookmarksWindow(QMainWindow):
             # Move to position after this match
             pos += len(search_text)
             
+    def _regex_preview_positions(self, pattern, text):
+        """Return the regex match spans the last background search found in the previewed text.
+
+        Regexes only ever run in the search's worker processes; a record the search did
+        not cover, or whose text changed since, is shown without highlights.
+        """
+        current_item = self.bookmark_list.current_index()
+        data = current_item.data(Qt.ItemDataRole.UserRole) if current_item else None
+        if not isinstance(data, dict):
+            return []
+        key = record_key(data)
+        positions = self.search_engine.regex_positions.get(key)
+        document = self.search_index.documents.get(key)
+        if positions and document is not None and document[1] == text:
+            return positions
+        return []
+
     def _position_to_line_index(self, text, position):
         """Helper function to convert a flat position to line and index within that line."""
         # Split text into lines
@@ -1902,7 +6029,7 @@ class FloatingBookmarksWindow(QMainWindow):
         return 0, 0
 
     # --- Item Actions ---
-    def handle_item_action(self, item: QListWidgetItem):
+    def handle_item_action(self, item: QModelIndex):
         """Handle double-click/Enter: increment count, copy SQL, log action."""
         if not item:
             logging.warning("handle_item_action called with null item.")
@@ -1930,6 +6057,7 @@ class FloatingBookmarksWindow(QMainWindow):
                  if isinstance(bm_cache, dict) and bm_cache.get('id') == bookmark_id:
                       bm_cache['count'] = new_count
                       break
+            self.note_usage_change(bookmark_id, new_count)
 
             # 2. Get SQL Content
             sql_content = self.get_sql_content(bookmark_data)
@@ -2025,6 +6153,19 @@ class FloatingBookmarksWindow(QMainWindow):
         else:
             logging.warning("Context menu 'Copy URL' triggered but context_item is None.")
 
+    def copy_bookmark_file_from_context(self):
+        """Triggered by the 'Copy Whole File SQL' context menu action."""
+        if not self.context_menu_item:
+            logging.warning("Context menu 'Copy Whole File' triggered but context_item is None.")
+            return
+        data = self.context_menu_item.data(Qt.ItemDataRole.UserRole)
+        if not isinstance(data, dict) or not data.get('url'):
+            QMessageBox.warning(self, "No URL", "The selected bookmark does not have a file associated with it.")
+            return
+        sql_content = self.get_sql_content(data, whole_file=True)
+        QGuiApplication.clipboard().setText(sql_content)
+        logging.info(f"Copied whole file via context menu: {data.get('url')}")
+
     def move_item(self, direction):
          """Moves the selected item up or down in the list (UI only for now)."""
          # NOTE: This currently only moves the item in the QListWidget.
@@ -2107,13 +6248,15 @@ class FloatingBookmarksWindow(QMainWindow):
     @Slot(QPoint)
     def show_context_menu(self, pos: QPoint):
         """Show the right-click context menu at the given position."""
-        item = self.bookmark_list.itemAt(pos)
-        self.context_menu_item = item # Store the item that was right-clicked
+        item = self.bookmark_list.index_at(pos)
+        # Store the row that was right-clicked; a persistent index goes invalid if the list is reset meanwhile
+        self.context_menu_item = QPersistentModelIndex(item) if item else None
         if item:
              # Enable/disable actions based on the item
              data = item.data(Qt.ItemDataRole.UserRole)
              has_url = bool(data and isinstance(data, dict) and data.get('url'))
              self.copy_url_action_context.setEnabled(has_url)
+             self.copy_file_action_context.setEnabled(has_url)
              self.copy_sql_action_context.setEnabled(True) # Always enabled if item exists
 
              # Map the local position to global screen coordinates and show the menu
@@ -2145,6 +6288,7 @@ class FloatingBookmarksWindow(QMainWindow):
                 for bm in self.bookmarks:
                      if isinstance(bm, dict):
                           bm['count'] = 0 # Reset count in memory
+                          self.search_index.update_count(record_key(bm), 0)
             else:
                  logging.warning("Bookmarks list not found while resetting counts in memory.")
 
@@ -2347,14 +6491,135 @@ class FloatingBookmarksWindow(QMainWindow):
 
         logging.info("Application state saving process completed.")
 
+    def load_federated_sources(self, reload_datagrip=True):
+        """Load DataGrip bookmarks and vault queries side by side into one search index.
+
+        With reload_datagrip=False the last parsed bookmarks are reused (e.g. after a vault edit).
+        """
+        if reload_datagrip or not self.datagrip_records:
+            last_file = self.settings.get('loaded_copy_path')
+            if last_file and os.path.isfile(last_file):
+                # Parsed in the background; on_bookmarks_loaded calls back here with the vault merged in
+                self.load_bookmarks(last_file)
+                return
+            self.datagrip_records = self.with_bookmark_sources([], reload_extra=True)
+            self.resolve_bookmark_paths(self.datagrip_records)
+            for bm in self.datagrip_records:
+                if isinstance(bm, dict) and 'id' in bm:
+                    bm['count'] = self.usage_counts.get_count(bm['id'])
+            self.update_project_filter_dropdown()
+        self.query_vault.load_vault()
+        vault_records = self.query_vault.get_queries()
+        self.record_sources = {record_key(bm): SOURCE_DATAGRIP for bm in self.datagrip_records if isinstance(bm, dict)}
+        self.record_sources.update({record_key(q): SOURCE_INTERNAL for q in vault_records if isinstance(q, dict)})
+        self.bookmarks = self.datagrip_records + vault_records
+        self.rebuild_search_index()
+        self.update_bookmark_list()
+        self.update_bookmark_count()
+        logging.info(f"Federated sources loaded: {len(self.datagrip_records)} DataGrip bookmarks, "
+                     f"{len(vault_records)} vault queries")
+
+    def record_source(self, record):
+        """Return the data source a displayed record belongs to."""
+        if self.current_data_source == SOURCE_FEDERATED:
+            return self.record_sources.get(record_key(record), SOURCE_DATAGRIP)
+        return self.current_data_source
+
+    def vault_editable(self):
+        """True if vault queries are shown and can be edited (vault or federated mode)."""
+        return self.current_data_source in (SOURCE_INTERNAL, SOURCE_FEDERATED)
+
+    def refresh_vault_view(self):
+        """Reload the list after a vault change, keeping DataGrip bookmarks in federated mode."""
+        if self.current_data_source == SOURCE_FEDERATED:
+            self.load_federated_sources(reload_datagrip=False)
+        else:
+            self.load_queries_from_vault()
+
     def load_queries_from_vault(self):
         """Load queries from the internal query vault."""
         self.query_vault.load_vault()
         self.bookmarks = self.query_vault.get_queries()
+        self.rebuild_search_index()
         self.update_bookmark_list()
         logging.info("Queries loaded from internal query vault.")
         self.setWindowTitle(f"{APP_NAME} - Internal Query Vault")
 
+    def load_sql_catalog(self, keep_list=False):
+        """Scan the SQL root directory in the background and show every .sql file under it.
+
+        Only files whose size or mtime changed since the last scan are read; when the
+        search index is cold (first load this session) every file is read, in parallel,
+        and the index is built on the pool thread too. With keep_list=True (a rescan)
+        the current list stays up until the scan is done; otherwise it is cleared.
+        """
+        self._catalog_scan_generation += 1
+        root = self.settings.get('sql_root_directory')
+        if not root or not os.path.isdir(root):
+            logging.warning(f"SQL catalog: root directory not set or missing: {root}")
+            self.bookmarks = []
+            self.rebuild_search_index()
+            self.update_bookmark_list()
+            self.update_bookmark_count()
+            return
+        if not keep_list:
+            self.bookmarks = []
+            self.rebuild_search_index()
+            self.update_bookmark_list()
+            self.update_bookmark_count()
+            self.no_bookmarks_label.setText("Scanning the SQL root directory...")
+            self.setWindowTitle(f"{APP_NAME} - SQL Catalog (scanning...)")
+        if self._catalog_scan_running:
+            # Scanning a copy of the old catalog would redo the running scan's reads
+            self._catalog_rescan_pending = True
+            return
+        self.start_sql_catalog_scan(root)
+
+    def start_sql_catalog_scan(self, root):
+        """Start a scan of a copy of the catalog on reload_pool."""
+        self._catalog_scan_running = True
+        self._catalog_rescan_pending = False
+        cold = not any(record.get('content_hash') for record in self.search_index.records.values())
+        split_dialect = self.settings.get('sql_dialect', 'generic') if self.settings.get('split_statements', False) else None
+        task = SQLCatalogScanTask(self.sql_catalog.copy(), root, cold, self._catalog_scan_generation,
+                                  split_dialect, dict(self.usage_counts.counts), self.sql_file_cache)
+        task.signals.scanned.connect(self.on_sql_catalog_scanned)
+        self.reload_pool.start(task)
+
+    @Slot(int, object)
+    def on_sql_catalog_scanned(self, generation, result):
+        """Swap in the scanned catalog and show its records."""
+        self._catalog_scan_running = False
+        if result is not None:
+            self.sql_catalog = result['catalog']
+        if self._catalog_rescan_pending:
+            self._catalog_rescan_pending = False
+            root = self.settings.get('sql_root_directory')
+            if self.current_data_source == SOURCE_CATALOG and root and os.path.isdir(root):
+                self.start_sql_catalog_scan(root)
+                return
+        if result is None or generation != self._catalog_scan_generation or self.current_data_source != SOURCE_CATALOG:
+            return # Failed, superseded by a newer scan, or the user moved to another source
+        records, texts_by_key = result['records'], result['texts']
+        self.bookmarks = records
+        if result['index'] is not None:
+            self.adopt_search_index(result['index'])
+        else:
+            self.rebuild_search_index(lambda record: texts_by_key.get(record_key(record)) or self.get_sql_content(record))
+        self.update_bookmark_list()
+        self.update_bookmark_count()
+        logging.info(f"SQL catalog scanned in {result['elapsed']:.2f}s: {len(records)} files "
+                     f"({len(result['added'])} added, {len(result['changed'])} changed, "
+                     f"{len(result['removed'])} removed, {len(texts_by_key)} read)")
+
+    @Slot()
+    def rescan_sql_catalog(self):
+        """Pick up added, changed and removed files under the SQL root."""
+        if self.current_data_source != SOURCE_CATALOG:
+            QMessageBox.information(self, "SQL Catalog", "Switch the data source to 'SQL Root Catalog' to browse every .sql file.")
+            return
+        self.load_sql_catalog(keep_list=True)
+
     def update_label_filter_dropdown(self):
         """Update the label filter dropdown with all available labels."""
         current_label = None
@@ -2393,27 +6658,6 @@ class FloatingBookmarksWindow(QMainWindow):
                     
             logging.debug(f"Updated label filter dropdown with {len(all_labels)} labels")
 
-    def apply_label_filter(self, bookmarks):
-        """Filter bookmarks by selected label."""
-        if not hasattr(self, 'label_filter_combo'):
-            return bookmarks
-            
-        selected_label = self.label_filter_combo.currentData()
-        
-        # If no label filter active, return all bookmarks
-        if selected_label is None:
-            return bookmarks
-            
-        # Filter by the selected label
-        filtered = []
-        for bm in bookmarks:
-            if isinstance(bm, dict) and 'labels' in bm and isinstance(bm['labels'], list):
-                if selected_label in bm['labels']:
-                    filtered.append(bm)
-        
-        logging.debug(f"Label filter '{selected_label}' active: {len(filtered)}/{len(bookmarks)} queries matching")
-        return filtered
-
     @Slot()
     def on_source_changed(self):
         """Handle data source change."""
@@ -2430,29 +6674,38 @@ class FloatingBookmarksWindow(QMainWindow):
         self.settings.set('data_source', new_source)
         self.current_data_source = new_source
         
+        federated = new_source == SOURCE_FEDERATED
+        self.source_view_label.setVisible(federated)
+        self.source_view_combo.setVisible(federated)
+        self.record_sources = {}
+        self._bookmarks_load_generation += 1 # Drop an XML parse still running for the old source
+
         # Load data from the appropriate source
-        if new_source == SOURCE_DATAGRIP:
+        if federated:
+            self.load_federated_sources(reload_datagrip=False)
+        elif new_source == SOURCE_DATAGRIP:
             # Load from DataGrip XML export
-            last_file = self.settings.get('loaded_copy_path')
-            if last_file and os.path.isfile(last_file):
-                self.load_bookmarks(last_file)
-            else:
-                # No file loaded yet
-                self.bookmarks = []
-                self.update_bookmark_list()
-                self.setWindowTitle(f"{APP_NAME} - DataGrip Mode (No File Loaded)")
+            self.load_datagrip_sources()
+        elif new_source == SOURCE_CATALOG:
+            self.load_sql_catalog()
         else:
             # Load from internal vault
             self.load_queries_from_vault()
             
         # Update UI
         self.update_label_filter_dropdown()
+        self.update_project_filter_dropdown()
+        self.update_bookmarks_file_watch()
         
-    def add_query_to_vault(self, title, sql_content, labels=None):
+    def add_query_to_vault(self, title, sql_content, labels=None, check_duplicates=True):
         """Add a new query to the internal vault."""
-        if self.current_data_source != SOURCE_INTERNAL:
+        if not self.vault_editable():
             logging.warning("Cannot add query to vault: current source is not Internal Query Vault")
             return False
+
+        if check_duplicates and not self.confirm_near_duplicate(title, sql_content):
+            logging.info(f"Add of '{title}' cancelled: near-duplicate already in vault")
+            return False
             
         # Create query data structure
         query_data = {
@@ -2466,15 +6719,16 @@ class FloatingBookmarksWindow(QMainWindow):
         if self.query_vault.add_query(query_data):
             # Save vault
             self.query_vault.save_vault()
+            self.index_vault_query(query_data)
             # Reload queries to refresh the list
-            self.load_queries_from_vault()
+            self.refresh_vault_view()
             logging.info(f"Added new query '{title}' to vault")
             return True
         return False
         
     def edit_query_in_vault(self, query_id, title=None, sql_content=None, labels=None):
         """Edit an existing query in the internal vault."""
-        if self.current_data_source != SOURCE_INTERNAL:
+        if not self.vault_editable():
             logging.warning("Cannot edit query in vault: current source is not Internal Query Vault")
             return False
             
@@ -2496,15 +6750,16 @@ class FloatingBookmarksWindow(QMainWindow):
         if self.query_vault.update_query(query_id, current_query):
             # Save vault
             self.query_vault.save_vault()
+            self.index_vault_query(current_query)
             # Reload queries to refresh the list
-            self.load_queries_from_vault()
+            self.refresh_vault_view()
             logging.info(f"Updated query with ID {query_id} in vault")
             return True
         return False
         
     def add_label_to_query_in_vault(self, query_id, label):
         """Add a label to a query in the internal vault."""
-        if self.current_data_source != SOURCE_INTERNAL:
+        if not self.vault_editable():
             logging.warning("Cannot add label: current source is not Internal Query Vault")
             return False
             
@@ -2512,14 +6767,14 @@ class FloatingBookmarksWindow(QMainWindow):
             # Save vault
             self.query_vault.save_vault()
             # Reload queries to refresh the list
-            self.load_queries_from_vault()
+            self.refresh_vault_view()
             logging.info(f"Added label '{label}' to query {query_id}")
             return True
         return False
         
     def remove_label_from_query_in_vault(self, query_id, label):
         """Remove a label from a query in the internal vault."""
-        if self.current_data_source != SOURCE_INTERNAL:
+        if not self.vault_editable():
             logging.warning("Cannot remove label: current source is not Internal Query Vault")
             return False
             
@@ -2527,27 +6782,28 @@ class FloatingBookmarksWindow(QMainWindow):
             # Save vault
             self.query_vault.save_vault()
             # Reload queries to refresh the list
-            self.load_queries_from_vault()
+            self.refresh_vault_view()
             logging.info(f"Removed label '{label}' from query {query_id}")
             return True
         return False
         
     def delete_query_from_vault(self, query_id):
         """Delete a query from the internal vault."""
-        if self.current_data_source != SOURCE_INTERNAL:
+        if not self.vault_editable():
             logging.warning("Cannot delete query: current source is not Internal Query Vault")
             return False
             
         if self.query_vault.delete_query(query_id):
             # Save vault
             self.query_vault.save_vault()
+            self.unindex_vault_query(query_id)
             # Reload queries to refresh the list
-            self.load_queries_from_vault()
+            self.refresh_vault_view()
             logging.info(f"Deleted query with ID {query_id} from vault")
             return True
         return False
         
-    def import_bookmark_to_vault(self, bookmark_data):
+    def import_bookmark_to_vault(self, bookmark_data, check_duplicates=True):
         """Import a DataGrip bookmark into the internal vault."""
         if not isinstance(bookmark_data, dict):
             logging.warning("Cannot import bookmark: invalid data format")
@@ -2558,6 +6814,10 @@ class FloatingBookmarksWindow(QMainWindow):
         if not sql_content:
             logging.warning(f"Cannot import bookmark '{bookmark_data.get('title', 'Untitled')}': failed to retrieve SQL content")
             return False
+
+        if check_duplicates and not self.confirm_near_duplicate(bookmark_data.get('title', 'Imported Query'), sql_content):
+            logging.info(f"Import of '{bookmark_data.get('title', 'Untitled')}' cancelled: near-duplicate already in vault")
+            return False
             
         # Create query data
         query_data = {
@@ -2571,12 +6831,74 @@ class FloatingBookmarksWindow(QMainWindow):
         if self.query_vault.add_query(query_data):
             # Save vault
             self.query_vault.save_vault()
+            self.index_vault_query(query_data)
             logging.info(f"Imported bookmark '{query_data['title']}' to vault")
             return True
         return False
 
-    def get_sql_content(self, bookmark_data, sql_root=None, user_home=None, pre_resolved_path=None):
-        """Get SQL content from a bookmark data dict, handling both DataGrip bookmarks and internal queries."""
+    def rebuild_vault_indexes(self):
+        """Index every vault query for near-duplicate lookups and recall (cached signatures are reused)."""
+        self.vault_duplicates.clear()
+        self.query_recall.clear()
+        for query in self.query_vault.queries:
+            if isinstance(query, dict) and query.get('id'):
+                self.vault_duplicates.add(query['id'], query.get('sql_content', ''))
+                self.query_recall.add(query['id'], query.get('title', ''), query.get('sql_content', ''))
+        self.signature_store.prune(self.vault_duplicates.digests.values())
+        self.signature_store.save()
+        logging.info(f"Vault indexes built: {len(self.vault_duplicates)} queries, "
+                     f"{self.signature_store.computed} signatures hashed, "
+                     f"{len(self.query_recall.vocabulary)} recall terms")
+
+    def index_vault_query(self, query_data):
+        """Re-index one vault query after it was added or edited."""
+        self.vault_duplicates.add(query_data['id'], query_data.get('sql_content', ''))
+        self.query_recall.add(query_data['id'], query_data.get('title', ''), query_data.get('sql_content', ''))
+        self.signature_store.save()
+
+    def unindex_vault_query(self, query_id):
+        self.vault_duplicates.remove(query_id)
+        self.query_recall.remove(query_id)
+
+    def duplicate_threshold(self):
+        try:
+            return min(1.0, max(0.0, float(self.settings.get('duplicate_threshold', 0.8))))
+        except (ValueError, TypeError):
+            return 0.8
+
+    def find_vault_near_duplicates(self, sql_content, exclude=None):
+        """Return [(query, similarity)] of vault queries that are near-copies of sql_content."""
+        matches = self.vault_duplicates.query(sql_content, self.duplicate_threshold(), exclude)
+        found = []
+        for query_id, similarity in matches:
+            query = self.query_vault.get_query_by_id(query_id)
+            if query is not None:
+                found.append((query, similarity))
+        return found
+
+    def confirm_near_duplicate(self, title, sql_content, exclude=None):
+        """Ask before adding SQL that nearly duplicates vault queries. Returns True to proceed."""
+        matches = self.find_vault_near_duplicates(sql_content, exclude)
+        if not matches:
+            return True
+        lines = [f"  • {query.get('title', 'Untitled')} ({similarity * 100:.0f}% similar)"
+                 for query, similarity in matches[:5]]
+        if len(matches) > 5:
+            lines.append(f"  … and {len(matches) - 5} more")
+        reply = QMessageBox.question(
+            self, "Possible Duplicate",
+            f"'{title}' looks like a near-copy of query(s) already in the vault:\n\n" + "\n".join(lines) +
+            "\n\nAdd it anyway?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+            QMessageBox.StandardButton.No)
+        return reply == QMessageBox.StandardButton.Yes
+
+    def get_sql_content(self, bookmark_data, sql_root=None, user_home=None, pre_resolved_path=None, whole_file=False):
+        """Get SQL content from a bookmark data dict, handling both DataGrip bookmarks and internal queries.
+
+        DataGrip bookmarks yield only the statement at the bookmarked line unless
+        whole_file is set or the 'bookmark_statement_only' setting is off.
+        """
         if not bookmark_data or not isinstance(bookmark_data, dict):
             return ""
             
@@ -2595,19 +6917,29 @@ class FloatingBookmarksWindow(QMainWindow):
         # Use provided user home or get from os.path
         home_dir = user_home if user_home else os.path.expanduser("~")
         
-        # If path already resolved (to avoid redundant work in multiple calls)
-        if pre_resolved_path and os.path.isfile(pre_resolved_path):
+        # Catalog records carry their absolute path; otherwise use a pre-resolved path if given
+        if bookmark_data.get('path'):
+            file_path = bookmark_data['path']
+        elif pre_resolved_path and os.path.isfile(pre_resolved_path):
             file_path = pre_resolved_path
         else:
             # Resolve the URL to a file path
             file_path = self.resolve_file_path(url, sql_root=sql_root_dir, user_home=home_dir)
             
         # Read and return file content if resolved successfully
-        if file_path and os.path.isfile(file_path):
+        if file_path:
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                return content
+                line = self.bookmark_line(bookmark_data)
+                if line and not whole_file and self.settings.get('bookmark_statement_only', True):
+                    statement = self.read_bookmark_statement(file_path, line)
+                    if statement:
+                        return statement
+                return self.sql_file_cache.read(file_path)
+            except FileNotFoundError:
+                # Deleted or moved since it was resolved; forget the stale resolution
+                self.invalidate_resolved_paths(os.path.dirname(file_path))
+                logging.warning(f"SQL file disappeared for bookmark '{bookmark_data.get('title', 'Untitled')}': {file_path}")
+                return "// File not found (check SQL root directory setting)"
             except Exception as e:
                 logging.error(f"Failed to read SQL file '{file_path}': {e}", exc_info=True)
                 return f"// Error reading file: {e}"
@@ -2615,9 +6947,26 @@ class FloatingBookmarksWindow(QMainWindow):
             logging.warning(f"SQL file not found for bookmark '{bookmark_data.get('title', 'Untitled')}': {file_path}")
             return "// File not found (check SQL root directory setting)"
 
+    @staticmethod
+    def bookmark_line(bookmark_data):
+        """Return the 1-based line of a DataGrip bookmark (stored 0-based), or None."""
+        try:
+            return int(bookmark_data.get('line', '')) + 1
+        except (TypeError, ValueError):
+            return None
+
+    def read_bookmark_statement(self, file_path, line):
+        """Return the text of the statement at line in file_path, cached alongside the file."""
+        window = max(1, int(self.settings.get('statement_window_lines', STATEMENT_WINDOW_LINES)))
+        dialect = self.settings.get('sql_dialect', 'generic')
+        def extract():
+            statement = extract_statement_at_line(file_path, line, window, dialect=dialect)
+            return statement[2] if statement else ''
+        return self.sql_file_cache.load((file_path, line, window, dialect), file_path, extract)
+
     def copy_current_query_to_clipboard(self):
         """Copy the currently selected query to clipboard."""
-        current_item = self.bookmark_list.currentItem()
+        current_item = self.bookmark_list.current_index()
         if current_item:
             self.handle_item_action(current_item)
         else:
@@ -2626,6 +6975,11 @@ class FloatingBookmarksWindow(QMainWindow):
     def close_app(self):
         """Close the application."""
         self.save_state()
+        self._cancel_background_search()
+        self.search_pool.waitForDone(2000)  # A finished task must not emit into a torn-down window
+        self.reload_pool.clear()  # Drop queued loads and scans; let a running one finish saving
+        self.reload_pool.waitForDone(5000)
+        self.search_engine.regex_searcher.shutdown()
         if self.tray_icon:
             self.tray_icon.hide()
         QApplication.instance().quit()
@@ -2641,9 +6995,13 @@ class FloatingBookmarksWindow(QMainWindow):
         self.copy_url_action_context = QAction("Copy File URL", self)
         self.copy_url_action_context.triggered.connect(self.copy_bookmark_url_from_context)
         
+        self.copy_file_action_context = QAction("Copy Whole File SQL", self)
+        self.copy_file_action_context.triggered.connect(self.copy_bookmark_file_from_context)
+        
         # Add basic copy actions first
         self.context_menu.addAction(self.copy_sql_action_context)
         self.context_menu.addAction(self.copy_url_action_context)
+        self.context_menu.addAction(self.copy_file_action_context)
         
         # Additional actions
         self.context_menu.addSeparator()
@@ -2875,6 +7233,10 @@ class FloatingBookmarksWindow(QMainWindow):
 
         title = data.get('title', 'Untitled')
         query_id = data.get('id')
+        if data.get('parent_id'):
+            QMessageBox.information(self, "Delete Query", "This row is one statement of a larger query. "
+                                    "Turn off View > Split Queries into Statements to delete the whole query.")
+            return
 
         reply = QMessageBox.question(
             self,
@@ -2886,8 +7248,8 @@ class FloatingBookmarksWindow(QMainWindow):
         if reply != QMessageBox.StandardButton.Yes:
             return
 
-        # Delete depending on current data source
-        if self.current_data_source == SOURCE_INTERNAL:
+        # Delete depending on the query's data source
+        if self.record_source(data) == SOURCE_INTERNAL:
             if query_id and self.delete_query_from_vault(query_id):
                 QMessageBox.information(self, "Delete", f"'{title}' has been deleted.")
             else:
@@ -2914,8 +7276,10 @@ class FloatingBookmarksWindow(QMainWindow):
             return
 
         title = data.get('title', 'Untitled')
-        if self.current_data_source == SOURCE_DATAGRIP:
+        if self.record_source(data) in (SOURCE_DATAGRIP, SOURCE_CATALOG):
             if self.import_bookmark_to_vault(data):
+                if self.current_data_source == SOURCE_FEDERATED:
+                    self.refresh_vault_view()
                 QMessageBox.information(self, "Import Successful", f"'{title}' has been imported to the Internal Query Vault.")
             else:
                 QMessageBox.warning(self, "Import Failed", "Failed to import the selected bookmark to the vault. Check logs for details.")
@@ -2923,6 +7287,430 @@ class FloatingBookmarksWindow(QMainWindow):
             QMessageBox.information(self, "Already in Vault", "The selected query is already in the Internal Query Vault.")
 
     def resolve_file_path(self, url_string, sql_root=None, user_home=None):
+        """Memoized _resolve_file_path_uncached; misses are not cached, so a file that appears later is found."""
+        if not url_string:
+            return None
+        sql_root_dir = sql_root if sql_root is not None else self.settings.get('sql_root_directory')
+        home_dir = user_home if user_home is not None else os.path.expanduser("~")
+        key = (url_string, sql_root_dir, home_dir)
+        resolved = self.resolved_paths.get(key)
+        if resolved is None:
+            resolved = self._resolve_file_path_uncached(url_string, sql_root_dir, home_dir)
+            if resolved:
+                self.resolved_paths.put(key, resolved)
+        return resolved
+
+    def resolve_bookmark_paths(self, bookmarks):
+        """Resolve every bookmark URL once (e.g. right after loading) and watch the directories involved."""
+        sql_root_dir = self.settings.get('sql_root_directory')
+        home_dir = os.path.expanduser("~")
+        directories = set()
+        misses = 0
+        for url in {bm.get('url') for bm in bookmarks if isinstance(bm, dict) and bm.get('url')}:
+            path = self.resolve_file_path(url, sql_root=sql_root_dir, user_home=home_dir)
+            if path:
+                directories.add(os.path.dirname(path))
+            else:
+                misses += 1
+        if sql_root_dir and os.path.isdir(sql_root_dir):
+            directories.add(sql_root_dir)
+        self.watch_sql_directories(directories)
+        logging.info(f"Resolved {len(self.resolved_paths)} bookmark paths ({misses} not found), "
+                     f"watching {len(self.path_watcher.directories())} directories")
+
+    # --- Multiple Bookmark Sources ---
+    def extra_bookmark_source_paths(self):
+        """Return the configured and discovered bookmark XMLs other than the opened file."""
+        paths = list(self.settings.get('bookmark_sources', []) or [])
+        if self.settings.get('auto_discover_bookmarks', False):
+            paths.extend(discover_workspace_xmls())
+        primary = {os.path.normcase(os.path.abspath(p)) for p in
+                   (self.settings.get('last_file_path'), self.settings.get('loaded_copy_path')) if p}
+        extra, seen = [], set(primary)
+        for path in paths:
+            norm = os.path.normcase(os.path.abspath(path))
+            if norm not in seen and os.path.isfile(path):
+                seen.add(norm)
+                extra.append(path)
+        return extra
+
+    def load_extra_bookmark_sources(self):
+        """Re-parse the extra bookmark sources in the background; they are merged in when done.
+
+        Until then the last parsed sources stay in self.extra_source_records.
+        """
+        paths = self.extra_bookmark_source_paths()
+        self._extra_sources_generation += 1
+        if not paths:
+            self.extra_source_records = []
+            return
+        task = BookmarkSourcesTask(paths, self._extra_sources_generation)
+        task.signals.parsed.connect(self.on_extra_sources_parsed)
+        self.reload_pool.start(task)
+
+    @Slot(int, object)
+    def on_extra_sources_parsed(self, generation, results):
+        """Store the parsed extra sources and merge them into the DataGrip records on screen."""
+        if generation != self._extra_sources_generation:
+            return # A newer parse is on its way
+        self.extra_source_records = []
+        for path, bookmarks, error in results:
+            if error:
+                logging.warning(f"Skipping bookmark source '{path}': {error}")
+                continue
+            self.extra_source_records.append((bookmark_source_project(path), bookmarks))
+        logging.info(f"Parsed {len(results)} extra bookmark sources "
+                     f"({sum(len(b) for _, b in self.extra_source_records)} bookmarks)")
+        if self.current_data_source not in (SOURCE_DATAGRIP, SOURCE_FEDERATED):
+            return
+        changes = self.merge_datagrip_bookmarks(self.primary_bookmarks)
+        if changes:
+            added, removed, changed = changes
+            logging.info(f"Extra bookmark sources merged: {len(added)} added, {len(removed)} removed, "
+                         f"{len(changed)} changed")
+        if self.current_data_source == SOURCE_DATAGRIP and not self.primary_bookmarks and self.datagrip_records:
+            self.setWindowTitle(f"{APP_NAME} - DataGrip Mode ({len(self.extra_source_records)} sources)")
+
+    def with_bookmark_sources(self, primary, reload_extra=False):
+        """Merge the opened file's bookmarks with the extra sources, tagging each with its project.
+
+        With reload_extra=True the extra sources are re-parsed in the background and merged in later.
+        """
+        self.primary_bookmarks = primary
+        if reload_extra:
+            self.load_extra_bookmark_sources()
+        primary_path = self.settings.get('last_file_path') or self.settings.get('loaded_copy_path') or ''
+        project = bookmark_source_project(primary_path) if primary_path else "DataGrip"
+        return merge_bookmark_sources([(project, primary)] + self.extra_source_records)
+
+    def load_datagrip_sources(self):
+        """Load DataGrip mode from the opened XML copy, or from the extra sources alone."""
+        last_file = self.settings.get('loaded_copy_path')
+        if last_file and os.path.isfile(last_file):
+            self.load_bookmarks(last_file)
+            return
+        records = self.with_bookmark_sources([], reload_extra=True)
+        self.resolve_bookmark_paths(records)
+        for bm in records:
+            bm['count'] = self.usage_counts.get_count(bm['id'])
+        self.datagrip_records = records
+        self.bookmarks = records
+        self.update_project_filter_dropdown()
+        self.rebuild_search_index()
+        self.update_bookmark_list()
+        self.update_bookmark_count()
+        if records:
+            self.setWindowTitle(f"{APP_NAME} - DataGrip Mode ({len(self.extra_source_records)} sources)")
+        else:
+            # No file loaded yet
+            self.setWindowTitle(f"{APP_NAME} - DataGrip Mode (No File Loaded)")
+
+    def update_project_filter_dropdown(self):
+        """List the projects of the loaded DataGrip bookmarks; hidden unless there are several."""
+        current_project = self.project_filter_combo.currentData()
+        projects = sorted({bm.get('project') for bm in self.datagrip_records if isinstance(bm, dict) and bm.get('project')})
+        show = len(projects) > 1 and self.current_data_source in (SOURCE_DATAGRIP, SOURCE_FEDERATED)
+        self.project_filter_combo.blockSignals(True)
+        try:
+            self.project_filter_combo.clear()
+            self.project_filter_combo.addItem("All Projects", None)
+            if show:
+                for project in projects:
+                    self.project_filter_combo.addItem(project, project)
+                index = self.project_filter_combo.findData(current_project) if current_project else 0
+                self.project_filter_combo.setCurrentIndex(max(0, index))
+        finally:
+            self.project_filter_combo.blockSignals(False)
+        self.project_filter_label.setVisible(show)
+        self.project_filter_combo.setVisible(show)
+
+    @Slot()
+    def show_bookmark_sources_dialog(self):
+        """Edit the extra DataGrip XML files merged with the opened one."""
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"{APP_NAME} - Bookmark Sources")
+        dialog.resize(560, 360)
+        layout = QVBoxLayout(dialog)
+        layout.addWidget(QLabel("Extra bookmark XML files (merged with the opened file, duplicates removed):"))
+        source_list = QListWidget()
+        source_list.addItems(self.settings.get('bookmark_sources', []) or [])
+        layout.addWidget(source_list)
+
+        buttons_row = QHBoxLayout()
+        add_button = QPushButton("Add...")
+        remove_button = QPushButton("Remove")
+        buttons_row.addWidget(add_button)
+        buttons_row.addWidget(remove_button)
+        buttons_row.addStretch(1)
+        layout.addLayout(buttons_row)
+
+        def add_sources():
+            paths, _ = QFileDialog.getOpenFileNames(dialog, "Add Bookmark Sources", os.path.expanduser("~"),
+                                                    "XML Files (*.xml);;All Files (*)")
+            existing = {source_list.item(i).text() for i in range(source_list.count())}
+            source_list.addItems([path for path in paths if path not in existing])
+
+        def remove_source():
+            for item in source_list.selectedItems():
+                source_list.takeItem(source_list.row(item))
+
+        add_button.clicked.connect(add_sources)
+        remove_button.clicked.connect(remove_source)
+
+        discover_checkbox = QCheckBox("Auto-discover DataGrip workspace files")
+        discover_checkbox.setChecked(bool(self.settings.get('auto_discover_bookmarks', False)))
+        discovered = discover_workspace_xmls()
+        discover_checkbox.setToolTip("\n".join(discovered) or "No workspace files found in the JetBrains config directories.")
+        layout.addWidget(discover_checkbox)
+        layout.addWidget(QLabel(f"{len(discovered)} workspace files found."))
+
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok | QDialogButtonBox.StandardButton.Cancel)
+        button_box.accepted.connect(dialog.accept)
+        button_box.rejected.connect(dialog.reject)
+        layout.addWidget(button_box)
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+
+        self.settings.set('bookmark_sources', [source_list.item(i).text() for i in range(source_list.count())])
+        self.settings.set('auto_discover_bookmarks', discover_checkbox.isChecked())
+        if self.current_data_source == SOURCE_FEDERATED:
+            self.load_federated_sources()
+        elif self.current_data_source == SOURCE_DATAGRIP:
+            self.load_datagrip_sources()
+
+    # --- Bookmarks File Watching ---
+    @Slot(bool)
+    def toggle_bookmarks_file_watch(self, checked):
+        """Turn the watch on the original DataGrip XML file on or off."""
+        self.settings.set('watch_bookmarks_file', checked)
+        self.update_bookmarks_file_watch()
+
+    def update_bookmarks_file_watch(self):
+        """Watch last_file_path while the setting is on and DataGrip bookmarks are shown."""
+        watched = self.bookmarks_file_watcher.files()
+        if watched:
+            self.bookmarks_file_watcher.removePaths(watched)
+        source_path = self.settings.get('last_file_path')
+        if (self.settings.get('watch_bookmarks_file', False)
+                and self.current_data_source in (SOURCE_DATAGRIP, SOURCE_FEDERATED)
+                and source_path and os.path.isfile(source_path)):
+            self.bookmarks_file_watcher.addPath(source_path)
+            logging.info(f"Watching bookmarks file for changes: {source_path}")
+
+    @Slot(str)
+    def on_bookmarks_file_changed(self, path):
+        """Debounce change notifications for the watched XML file."""
+        # Editors that save by replace drop the path from the watcher; re-add it
+        if os.path.isfile(path) and path not in self.bookmarks_file_watcher.files():
+            self.bookmarks_file_watcher.addPath(path)
+        self.bookmarks_reload_timer.start()
+
+    @Slot()
+    def start_bookmarks_reload(self):
+        """Re-parse the watched XML file in the background."""
+        source_path = self.settings.get('last_file_path')
+        if not source_path or not os.path.isfile(source_path):
+            return
+        self._bookmarks_reload_generation += 1
+        copy_path = self.settings.get('loaded_copy_path')
+        task = BookmarksReloadTask(source_path, copy_path, self._bookmarks_reload_generation)
+        task.signals.parsed.connect(self.on_bookmarks_reloaded)
+        self.reload_pool.start(task)
+
+    @Slot(int, object)
+    def on_bookmarks_reloaded(self, generation, bookmarks):
+        """Merge a re-parsed bookmark list into the current one, touching only rows that changed."""
+        if generation != self._bookmarks_reload_generation:
+            return # A newer reload is on its way
+        if self.current_data_source not in (SOURCE_DATAGRIP, SOURCE_FEDERATED):
+            return
+        changes = self.merge_datagrip_bookmarks(bookmarks)
+        if not changes:
+            logging.debug("Watched bookmarks file changed but no bookmarks differ.")
+            return
+        added, removed, changed = changes
+        logging.info(f"Bookmarks file reloaded: {len(added)} added, {len(removed)} removed, {len(changed)} changed")
+
+    def merge_datagrip_bookmarks(self, primary):
+        """Merge primary bookmarks plus the extra sources into the current ones, touching only rows that changed.
+
+        Returns the (added, removed, changed) id sets, or None when nothing differs.
+        """
+        bookmarks = self.with_bookmark_sources(primary)
+        added, removed, changed = diff_bookmarks(self.datagrip_records, bookmarks)
+        if not (added or removed or changed):
+            return None
+
+        # Reuse unchanged record objects so their identity (and index entries) carry over
+        current = {bm['id']: bm for bm in self.datagrip_records if isinstance(bm, dict) and 'id' in bm}
+        merged = []
+        fresh = []
+        for bm in bookmarks:
+            if bm['id'] in added or bm['id'] in changed or bm['id'] not in current:
+                bm['count'] = self.usage_counts.get_count(bm['id'])
+                fresh.append(bm)
+                merged.append(bm)
+            else:
+                merged.append(current[bm['id']])
+        self.resolve_bookmark_paths(fresh)
+        self.datagrip_records = merged
+
+        if self.current_data_source == SOURCE_FEDERATED:
+            for bid in removed:
+                self.record_sources.pop(bid, None)
+            self.record_sources.update({bm['id']: SOURCE_DATAGRIP for bm in fresh})
+            vault_records = [bm for bm in self.bookmarks
+                             if self.record_sources.get(record_key(bm)) == SOURCE_INTERNAL]
+            self.bookmarks = merged + vault_records
+        else:
+            self.bookmarks = merged
+        self.rebuild_search_index()
+        self.update_project_filter_dropdown()
+        self.apply_list_changes()
+        self.update_bookmark_count()
+        return added, removed, changed
+
+    def apply_list_changes(self):
+        """Bring the list in line with the current search results, keeping the current row and scroll position.
+
+        The search runs on the search pool; show_list_changes() applies its results.
+        """
+        self.start_background_search(keep_position=True)
+
+    def show_list_changes(self, results):
+        """Show refreshed search results in place.
+
+        Unlike display_search_results this leaves the "no results" label, window title
+        and preview highlighting alone; it is meant for background refreshes.
+        """
+        if not results or not self.sorted_bookmarks_cache or self.bookmark_list.count() == 0:
+            self.display_search_results(results, self.search_box.text())
+            return
+
+        scroll_value = self.bookmark_list.verticalScrollBar().value()
+        loaded = self.bookmark_model.rowCount()
+        current_key = self.current_record_key()
+        self.sorted_bookmarks_cache = results
+        self.set_list_records(results)
+        self.bookmark_model.ensure_loaded(loaded - 1)  # As many pages as before, so the scroll position exists
+        if current_key is not None:
+            row = self.bookmark_model.row_of(current_key)
+            if row >= 0:
+                self.bookmark_model.ensure_loaded(row)
+                self.bookmark_list.selectionModel().setCurrentIndex(
+                    self.bookmark_model.index(row, 0), QItemSelectionModel.SelectionFlag.ClearAndSelect)
+        self.bookmark_list.verticalScrollBar().setValue(scroll_value)
+
+    def record_file_path(self, record):
+        """Return the file a bookmark or catalog record points at, or None."""
+        if record.get('path'):
+            return record['path']
+        if not record.get('url'):
+            return None
+        return self.resolve_file_path(record['url'], sql_root=self.settings.get('sql_root_directory'),
+                                      user_home=os.path.expanduser("~"))
+
+    # --- SQL File Watching ---
+    def update_sql_file_watch(self):
+        """Watch exactly the files the loaded DataGrip bookmarks resolve to."""
+        wanted = set()
+        if self.current_data_source in (SOURCE_DATAGRIP, SOURCE_FEDERATED):
+            for record in self.datagrip_records:
+                if isinstance(record, dict):
+                    path = self.record_file_path(record)
+                    if path:
+                        wanted.add(path)
+        watched = set(self.sql_file_watcher.files())
+        if watched - wanted:
+            self.sql_file_watcher.removePaths(sorted(watched - wanted))
+        if wanted - watched:
+            self.sql_file_watcher.addPaths(sorted(wanted - watched))
+        logging.debug(f"Watching {len(wanted)} referenced SQL files")
+
+    @Slot(str)
+    def on_sql_file_changed(self, path):
+        """Queue a changed SQL file; the batch is applied once saves settle."""
+        self.pending_sql_changes.add(path)
+        self.sql_change_timer.start()
+
+    @Slot()
+    def apply_sql_file_changes(self):
+        """Re-read the changed SQL files in the background; on_sql_file_changes_applied refreshes what depends on them."""
+        paths, self.pending_sql_changes = self.pending_sql_changes, set()
+        for path in paths:
+            self.sql_file_cache.invalidate(path)
+            # Editors that save by replace drop the path from the watcher; re-add it
+            if os.path.isfile(path) and path not in self.sql_file_watcher.files():
+                self.sql_file_watcher.addPath(path)
+
+        self._sql_change_generation += 1
+        if self.settings.get('split_statements', False):
+            # Statement rows of a file come and go with its content; sync re-indexes just those
+            records = [record for record in self.indexed_bookmarks or [] if isinstance(record, dict)]
+            split_dialect = self.settings.get('sql_dialect', 'generic')
+            sources = dict(self.record_sources) if self.current_data_source == SOURCE_FEDERATED else None
+        else:
+            records = [record for record in self.bookmarks
+                       if isinstance(record, dict) and not record.get('sql_content') and self.record_file_path(record) in paths]
+            split_dialect, sources = None, None
+        task = SQLFileChangeTask(paths, self.search_index, self.search_index.source, records, self.get_sql_content,
+                                 self._sql_change_generation, split_dialect, dict(self.usage_counts.counts), sources)
+        task.signals.applied.connect(self.on_sql_file_changes_applied)
+        self.reload_pool.start(task)
+
+    @Slot(int, object)
+    def on_sql_file_changes_applied(self, generation, result):
+        """Refresh saved searches, the list and the preview after changed files were re-indexed."""
+        paths, delta = result['paths'], result['delta']
+        if result['applied']:
+            if result['sources'] is not None:
+                self.record_sources.update(result['sources'])
+            if delta is None or delta[0] or delta[1]:
+                self.search_index_changed(delta)
+            logging.info(f"Referenced SQL files changed: {len(paths)} files"
+                         + ("" if delta is None else f", {len(delta[0])} records re-indexed"))
+        if generation != self._sql_change_generation:
+            return # A newer batch of changes is on its way
+        if self.search_box.text().strip() or self.settings.get('split_statements', False):
+            self.apply_list_changes()
+        self.refresh_preview_if_affected(paths)
+
+    def refresh_preview_if_affected(self, paths):
+        """Reload the preview if it shows one of paths, keeping the scroll position."""
+        item = self.bookmark_list.current_index()
+        data = item.data(Qt.ItemDataRole.UserRole) if item else None
+        if not isinstance(data, dict) or self.record_file_path(data) not in paths:
+            return
+        if self.edit_toggle_checkbox.isChecked():
+            logging.info("Preview is editable; not replacing it with the changed file")
+            return
+        first_visible = self.preview_pane.firstVisibleLine()
+        large = self.large_preview is not None
+        self.update_preview_pane(item)
+        if not large and self.large_preview is None:
+            self.preview_pane.setFirstVisibleLine(first_visible)
+
+    def watch_sql_directories(self, directories):
+        new_dirs = sorted(set(directories) - set(self.path_watcher.directories()))
+        if new_dirs:
+            self.path_watcher.addPaths(new_dirs)
+
+    def invalidate_resolved_paths(self, directory=None):
+        """Drop cached resolutions under directory, or everything if directory is None."""
+        if directory is None:
+            self.resolved_paths.clear()
+            return
+        prefix = os.path.join(os.path.normpath(directory), '')
+        stale = {key for key, path in self.resolved_paths.items() if path.startswith(prefix)}
+        self.resolved_paths.discard(stale.__contains__)
+        logging.debug(f"Dropped {len(stale)} cached path resolutions for {directory}")
+
+    @Slot(str)
+    def on_sql_directory_changed(self, directory):
+        """A watched SQL directory changed: files may have appeared, moved or disappeared."""
+        self.invalidate_resolved_paths(directory)
+
+    def _resolve_file_path_uncached(self, url_string, sql_root=None, user_home=None):
         """Resolve JetBrains-style URL placeholders and return a valid file path if it exists.
 
         Parameters
@@ -2981,10 +7769,194 @@ class FloatingBookmarksWindow(QMainWindow):
         current_root = self.settings.get('sql_root_directory', os.path.expanduser("~"))
         dir_path = QFileDialog.getExistingDirectory(self, "Select SQL Root Directory", current_root)
         if dir_path:
+            root_changed = dir_path != self.settings.get('sql_root_directory')
             self.settings.set('sql_root_directory', dir_path)
+            if root_changed:
+                # $PROJECT_DIR$ now points elsewhere: re-resolve and re-index what changed
+                self.invalidate_resolved_paths()
+                if self.current_data_source == SOURCE_CATALOG:
+                    self.load_sql_catalog()
+                elif self.datagrip_records:
+                    self.resolve_bookmark_paths(self.datagrip_records)
+                    self.rebuild_search_index()
+                    self.update_bookmark_list()
             QMessageBox.information(self, "SQL Root Directory Set", f"Queries will resolve $PROJECT_DIR$ to:\n{dir_path}")
             logging.info(f"SQL root directory updated to: {dir_path}")
 
+    @Slot()
+    def show_search_plan(self):
+        """Show the execution plan of the current boolean search with per-operator timings."""
+        search_term = self.search_box.text()
+        if self.search_regex_checkbox.isChecked() or not is_boolean_query(search_term):
+            QMessageBox.information(
+                self, "Explain Search Plan",
+                "The current search is not a boolean query.\n\n"
+                "Use AND / OR / NOT (upper-case), parentheses, -word and label:, title:, sql:, id:, "
+                "table:, column:, join: qualifiers, e.g.\n"
+                "orders AND (refund OR chargeback) NOT test label:Final title:monthly")
+            return
+        self._ensure_search_index()
+        plan = self.search_engine.last_plan
+        if plan is None or plan.text != search_term:
+            # Results may have come from the result cache; run the plan now to get timings
+            self.search_engine.boolean_filter(self.current_search_params())
+            plan = self.search_engine.last_plan
+        if plan is None or plan.text != search_term:
+            QMessageBox.warning(self, "Explain Search Plan", self.search_engine.query_error or "No plan available.")
+            return
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"{APP_NAME} - Search Plan")
+        dialog.setMinimumSize(600, 350)
+        layout = QVBoxLayout(dialog)
+        text_edit = QTextEdit()
+        text_edit.setPlainText(plan.explain())
+        text_edit.setReadOnly(True)
+        text_edit.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        layout.addWidget(text_edit)
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Ok)
+        button_box.accepted.connect(dialog.accept)
+        layout.addWidget(button_box)
+        dialog.exec()
+
+    @Slot()
+    def show_duplicate_queries(self):
+        """Show groups of near-duplicate vault queries above the 'duplicate_threshold' similarity."""
+        threshold = self.duplicate_threshold()
+        groups = self.vault_duplicates.groups(threshold)
+        if not groups:
+            QMessageBox.information(self, "Find Duplicate Queries",
+                                    f"No vault queries are at least {threshold * 100:.0f}% similar to each other.")
+            return
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"{APP_NAME} - Duplicate Queries")
+        dialog.setMinimumSize(600, 400)
+        layout = QVBoxLayout(dialog)
+        layout.addWidget(QLabel(f"{len(groups)} group(s) of queries at least {threshold * 100:.0f}% similar. "
+                                "Double-click a query to select it."))
+        group_list = QListWidget()
+        for number, (query_ids, similarity) in enumerate(groups, 1):
+            header = QListWidgetItem(f"Group {number}: {len(query_ids)} queries (≥ {similarity * 100:.0f}% similar)")
+            header.setFlags(Qt.ItemFlag.NoItemFlags)
+            group_list.addItem(header)
+            for query_id in query_ids:
+                query = self.query_vault.get_query_by_id(query_id) or {}
+                item = QListWidgetItem(f"    {query.get('title', 'Untitled')}")
+                item.setData(Qt.ItemDataRole.UserRole, query_id)
+                group_list.addItem(item)
+        group_list.itemDoubleClicked.connect(
+            lambda item: self.select_query_by_id(item.data(Qt.ItemDataRole.UserRole)))
+        layout.addWidget(group_list)
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        button_box.rejected.connect(dialog.reject)
+        layout.addWidget(button_box)
+        dialog.exec()
+
+    @Slot()
+    def show_query_recall(self):
+        """Find the vault queries most similar to a pasted SQL snippet or a short phrase."""
+        dialog = QDialog(self)
+        dialog.setWindowTitle(f"{APP_NAME} - Recall Similar Queries")
+        dialog.setMinimumSize(600, 450)
+        layout = QVBoxLayout(dialog)
+        layout.addWidget(QLabel("Paste SQL or describe the query (e.g. 'monthly claims by member'):"))
+        input_edit = QTextEdit()
+        input_edit.setAcceptRichText(False)
+        input_edit.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+        layout.addWidget(input_edit, 1)
+        find_button = QPushButton("Find Similar")
+        layout.addWidget(find_button)
+        result_list = QListWidget()
+        layout.addWidget(result_list, 2)
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        button_box.rejected.connect(dialog.reject)
+        layout.addWidget(button_box)
+
+        def run_recall():
+            result_list.clear()
+            text = input_edit.toPlainText()
+            if not text.strip():
+                return
+            try:
+                k = max(1, int(self.settings.get('recall_top_k', 10)))
+            except (ValueError, TypeError):
+                k = 10
+            matches = self.query_recall.top_k(text, k)
+            logging.info(f"Query recall: {len(matches)} matches for {len(text)} chars of input")
+            if not matches:
+                result_list.addItem("No similar queries in the vault.")
+                return
+            for query_id, score in matches:
+                query = self.query_vault.get_query_by_id(query_id) or {}
+                item = QListWidgetItem(f"{score * 100:5.1f}%  {query.get('title', 'Untitled')}")
+                item.setData(Qt.ItemDataRole.UserRole, query_id)
+                result_list.addItem(item)
+
+        find_button.clicked.connect(run_recall)
+        result_list.itemDoubleClicked.connect(
+            lambda item: self.select_query_by_id(item.data(Qt.ItemDataRole.UserRole)))
+        dialog.exec()
+
+    def select_query_by_id(self, query_id):
+        """Select the list row of a vault query, switching to the vault and clearing filters if needed."""
+        if not query_id:
+            return
+        if self.current_data_source != SOURCE_INTERNAL:
+            self.source_combo.setCurrentIndex(self.source_combo.findData(SOURCE_INTERNAL))
+        if self._search_cancel_event is None and self._select_row_with_id(query_id):
+            return
+        # Select it once the list is current; select_pending_record() clears filters hiding it
+        self._pending_select_key = query_id
+        if self._search_cancel_event is None:
+            self.select_pending_record()
+
+    def select_pending_record(self):
+        """Select the record queued by select_query_by_id/update_bookmark_list, clearing filters that hide it."""
+        key = self._pending_select_key
+        if self._select_row_with_id(key):
+            self._pending_select_key = None
+            return
+        if not self.search_box.text() and self.label_filter_combo.currentIndex() <= 0:
+            self._pending_select_key = None  # Not in this data source at all
+            return
+        # Hidden by the current search/label filter
+        self.search_box.blockSignals(True)
+        self.search_box.clear()
+        self.search_box.blockSignals(False)
+        self.label_filter_combo.blockSignals(True)
+        self.label_filter_combo.setCurrentIndex(0)
+        self.label_filter_combo.blockSignals(False)
+        self.update_bookmark_list(select_key=key)
+
+    def _select_row_with_id(self, record_id):
+        return self.bookmark_list.select_key(record_id)
+
+    @Slot()
+    def show_search_stats(self):
+        """Show search result-cache counters (for tuning 'search_cache_size')."""
+        stats = self.search_engine.cache_stats()
+        lines = [
+            f"Cached result lists: {stats['entries']} / {stats['max_entries']}",
+            f"Hits: {stats['hits']}",
+            f"Misses: {stats['misses']}",
+            f"Evictions: {stats['evictions']}",
+            f"Hit rate: {stats['hit_rate'] * 100:.1f}%",
+            f"Refinement stack depth: {stats['refine_depth']}",
+            f"Index generation: {stats['generation']}",
+        ]
+        file_stats = self.sql_file_cache.stats()
+        lines += [
+            "",
+            f"SQL file cache: {file_stats['entries']} entries, "
+            f"{file_stats['bytes'] / 1048576:.1f} / {file_stats['max_bytes'] / 1048576:.0f} MB",
+            f"File hits: {file_stats['hits']}, misses: {file_stats['misses']} "
+            f"({file_stats['hit_rate'] * 100:.1f}% hit rate)",
+            f"Evictions: {file_stats['evictions']}, changed on disk: {file_stats['invalidations']}",
+        ]
+        logging.info(f"Search cache stats: {stats}; SQL file cache: {file_stats}")
+        QMessageBox.information(self, "Search Statistics", "\n".join(lines))
+
     @Slot()
     def show_about_dialog(self):
         """Display an About dialog with basic app information."""
@@ -3029,6 +8001,7 @@ class FloatingBookmarksWindow(QMainWindow):
 if __name__ == "__main__":
     import sys
     from PyQt5.QtWidgets import QApplication
+    multiprocessing.freeze_support() # Regex search pool workers in frozen builds
 
     app = QApplication(sys.argv)
     viewer = FloatingBookmarksWindow(AppSettings(), UsageCounts())
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# dgbookmarksviewer creates its data folders and log file on import; keep them out of the real profile
+_HOME = tempfile.mkdtemp(prefix='dqv-tests-')
+os.environ['HOME'] = _HOME
+os.environ['XDG_DATA_HOME'] = os.path.join(_HOME, '.local', 'share')
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+import dgbookmarksviewer as dqv
+
+
+def bookmark_state(url, line, description):
+    return (f'<BookmarkState><attributes><entry key="url" value="{url}" /><entry key="line" value="{line}" />'
+            f'</attributes><option name="description" value="{description}" /></BookmarkState>')
+
+
+def write_workspace(path, manager_states, outside_states=()):
+    path.write_text(
+        '<project version="4">'
+        f'<component name="Other">{"".join(outside_states)}</component>'
+        + (f'<component name="BookmarkManager"><option name="groups"><list>{"".join(manager_states)}'
+           '</list></option></component>' if manager_states is not None else '')
+        + '</project>', encoding='utf-8')
+    return str(path)
+
+
+# --- iter_bookmarks_xml ---
+def test_iter_bookmarks_xml_reads_manager_states_only(tmp_path):
+    path = write_workspace(tmp_path / 'workspace.xml',
+                           [bookmark_state('file:///q/a.sql', 3, 'Monthly claims'),
+                            bookmark_state('file:///q/b.sql', 7, '')],  # Incomplete: skipped
+                           [bookmark_state('file:///q/c.sql', 1, 'Elsewhere')])
+    bookmarks = list(dqv.iter_bookmarks_xml(path))
+    assert [bm['title'] for bm in bookmarks] == ['Monthly claims']
+    assert bookmarks[0]['id'] == 'file:///q/a.sql|3'
+
+
+def test_iter_bookmarks_xml_falls_back_without_manager(tmp_path):
+    path = write_workspace(tmp_path / 'workspace.xml', None, [bookmark_state('file:///q/c.sql', 1, 'Elsewhere')])
+    assert [bm['title'] for bm in dqv.iter_bookmarks_xml(path)] == ['Elsewhere']
+
+
+def test_parse_bookmarks_xml_streams_batches_and_raises_parse_errors(tmp_path):
+    path = write_workspace(tmp_path / 'workspace.xml',
+                           [bookmark_state(f'file:///q/{i}.sql', i, f'Query {i}') for i in range(5)])
+    batches = []
+    bookmarks = dqv.parse_bookmarks_xml(path, on_batch=batches.append, batch_size=2)
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert sum(batches, []) == bookmarks
+    broken = tmp_path / 'broken.xml'
+    broken.write_text('<project><component', encoding='utf-8')
+    with pytest.raises(dqv.ET.ParseError):
+        dqv.parse_bookmarks_xml(str(broken))
+
+
+# --- diff_bookmarks ---
+def test_diff_bookmarks():
+    old = [{'id': 'a', 'title': 'A'}, {'id': 'b', 'title': 'B'}, {'id': 'c', 'title': 'C', 'count': 1}]
+    new = [{'id': 'b', 'title': 'B2'}, {'id': 'c', 'title': 'C', 'count': 9}, {'id': 'd', 'title': 'D'}]
+    # Usage counts are not part of BOOKMARK_DIFF_FIELDS, so 'c' is unchanged
+    assert dqv.diff_bookmarks(old, new) == ({'d'}, {'a'}, {'b'})
+
+
+# --- copy_if_changed ---
+def test_copy_if_changed(tmp_path):
+    source = tmp_path / 'source.xml'
+    destination = tmp_path / 'backup' / 'dest.xml'
+    source.write_text('one', encoding='utf-8')
+    assert dqv.copy_if_changed(str(source), str(destination))
+    assert not dqv.copy_if_changed(str(source), str(destination))
+    # Same content with a new mtime is detected by hash and not copied
+    os.utime(source, ns=(0, 10 ** 18))
+    assert not dqv.copy_if_changed(str(source), str(destination))
+    assert os.stat(destination).st_mtime_ns == os.stat(source).st_mtime_ns
+    source.write_text('two', encoding='utf-8')
+    os.utime(source, ns=(0, 2 * 10 ** 18))
+    assert dqv.copy_if_changed(str(source), str(destination))
+    assert destination.read_text(encoding='utf-8') == 'two'
+
+
+# --- SQLCatalog ---
+def test_sql_catalog_scan_is_incremental(tmp_path):
+    root = tmp_path / 'sql'
+    (root / 'reports').mkdir(parents=True)
+    (root / '.git').mkdir()
+    (root / 'b.sql').write_text('select 2;', encoding='utf-8')
+    (root / 'reports' / 'a.sql').write_text('select 1;', encoding='utf-8')
+    (root / '.git' / 'hidden.sql').write_text('select 0;', encoding='utf-8')
+    (root / 'notes.txt').write_text('not sql', encoding='utf-8')
+    manifest = str(tmp_path / 'catalog.json')
+
+    catalog = dqv.SQLCatalog(manifest)
+    added, changed, removed, texts = catalog.scan(str(root))
+    rel_a = os.path.join('reports', 'a.sql')
+    assert sorted(added) == ['b.sql', rel_a] and changed == [] and removed == []
+    assert texts == {'b.sql': 'select 2;', rel_a: 'select 1;'}
+    assert [record['title'] for record in catalog.get_records()] == ['b.sql', 'reports/a.sql']
+    catalog.save()
+
+    reloaded = dqv.SQLCatalog(manifest)
+    (root / 'b.sql').write_text('select 22;', encoding='utf-8')
+    os.remove(root / 'reports' / 'a.sql')
+    added, changed, removed, texts = reloaded.scan(str(root))
+    assert (added, changed, removed) == ([], ['b.sql'], [rel_a])
+    assert list(texts) == ['b.sql']  # Unchanged files are not read again
+    assert [record['title'] for record in reloaded.get_records()] == ['b.sql']
+
+
+def test_sql_catalog_copy_is_independent(tmp_path):
+    root = tmp_path / 'sql'
+    root.mkdir()
+    (root / 'a.sql').write_text('select 1;', encoding='utf-8')
+    catalog = dqv.SQLCatalog(str(tmp_path / 'catalog.json'))
+    catalog.scan(str(root))
+    clone = catalog.copy()
+    (root / 'b.sql').write_text('select 2;', encoding='utf-8')
+    clone.scan(str(root))
+    assert sorted(clone.files) == ['a.sql', 'b.sql']
+    assert sorted(catalog.files) == ['a.sql']
@@ -0,0 +1,208 @@
+import random
+
+import pytest
+
+import dgbookmarksviewer as dqv
+
+TABLES = ['claims', 'members', 'orders', 'claims_history', 'refunds']
+
+
+def make_records():
+    return [{'id': f'q{i}', 'title': f'Query {i}', 'sql_content': f'select * from {table} where x = {i}',
+             'labels': ['Final'] if i % 2 else ['Draft'], 'count': i}
+            for i, table in enumerate(TABLES)]
+
+
+def sql_of(record):
+    return record['sql_content']
+
+
+@pytest.fixture
+def engine():
+    index = dqv.SearchIndex()
+    index.build(make_records(), sql_of)
+    return dqv.SearchEngine(index)
+
+
+def ids(records):
+    return [record['id'] for record in records]
+
+
+def params(term, **extra):
+    return dict({'term': term, 'search_title': True, 'search_syntax': True}, **extra)
+
+
+# --- TrigramIndex ---
+def test_trigram_search_is_case_insensitive_substring():
+    index = dqv.TrigramIndex()
+    index.add('a', 'SELECT * FROM Claims')
+    index.add('b', 'select * from members')
+    assert index.search('claim') == {'a'}
+    assert index.search('FROM') == {'a', 'b'}
+    assert index.search('ms') == {'a'}  # Shorter than a trigram: every document is verified
+    index.remove('a')
+    assert index.search('claim') == set()
+    assert 'cla' not in index.postings
+
+
+def test_trigram_search_within_restricts_candidates():
+    index = dqv.TrigramIndex()
+    for key in 'abc':
+        index.add(key, 'select 1 from orders')
+    assert index.search('orders', within=['b', 'c']) == {'b', 'c'}
+
+
+# --- BM25Index ---
+def test_bm25_ranks_title_hits_above_body_hits():
+    index = dqv.BM25Index()
+    index.add('title', {'title': 'claims report', 'sql': 'select 1'})
+    index.add('body', {'title': 'report', 'sql': 'select * from claims'})
+    index.add('other', {'title': 'members', 'sql': 'select * from members'})
+    assert [key for key, _ in index.top_k('claims')] == ['title', 'body']
+    assert index.top_k('claims', within=['body']) == [('body', pytest.approx(index.score_keys('claims', ['body'])[0]))]
+
+
+def test_bm25_compacts_after_removals():
+    index = dqv.BM25Index()
+    for i in range(8):
+        index.add(f'k{i}', {'title': f'doc {i}', 'sql': 'select foo' if i < 4 else 'select bar'})
+    for i in range(4):
+        index.remove(f'k{i}')
+    # Dead slots are dropped once they pass COMPACT_RATIO, and the rest renumbered
+    assert len(index.keys) < 8
+    assert sorted(index.slots) == ['k4', 'k5', 'k6', 'k7']
+    assert all(index.keys[slot] == key for key, slot in index.slots.items())
+    assert index.top_k('foo') == []
+    assert {key for key, _ in index.top_k('bar')} == {'k4', 'k5', 'k6', 'k7'}
+
+
+# --- CompletionIndex ---
+def brute_force_completions(index, counts, prefix, limit):
+    best = {}
+    for (text, completion), keys in index.entries.items():
+        if text.startswith(prefix) and completion.lower() != prefix:
+            best[completion] = max(best.get(completion, -1), sum(counts[key] for key in keys))
+    return [completion for completion, _ in sorted(best.items(), key=lambda item: (-item[1], item[0].lower()))[:limit]]
+
+
+def test_completions_rank_by_usage():
+    index = dqv.CompletionIndex()
+    index.add('a', {'title': 'Claims report', 'labels': ['Final'], 'count': 1}, ['claims'])
+    index.add('b', {'title': 'Claims audit', 'count': 5}, [])
+    assert index.complete('cla') == ['Claims audit', 'Claims report', 'table:claims']
+    assert index.complete('label:') == ['label:Final']
+    index.update_count('a', 10)
+    assert index.complete('cla')[0] == 'Claims report'
+    index.remove('b')
+    assert 'Claims audit' not in index.complete('cla')
+
+
+@pytest.mark.parametrize('top_range, top_k', [(512, 32), (2, 4), (1, 2)])
+def test_completions_match_brute_force_under_updates(top_range, top_k):
+    rng = random.Random(3)
+    words = ['alpha', 'alps', 'beta', 'bet', 'gamma', 'gam', 'delta']
+    index = dqv.CompletionIndex()
+    index.TOP_RANGE, index.TOP_K = top_range, top_k
+    counts = {}
+    for step in range(2000):
+        key = f"k{rng.randint(0, 40)}"
+        roll = rng.random()
+        if roll < 0.4:
+            counts[key] = rng.randint(0, 9)
+            record = {'title': ' '.join(rng.sample(words, 2)), 'labels': [rng.choice(words)], 'count': counts[key]}
+            index.add(key, record, [rng.choice(words)])
+        elif roll < 0.55 and key in counts:
+            index.remove(key)
+            del counts[key]
+        elif key in counts:
+            counts[key] = rng.randint(0, 9)
+            index.update_count(key, counts[key])
+        prefix = rng.choice(['a', 'al', 'b', 'label:', 'table:g', 'g', 'd'])
+        limit = rng.choice([1, 3, 8])
+        assert index.complete(prefix, limit) == brute_force_completions(index, counts, prefix, limit), step
+
+
+# --- SearchIndex / SearchEngine ---
+def test_substring_search(engine):
+    assert ids(engine.search(params('claims'))) == ['q0', 'q3']
+    assert ids(engine.search(params('claims', search_syntax=False))) == []
+    assert ids(engine.search(params('query 2'))) == ['q2']
+
+
+def test_label_filter(engine):
+    assert ids(engine.search(params('', label='Final'))) == ['q1', 'q3']
+
+
+def test_boolean_search(engine):
+    assert ids(engine.search(params('orders OR label:Final'))) == ['q1', 'q2', 'q3']
+    assert ids(engine.search(params('claims NOT claims_history'))) == ['q0']
+
+
+def test_ranked_search(engine):
+    assert ids(engine.search(params('claims', ranked=True))) == ['q0']
+
+
+def test_refinement_only_rechecks_previous_results(engine, monkeypatch):
+    engine.search(params('claims'))
+    checked = []
+    verify = dqv.TrigramIndex.verify
+
+    def counting_verify(term, candidates, texts, is_cancelled=None):
+        checked.extend(candidates)
+        return verify(term, candidates, texts, is_cancelled)
+
+    monkeypatch.setattr(dqv.TrigramIndex, 'verify', staticmethod(counting_verify))
+    assert ids(engine.search(params('claims_h'))) == ['q3']
+    assert set(checked) <= {'q0', 'q3'}
+    assert len(engine.refine_stack) == 2
+    # Backspacing to a term on the stack is answered without verifying anything
+    checked.clear()
+    engine.result_cache.clear()
+    assert ids(engine.search(params('claims'))) == ['q0', 'q3']
+    assert checked == []
+
+
+def test_results_are_cached_until_the_index_changes(engine):
+    engine.search(params('claims'))
+    engine.search(params('claims'))
+    assert engine.cache_stats()['hits'] == 1
+    records = make_records() + [{'id': 'q9', 'title': 'New claims', 'sql_content': 'select 1', 'count': 0}]
+    assert engine.index.sync(records, sql_of) == ({'q9'}, set())
+    assert ids(engine.search(params('claims'))) == ['q0', 'q3', 'q9']
+    assert engine.cache_stats()['hits'] == 1
+    assert len(engine.refine_stack) == 1
+
+
+def test_sync_reindexes_only_changed_records():
+    records = make_records()
+    index = dqv.SearchIndex()
+    index.build(records, sql_of)
+    changed = [dict(record) for record in records]
+    changed[1]['sql_content'] = 'select * from vendors'
+    assert index.sync(changed[1:], sql_of) == ({'q1'}, {'q0'})
+    assert index.match('vendors') == {'q1'}
+    assert index.match('claims') == {'q3'}
+
+
+def test_adopt_swaps_in_a_prebuilt_index(engine):
+    built = dqv.SearchIndex()
+    built.build([{'id': 'x', 'title': 'Elsewhere', 'sql_content': 'select 1 from vendors'}], sql_of)
+    generation = engine.index.generation
+    engine.index.adopt(built)
+    assert engine.index.generation > generation
+    assert ids(engine.search(params('vendors'))) == ['x']
+
+
+# --- LRUCache ---
+def test_lru_cache_evicts_least_recently_used():
+    cache = dqv.LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.items() == [('a', 1), ('c', 3)]
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (1, 1, 1)
+    cache.discard(lambda key: key == 'a')
+    assert cache.items() == [('c', 3)]
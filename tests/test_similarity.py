@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+import dgbookmarksviewer as dqv
+
+BASE_SQL = ("select c.claim_id, c.member_id, c.paid_amount, m.first_name, m.last_name, m.birth_date "
+            "from claims c join members m on m.member_id = c.member_id "
+            "where c.service_date >= '2024-01-01' and c.status = 'PAID' order by c.paid_amount desc")
+OTHER_SQL = "insert into audit_log (event, created_by) values ('login', current_user)"
+
+
+@pytest.fixture
+def lsh(tmp_path):
+    return dqv.NearDuplicateIndex(dqv.SignatureStore(str(tmp_path / 'signatures.npz'), dqv.MinHasher()))
+
+
+# --- MinHash / LSH ---
+def test_minhash_signatures_are_deterministic():
+    shingles = dqv.sql_shingles(BASE_SQL)
+    assert np.array_equal(dqv.MinHasher().signature(shingles), dqv.MinHasher().signature(shingles))
+
+
+def test_near_duplicates_are_found_and_others_are_not(lsh):
+    lsh.add('a', BASE_SQL)
+    lsh.add('b', BASE_SQL.replace('desc', 'asc'))
+    lsh.add('c', OTHER_SQL)
+    matches = lsh.query(BASE_SQL, threshold=0.5, exclude='a')
+    assert [key for key, _ in matches] == ['b']
+    assert 0.5 <= matches[0][1] < 1.0
+    groups = lsh.groups(threshold=0.5)
+    assert [sorted(keys) for keys, _ in groups] == [['a', 'b']]
+    lsh.remove('b')
+    assert len(lsh) == 2
+    assert lsh.query(BASE_SQL, threshold=0.5, exclude='a') == []
+    assert all(buckets for buckets in lsh.buckets)  # 'a' and 'c' still bucketed in every band
+
+
+def test_comment_only_sql_is_not_indexed(lsh):
+    lsh.add('empty', '-- nothing here')
+    assert len(lsh) == 0
+
+
+def test_signature_store_persists_between_sessions(tmp_path):
+    path = str(tmp_path / 'signatures.npz')
+    store = dqv.SignatureStore(path)
+    signature = store.get(BASE_SQL)
+    store.save()
+    reloaded = dqv.SignatureStore(path)
+    assert np.array_equal(reloaded.get(BASE_SQL), signature)
+    assert reloaded.computed == 0
+    reloaded.prune([])
+    assert reloaded.signatures == {} and reloaded.dirty
+
+
+# --- QueryRecall ---
+def test_recall_ranks_similar_queries_first():
+    recall = dqv.QueryRecall()
+    recall.add('claims', 'Paid claims', BASE_SQL)
+    recall.add('audit', 'Audit log', OTHER_SQL)
+    recall.add('members', 'Members', 'select first_name, last_name from members')
+    assert [key for key, _ in recall.top_k('claims paid_amount', k=2)] == ['claims']
+    assert [key for key, _ in recall.top_k('select last_name from members', k=1)] == ['members']
+    assert 'claims' not in [key for key, _ in recall.top_k(BASE_SQL, k=3, exclude='claims')]
+
+
+def test_recall_removal_matches_never_adding():
+    removed = dqv.QueryRecall()
+    fresh = dqv.QueryRecall()
+    texts = {f'k{i}': f"select col_{i}, shared from table_{i % 3}" for i in range(12)}
+    for key, sql in texts.items():
+        removed.add(key, key, sql)
+        if key != 'k4':
+            fresh.add(key, key, sql)
+    removed.remove('k4')
+    # Same vocabulary order, so scores must match exactly once the tombstone is settled
+    assert removed.top_k('table_1 shared', k=12) == pytest.approx(fresh.top_k('table_1 shared', k=12))
+    assert removed.removed == 1 and len(removed.row_keys) == 12
+
+
+def test_recall_compacts_after_removals():
+    recall = dqv.QueryRecall()
+    for i in range(8):
+        recall.add(f'k{i}', '', f"select a_{i} from t")
+    for i in range(3):
+        recall.remove(f'k{i}')
+    # Three of eight rows removed passes COMPACT_RATIO: tombstones are dropped and rows renumbered
+    assert recall.removed == 0
+    assert recall.row_keys == [f'k{i}' for i in range(3, 8)]
+    assert len(recall) == 5
+    assert recall.top_k('a_1', k=5) == []
+    assert [key for key, _ in recall.top_k('a_5', k=1)] == ['k5']
+    assert recall.doc_freq[recall.vocabulary['t']] == 5
+
+
+def test_recall_batch_matches_single_queries():
+    recall = dqv.QueryRecall()
+    recall.add('claims', 'Paid claims', BASE_SQL)
+    recall.add('audit', 'Audit log', OTHER_SQL)
+    queries = ['claims', 'audit_log values', 'nothing matches']
+    assert recall.top_k_batch(queries, k=2) == [recall.top_k(query, k=2) for query in queries]
+
+
+# --- MetadataColumns ---
+def test_metadata_filters_and_compaction():
+    columns = dqv.MetadataColumns()
+    for i in range(8):
+        columns.add(f'k{i}', {'labels': ['Final'] if i % 2 else ['Draft'], 'count': i}, 'x' * i)
+    assert columns.select(min_count=5) == {'k5', 'k6', 'k7'}
+    assert columns.select(labels_all=['final'], max_length=3) == {'k1', 'k3'}
+    for i in range(3):
+        columns.remove(f'k{i}')
+    assert len(columns.keys) == 5
+    assert columns.select(labels_none=['Final']) == {'k4', 'k6'}
+    with pytest.raises(ValueError):
+        columns.select(bogus=1)
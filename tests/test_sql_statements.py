@@ -0,0 +1,90 @@
+import pytest
+
+import dgbookmarksviewer as dqv
+
+
+def texts(statements):
+    return [text for _first, _last, text in statements]
+
+
+def test_split_simple_statements_with_line_numbers():
+    statements = dqv.split_sql_statements("select 1;\nselect 2\n  from t;\n")
+    assert statements == ((1, 1, 'select 1;'), (2, 3, 'select 2\n  from t;'))
+
+
+def test_split_ignores_terminators_in_quotes_and_comments():
+    sql = "select 'a;b';\n-- not; a statement\nselect 2; /* x; y */\n"
+    assert texts(dqv.split_sql_statements(sql)) == ["select 'a;b';", "-- not; a statement\nselect 2;"]
+
+
+def test_split_keeps_dollar_quoted_body_together():
+    sql = ("create function f() returns int as $body$\n"
+           "begin\n"
+           "  return 1;\n"
+           "end;\n"
+           "$body$ language plpgsql;\n"
+           "select f();\n")
+    statements = dqv.split_sql_statements(sql, 'postgres')
+    assert [(first, last) for first, last, _ in statements] == [(1, 5), (6, 6)]
+    assert statements[0][2].endswith('language plpgsql;')
+
+
+def test_split_keeps_routine_begin_end_block_together():
+    sql = "CREATE PROCEDURE p()\nBEGIN\n  SELECT 1;\n  SELECT 2;\nEND;\nSELECT 3;\n"
+    assert texts(dqv.split_sql_statements(sql, 'mysql')) == [
+        "CREATE PROCEDURE p()\nBEGIN\n  SELECT 1;\n  SELECT 2;\nEND;", "SELECT 3;"]
+
+
+def test_transaction_begin_is_its_own_statement():
+    sql = "BEGIN;\nUPDATE t SET a = 1;\nCOMMIT;\n"
+    assert texts(dqv.split_sql_statements(sql, 'postgres')) == ["BEGIN;", "UPDATE t SET a = 1;", "COMMIT;"]
+
+
+def test_tsql_go_separates_batches():
+    sql = "SELECT 1\nGO\nSELECT 2\nGO\n"
+    assert texts(dqv.split_sql_statements(sql, 'tsql')) == ["SELECT 1", "SELECT 2"]
+
+
+def test_unterminated_tail_is_reported():
+    assert texts(dqv.split_sql_statements("select 1;\nselect 2")) == ["select 1;", "select 2"]
+
+
+def test_extract_statement_at_line(tmp_path):
+    path = tmp_path / 'q.sql'
+    path.write_text("select 1;\n\nselect a,\n  b\nfrom t;\nselect 3;\n", encoding='utf-8')
+    assert dqv.extract_statement_at_line(str(path), 4) == (3, 5, 'select a,\n  b\nfrom t;')
+    assert dqv.extract_statement_at_line(str(path), 6) == (6, 6, 'select 3;')
+
+
+def test_statement_records_split_parent():
+    parent = {'id': 'p', 'title': 'Report', 'labels': ['Final']}
+    rows = dqv.statement_records(parent, "select 1;\nselect 2;\n")
+    assert [row['parent_id'] for row in rows] == ['p', 'p']
+    assert len({row['id'] for row in rows}) == 2
+    assert dqv.statement_records(parent, "select 1;") is None
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('orders AND (label:Final OR "monthly report") NOT draft',
+     ('and', [('term', 'orders', None),
+              ('or', [('label', 'Final'), ('term', 'monthly report', None)]),
+              ('not', ('term', 'draft', None))])),
+    ('title:foo -bar table:claims',
+     ('and', [('term', 'foo', 'title'), ('not', ('term', 'bar', None)), ('ref', 'table', 'claims')])),
+    ('a OR b c', ('or', [('term', 'a', None), ('and', [('term', 'b', None), ('term', 'c', None)])])),
+])
+def test_parse_boolean_query(query, expected):
+    assert dqv.parse_boolean_query(query) == expected
+
+
+@pytest.mark.parametrize('query', ['(a OR', 'a AND', 'NOT'])
+def test_parse_boolean_query_rejects_incomplete_queries(query):
+    with pytest.raises(ValueError):
+        dqv.parse_boolean_query(query)
+
+
+def test_plain_sql_fragments_are_not_boolean_queries():
+    assert not dqv.is_boolean_query('count(')
+    assert not dqv.is_boolean_query('-- todo')
+    assert dqv.is_boolean_query('a AND b')
+    assert dqv.is_boolean_query('label:Final')